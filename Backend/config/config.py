@@ -7,9 +7,165 @@ load_dotenv()
 # API Key for security
 API_KEY = os.getenv("API_KEY", "default-api-key")
 
+# Admin API key for operational endpoints (usage reports)
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY", "default-admin-api-key")
+
 # OpenAI API Key for AI services
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "default-openai-api-key")
 
+# AI client settings (endpoint, timeouts in seconds, connection pool and concurrency limits)
+AI_API_URL = os.getenv("AI_API_URL", "https://api.proxyapi.ru/openai/v1/chat/completions")
+AI_REQUEST_TIMEOUT = float(os.getenv("AI_REQUEST_TIMEOUT", "60"))
+AI_CONNECT_TIMEOUT = float(os.getenv("AI_CONNECT_TIMEOUT", "5"))
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "200"))
+AI_POOL_SIZE = int(os.getenv("AI_POOL_SIZE", "100"))
+AI_KEEPALIVE_TIMEOUT = float(os.getenv("AI_KEEPALIVE_TIMEOUT", "30"))
+
+# Pool of AI endpoints as "url|api_key|weight" entries separated by ";" (empty: AI_API_URL with OPENAI_API_KEY).
+# An endpoint answering 429/5xx or failing on the network is ejected for a cool-down that doubles on repeated
+# failures up to the maximum (seconds)
+AI_ENDPOINTS = os.getenv("AI_ENDPOINTS", "")
+AI_ENDPOINT_COOLDOWN = float(os.getenv("AI_ENDPOINT_COOLDOWN", "10"))
+AI_ENDPOINT_MAX_COOLDOWN = float(os.getenv("AI_ENDPOINT_MAX_COOLDOWN", "120"))
+
+# Local fake OpenAI-compatible server for load testing without real tokens (python -m src.ai.fake_server).
+# AI_FAKE_SERVER=True points the AI client at it. Latency distribution: fixed, lognormal or heavy_tail
+# (Pareto); AI_FAKE_LATENCY_MS is the fixed value or the median/scale, error statuses are comma-separated.
+AI_FAKE_SERVER = os.getenv("AI_FAKE_SERVER", "False") == "True"
+AI_FAKE_SERVER_HOST = os.getenv("AI_FAKE_SERVER_HOST", "127.0.0.1")
+AI_FAKE_SERVER_PORT = int(os.getenv("AI_FAKE_SERVER_PORT", "8765"))
+AI_FAKE_LATENCY = os.getenv("AI_FAKE_LATENCY", "lognormal")
+AI_FAKE_LATENCY_MS = float(os.getenv("AI_FAKE_LATENCY_MS", "800"))
+AI_FAKE_LATENCY_SIGMA = float(os.getenv("AI_FAKE_LATENCY_SIGMA", "0.5"))
+AI_FAKE_TAIL_ALPHA = float(os.getenv("AI_FAKE_TAIL_ALPHA", "1.5"))
+AI_FAKE_MAX_LATENCY_MS = float(os.getenv("AI_FAKE_MAX_LATENCY_MS", "120000"))
+AI_FAKE_ERROR_RATE = float(os.getenv("AI_FAKE_ERROR_RATE", "0"))
+AI_FAKE_ERROR_STATUSES = os.getenv("AI_FAKE_ERROR_STATUSES", "500,502,503,429")
+AI_FAKE_HANG_RATE = float(os.getenv("AI_FAKE_HANG_RATE", "0"))
+AI_FAKE_COMPLETION_TOKENS = int(os.getenv("AI_FAKE_COMPLETION_TOKENS", "150"))
+AI_FAKE_TOKEN_DELAY_MS = float(os.getenv("AI_FAKE_TOKEN_DELAY_MS", "15"))
+if AI_FAKE_SERVER:
+    AI_API_URL = f"http://{AI_FAKE_SERVER_HOST}:{AI_FAKE_SERVER_PORT}/v1/chat/completions"
+    AI_ENDPOINTS = ""
+
+# Model routing by prompt class: primary and fast model tiers, per-route max_tokens for short and standard
+# prompts, and how long the primary model may take before a standard prompt falls back to the fast model
+AI_ROUTING_ENABLED = os.getenv("AI_ROUTING_ENABLED", "True") == "True"
+AI_MODEL_PRIMARY = os.getenv("AI_MODEL_PRIMARY", "gpt-4o")
+AI_MODEL_FAST = os.getenv("AI_MODEL_FAST", "gpt-4o-mini")
+AI_ROUTE_SHORT_MAX_TOKENS = int(os.getenv("AI_ROUTE_SHORT_MAX_TOKENS", "250"))
+AI_ROUTE_STANDARD_MAX_TOKENS = int(os.getenv("AI_ROUTE_STANDARD_MAX_TOKENS", "700"))
+AI_ROUTE_FALLBACK_AFTER = float(os.getenv("AI_ROUTE_FALLBACK_AFTER", "25"))
+
+# AI response cache (in-process LRU size, in-process TTL and shared MongoDB TTL in seconds)
+AI_CACHE_ENABLED = os.getenv("AI_CACHE_ENABLED", "True") == "True"
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "2048"))
+AI_CACHE_TTL = float(os.getenv("AI_CACHE_TTL", "3600"))
+AI_CACHE_DB_TTL = int(os.getenv("AI_CACHE_DB_TTL", "604800"))
+
+# Near-duplicate question cache for tarot and coffee readings (MinHash + LSH in memory): Jaccard similarity
+# threshold for reuse, size bound, entry age limit in seconds, MinHash permutations and LSH bands
+AI_SIMILARITY_CACHE_ENABLED = os.getenv("AI_SIMILARITY_CACHE_ENABLED", "False") == "True"
+AI_SIMILARITY_THRESHOLD = float(os.getenv("AI_SIMILARITY_THRESHOLD", "0.8"))
+AI_SIMILARITY_MAX_ENTRIES = int(os.getenv("AI_SIMILARITY_MAX_ENTRIES", "20000"))
+AI_SIMILARITY_TTL = float(os.getenv("AI_SIMILARITY_TTL", "86400"))
+AI_SIMILARITY_PERMUTATIONS = int(os.getenv("AI_SIMILARITY_PERMUTATIONS", "64"))
+AI_SIMILARITY_BANDS = int(os.getenv("AI_SIMILARITY_BANDS", "16"))
+
+# In-process cache of user profiles (bounded LRU with TTL in seconds; mutators in this process keep it coherent,
+# the TTL bounds staleness after writes made by other processes, e.g. a subscription change seen by rate limits)
+USER_CACHE_ENABLED = os.getenv("USER_CACHE_ENABLED", "True") == "True"
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "15"))
+
+# Batching of concurrent user lookups into one $in query: collection window in milliseconds and batch size limit
+USER_LOADER_ENABLED = os.getenv("USER_LOADER_ENABLED", "True") == "True"
+USER_LOADER_WINDOW_MS = float(os.getenv("USER_LOADER_WINDOW_MS", "2"))
+USER_LOADER_MAX_BATCH = int(os.getenv("USER_LOADER_MAX_BATCH", "100"))
+
+# Tarot and coffee history pages (default and maximum number of entries per page, interpretation preview length)
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "20"))
+HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "100"))
+HISTORY_PREVIEW_CHARS = int(os.getenv("HISTORY_PREVIEW_CHARS", "160"))
+
+# Batched writes of application logs to MongoDB: entries per insert_many, flush interval and retry delay in seconds,
+# buffer size (INFO entries are sampled 1-in-LOG_SINK_SAMPLE_RATE once the buffer is half full, new entries are
+# dropped when it is full; both are reported in the logs collection)
+LOG_SINK_BATCH_SIZE = int(os.getenv("LOG_SINK_BATCH_SIZE", "500"))
+LOG_SINK_FLUSH_INTERVAL = float(os.getenv("LOG_SINK_FLUSH_INTERVAL", "2"))
+LOG_SINK_MAX_BUFFER = int(os.getenv("LOG_SINK_MAX_BUFFER", "50000"))
+LOG_SINK_SAMPLE_RATE = int(os.getenv("LOG_SINK_SAMPLE_RATE", "10"))
+LOG_SINK_RETRY_DELAY = float(os.getenv("LOG_SINK_RETRY_DELAY", "5"))
+
+# Local on-disk spool for log and history writes while MongoDB is unavailable: directory, segment size and total
+# disk cap in bytes (writes are rejected once the cap is reached), replay batch size, rate (documents per second)
+# and check interval in seconds, how long writes go straight to the spool after a failure, and the timeout in
+# seconds after which a direct write is considered failed
+SPOOL_ENABLED = os.getenv("SPOOL_ENABLED", "True") == "True"
+SPOOL_DIR = os.getenv("SPOOL_DIR", "spool")
+SPOOL_SEGMENT_BYTES = int(os.getenv("SPOOL_SEGMENT_BYTES", str(8 * 1024 * 1024)))
+SPOOL_MAX_BYTES = int(os.getenv("SPOOL_MAX_BYTES", str(512 * 1024 * 1024)))
+SPOOL_REPLAY_BATCH = int(os.getenv("SPOOL_REPLAY_BATCH", "200"))
+SPOOL_REPLAY_RATE = float(os.getenv("SPOOL_REPLAY_RATE", "500"))
+SPOOL_REPLAY_INTERVAL = float(os.getenv("SPOOL_REPLAY_INTERVAL", "5"))
+SPOOL_DEGRADED_SECONDS = float(os.getenv("SPOOL_DEGRADED_SECONDS", "10"))
+DB_WRITE_TIMEOUT = float(os.getenv("DB_WRITE_TIMEOUT", "2"))
+
+# Per-user AI rate limits (token bucket: burst size and refill per minute for each plan)
+AI_RATE_LIMIT_ENABLED = os.getenv("AI_RATE_LIMIT_ENABLED", "True") == "True"
+AI_RATE_FREE_BURST = float(os.getenv("AI_RATE_FREE_BURST", "5"))
+AI_RATE_FREE_PER_MINUTE = float(os.getenv("AI_RATE_FREE_PER_MINUTE", "6"))
+AI_RATE_SUBSCRIBER_BURST = float(os.getenv("AI_RATE_SUBSCRIBER_BURST", "15"))
+AI_RATE_SUBSCRIBER_PER_MINUTE = float(os.getenv("AI_RATE_SUBSCRIBER_PER_MINUTE", "30"))
+AI_RATE_IDLE_TTL = float(os.getenv("AI_RATE_IDLE_TTL", "900"))
+AI_RATE_MAX_BUCKETS = int(os.getenv("AI_RATE_MAX_BUCKETS", "100000"))
+
+# Priority scheduling of AI requests within AI_MAX_CONCURRENCY: weighted fair queuing between subscriber and free
+# classes, concurrency limit per class (free below the total keeps slots reserved for subscribers) and the wait
+# in seconds after which a queued request is served first regardless of its class
+AI_PRIORITY_ENABLED = os.getenv("AI_PRIORITY_ENABLED", "True") == "True"
+AI_PRIORITY_SUBSCRIBER_WEIGHT = float(os.getenv("AI_PRIORITY_SUBSCRIBER_WEIGHT", "4"))
+AI_PRIORITY_FREE_WEIGHT = float(os.getenv("AI_PRIORITY_FREE_WEIGHT", "1"))
+AI_PRIORITY_SUBSCRIBER_CONCURRENCY = int(os.getenv("AI_PRIORITY_SUBSCRIBER_CONCURRENCY", "200"))
+AI_PRIORITY_FREE_CONCURRENCY = int(os.getenv("AI_PRIORITY_FREE_CONCURRENCY", "150"))
+AI_PRIORITY_MAX_WAIT = float(os.getenv("AI_PRIORITY_MAX_WAIT", "10"))
+
+# Concurrent fan-out of several AI prompts in one request (parallelism and overall deadline in seconds)
+AI_FANOUT_CONCURRENCY = int(os.getenv("AI_FANOUT_CONCURRENCY", "4"))
+AI_FANOUT_DEADLINE = float(os.getenv("AI_FANOUT_DEADLINE", "20"))
+
+# AI token usage metering: flush interval of in-memory counters into daily rollups (seconds), cap on unflushed
+# counters and prices per 1M tokens as "model:prompt_price:completion_price" pairs for cost estimates
+AI_USAGE_FLUSH_INTERVAL = float(os.getenv("AI_USAGE_FLUSH_INTERVAL", "60"))
+AI_USAGE_MAX_PENDING = int(os.getenv("AI_USAGE_MAX_PENDING", "50000"))
+AI_TOKEN_PRICES = os.getenv("AI_TOKEN_PRICES", "gpt-4o:2.5:10,gpt-4o-mini:0.15:0.6")
+
+# Asynchronous AI job queue (worker coroutines, lease before a stuck job is retried, result retention, long-poll limit)
+AI_JOB_WORKERS = int(os.getenv("AI_JOB_WORKERS", "4"))
+AI_JOB_LEASE_SECONDS = float(os.getenv("AI_JOB_LEASE_SECONDS", "180"))
+AI_JOB_MAX_ATTEMPTS = int(os.getenv("AI_JOB_MAX_ATTEMPTS", "2"))
+AI_JOB_POLL_INTERVAL = float(os.getenv("AI_JOB_POLL_INTERVAL", "1"))
+AI_JOB_MAX_WAIT = float(os.getenv("AI_JOB_MAX_WAIT", "30"))
+AI_JOB_RESULT_TTL = int(os.getenv("AI_JOB_RESULT_TTL", "86400"))
+
+# Offline generation of the precomputed card interpretation corpus (parallel AI requests)
+AI_CORPUS_CONCURRENCY = int(os.getenv("AI_CORPUS_CONCURRENCY", "8"))
+
+# AI upstream resilience: circuit breaker thresholds, retries with jittered backoff and hedged requests
+AI_BREAKER_WINDOW = int(os.getenv("AI_BREAKER_WINDOW", "20"))
+AI_BREAKER_MIN_CALLS = int(os.getenv("AI_BREAKER_MIN_CALLS", "10"))
+AI_BREAKER_ERROR_RATE = float(os.getenv("AI_BREAKER_ERROR_RATE", "0.5"))
+# Keep the slow-call threshold below AI_ROUTE_FALLBACK_AFTER so calls that finish just before the fallback deadline count as slow
+AI_BREAKER_SLOW_CALL = float(os.getenv("AI_BREAKER_SLOW_CALL", "20"))
+AI_BREAKER_SLOW_CALL_RATE = float(os.getenv("AI_BREAKER_SLOW_CALL_RATE", "0.8"))
+AI_BREAKER_OPEN_SECONDS = float(os.getenv("AI_BREAKER_OPEN_SECONDS", "30"))
+AI_RETRY_ATTEMPTS = int(os.getenv("AI_RETRY_ATTEMPTS", "2"))
+AI_RETRY_BASE_DELAY = float(os.getenv("AI_RETRY_BASE_DELAY", "0.5"))
+AI_RETRY_MAX_DELAY = float(os.getenv("AI_RETRY_MAX_DELAY", "4"))
+AI_HEDGE_ENABLED = os.getenv("AI_HEDGE_ENABLED", "False") == "True"
+AI_HEDGE_PERCENTILE = float(os.getenv("AI_HEDGE_PERCENTILE", "0.95"))
+AI_HEDGE_MIN_DELAY = float(os.getenv("AI_HEDGE_MIN_DELAY", "2"))
+
 # YUKassa credentials for payment processing
 YUKASSA_SHOP_ID = os.getenv("YUKASSA_SHOP_ID", "default-yukassa-shop-id")
 YUKASSA_SECRET_KEY = os.getenv("YUKASSA_SECRET_KEY", "default-yukassa-secret-key")
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from src.utils.logger import log_warning
+from src.utils.ttl_cache import TTLCache
+from config.config import AI_CACHE_ENABLED, AI_CACHE_MAX_ENTRIES, AI_CACHE_TTL, AI_CACHE_DB_TTL
+
+CACHE_COLLECTION = "ai_response_cache"
+
+_memory_cache = TTLCache(AI_CACHE_MAX_ENTRIES, AI_CACHE_TTL)
+_stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "stores": 0, "errors": 0}
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+def make_cache_key(model: str, system_prompt: str, prompt: str, max_tokens: int) -> str:
+    """
+    Построение ключа кеша по нормализованному набору (модель, системный промпт, промпт, max_tokens).
+
+    Args:
+        model: Модель ИИ.
+        system_prompt: Системный промпт.
+        prompt: Пользовательский промпт.
+        max_tokens: Максимальное количество токенов в ответе.
+
+    Returns:
+        str: SHA-256 хеш нормализованного набора.
+    """
+    payload = json.dumps(
+        [model, _normalize(system_prompt), _normalize(prompt), int(max_tokens)],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _get_db():
+    from config.config import db
+    return db
+
+async def get_cached_response(key: str) -> Optional[str]:
+    """
+    Поиск ответа в кеше: сначала в памяти процесса, затем в коллекции MongoDB.
+
+    Args:
+        key: Ключ кеша, построенный make_cache_key.
+
+    Returns:
+        Optional[str]: Закешированный ответ или None.
+    """
+    if not AI_CACHE_ENABLED:
+        return None
+    value = _memory_cache.get(key)
+    if value is not None:
+        _stats["memory_hits"] += 1
+        return value
+    try:
+        now = datetime.now(timezone.utc)
+        document = await _get_db()[CACHE_COLLECTION].find_one({"_id": key, "expires_at": {"$gt": now}})
+    except Exception as e:
+        _stats["errors"] += 1
+        log_warning(f"AI cache lookup failed: {str(e)}")
+        document = None
+    if document is not None:
+        _stats["db_hits"] += 1
+        remaining = (document["expires_at"].replace(tzinfo=timezone.utc) - now).total_seconds()
+        _memory_cache.set(key, document["response"], min(AI_CACHE_TTL, remaining))
+        return document["response"]
+    _stats["misses"] += 1
+    return None
+
+async def store_response(key: str, model: str, response: str):
+    """
+    Сохранение успешного ответа ИИ в кеш в памяти и в коллекцию MongoDB.
+
+    Args:
+        key: Ключ кеша, построенный make_cache_key.
+        model: Модель ИИ, сгенерировавшая ответ.
+        response: Текст ответа.
+    """
+    if not AI_CACHE_ENABLED:
+        return
+    _memory_cache.set(key, response)
+    _stats["stores"] += 1
+    try:
+        now = datetime.now(timezone.utc)
+        await _get_db()[CACHE_COLLECTION].update_one(
+            {"_id": key},
+            {"$set": {
+                "response": response,
+                "model": model,
+                "created_at": now,
+                "expires_at": now + timedelta(seconds=AI_CACHE_DB_TTL)
+            }},
+            upsert=True
+        )
+    except Exception as e:
+        _stats["errors"] += 1
+        log_warning(f"AI cache store failed: {str(e)}")
+
+def get_cache_stats() -> dict:
+    """
+    Получение статистики попаданий и промахов кеша.
+
+    Returns:
+        dict: Счетчики попаданий, промахов, записей и доля попаданий.
+    """
+    lookups = _stats["memory_hits"] + _stats["db_hits"] + _stats["misses"]
+    hits = _stats["memory_hits"] + _stats["db_hits"]
+    return {
+        **_stats,
+        "enabled": AI_CACHE_ENABLED,
+        "memory_entries": len(_memory_cache),
+        "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+    }
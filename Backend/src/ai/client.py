@@ -1,66 +1,294 @@
-import requests
+import asyncio
+import json
+from typing import AsyncIterator, Optional, Tuple
+
+import aiohttp
+
+from src.ai import endpoints, resilience, routing, scheduler, similarity, singleflight, usage
 from src.utils.logger import log_info, log_error
-from config.config import OPENAI_API_KEY
+from config.config import (
+    AI_REQUEST_TIMEOUT, AI_CONNECT_TIMEOUT,
+    AI_POOL_SIZE, AI_KEEPALIVE_TIMEOUT
+)
+
+SYSTEM_PROMPT = "Вы - высококвалифицированный ассистент, специализирующийся на предсказаниях, интерпретациях карт Таро, кофейной гущи и других эзотерических практик. Ваша задача - предоставлять пользователю глубокие, содержательные и персонализированные ответы на их вопросы. Используйте контекст, предоставленный пользователем, чтобы сделать ответ максимально релевантным. Если вопрос касается Таро, анализируйте карты и их возможные значения в контексте вопроса. Если вопрос о кофейной гуще, интерпретируйте образы и символы, которые могут быть видны на изображении. Старайтесь давать ответы, которые звучат естественно и вдохновляюще, избегая банальных фраз. Если контекст или данные отсутствуют, используйте общие знания и интуицию, чтобы дать полезный совет. Всегда сохраняйте тон доброжелательный и поддерживающий, чтобы пользователь чувствовал себя комфортно."
+
+# Общая сессия с пулом keep-alive соединений. Создается лениво внутри работающего event loop.
+# Число одновременных запросов ограничивает планировщик приоритетов (src/ai/scheduler.py).
+_session: Optional[aiohttp.ClientSession] = None
+
+async def get_session() -> aiohttp.ClientSession:
+    """
+    Получение общей HTTP-сессии для запросов к API ИИ.
+
+    Returns:
+        aiohttp.ClientSession: Сессия с пулом соединений.
+    """
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=AI_POOL_SIZE,
+            keepalive_timeout=AI_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=300
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=AI_REQUEST_TIMEOUT, sock_connect=AI_CONNECT_TIMEOUT)
+        )
+    return _session
+
+async def close_ai_client():
+    """
+    Закрытие HTTP-сессии клиента ИИ. Вызывается при остановке приложения.
+    """
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+def _build_headers(api_key: str) -> dict:
+    return {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key}"
+    }
+
+def _build_payload(prompt: str, model: str, max_tokens: int, stream: bool = False) -> dict:
+    data = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        "max_tokens": max_tokens
+    }
+    if stream:
+        data["stream"] = True
+        # Последний фрагмент потока содержит блок usage для учета расхода токенов
+        data["stream_options"] = {"include_usage": True}
+    return data
+
+class AIResponseError(Exception):
+    """
+    Ошибка получения ответа от API ИИ (код ошибки HTTP, нет вариантов ответа и т.п.).
+    """
+
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+def _retry_after(response: aiohttp.ClientResponse) -> Optional[float]:
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+async def request_completion(prompt: str, model: str, max_tokens: int, timeout: Optional[float] = None) -> str:
+    """
+    Выполняет один запрос к API ИИ без кеширования и ограничений частоты
+    через точку доступа из пула AI_ENDPOINTS. Слот планировщика занимает вызывающий код
+    (см. call_with_resilience), чтобы ожидание в очереди не входило в задержку API.
+
+    Args:
+        prompt: Текст промпта.
+        model: Модель ИИ.
+        max_tokens: Максимальное количество токенов в ответе.
+        timeout: Таймаут запроса в секундах (по умолчанию AI_REQUEST_TIMEOUT).
+
+    Returns:
+        str: Текст ответа ИИ.
+
+    Raises:
+        AIResponseError: Если API вернул код ошибки или не вернул вариантов ответа.
+        asyncio.TimeoutError: Если превышен таймаут.
+    """
+    request_kwargs = {"json": _build_payload(prompt, model, max_tokens)}
+    if timeout is not None:
+        request_kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout)
 
-def get_ai_response(prompt: str, model: str = "gpt-4o", max_tokens: int = 700) -> str:
+    log_info(f"Sending AI prompt request with question: {prompt[:50]}...")
+    session = await get_session()
+    async with endpoints.endpoint_lease() as endpoint:
+        async with session.post(endpoint.url, headers=_build_headers(endpoint.api_key), **request_kwargs) as response:
+            if response.status >= 400:
+                raise AIResponseError(f"AI API returned status {response.status}", response.status, _retry_after(response))
+            response_data = await response.json(content_type=None)
+    usage.record_usage(model, response_data.get("usage"))
+    if "choices" in response_data and len(response_data["choices"]) > 0:
+        log_info("Successfully received response from AI")
+        return response_data["choices"][0]["message"]["content"]
+    raise AIResponseError("No valid response choices from AI API")
+
+async def stream_ai_response(prompt: str, model: Optional[str] = None, max_tokens: Optional[int] = None, use_cache: bool = True) -> AsyncIterator[str]:
+    """
+    Потоковый запрос к API ИИ: возвращает фрагменты ответа по мере их генерации.
+
+    Ответ читается построчно из потока server-sent events провайдера, поэтому память
+    на один поток не зависит от скорости клиента. Полный ответ сохраняется в кеш;
+    при попадании в кеш весь ответ отдается одним фрагментом. Модель и лимит токенов
+    по умолчанию берутся из маршрута эндпоинта; переход на быструю модель для потоков
+    не выполняется, так как часть ответа уже может быть отдана клиенту.
+
+    Args:
+        prompt: Текст промпта.
+        model: Модель ИИ (по умолчанию модель маршрута).
+        max_tokens: Максимальное количество токенов в ответе (по умолчанию лимит маршрута).
+        use_cache: Использовать ли кеш ответов.
+
+    Yields:
+        str: Очередной фрагмент текста ответа.
+
+    Raises:
+        AIResponseError: Если API вернул ошибку или пустой ответ.
+    """
+    from src.ai.cache import make_cache_key, get_cached_response, store_response
+
+    route = routing.resolve_route()
+    model = model or route.model
+    max_tokens = max_tokens or route.max_tokens
+    cache_key = make_cache_key(model, SYSTEM_PROMPT, prompt, max_tokens)
+    if use_cache:
+        cached = await get_cached_response(cache_key)
+        if cached is not None:
+            log_info(f"AI stream served from cache for question: {prompt[:50]}...")
+            yield cached
+            return
+
+    log_info(f"Sending AI streaming request with question: {prompt[:50]}...")
+    # Общий таймаут не ограничивает длинный поток, ограничивается только пауза между фрагментами
+    stream_timeout = aiohttp.ClientTimeout(total=None, sock_connect=AI_CONNECT_TIMEOUT, sock_read=AI_REQUEST_TIMEOUT)
+    parts = []
+    session = await get_session()
+    # Потоки не повторяются (часть ответа уже отдана клиенту), но учитываются предохранителем.
+    # Слот занимается до входа в предохранитель, чтобы пробный вызов не ждал в локальной очереди
+    async with scheduler.ai_slot(), resilience.guarded_call(track_latency=False), endpoints.endpoint_lease() as endpoint:
+        async with session.post(endpoint.url, headers=_build_headers(endpoint.api_key), json=_build_payload(prompt, model, max_tokens, stream=True), timeout=stream_timeout) as response:
+            if response.status != 200:
+                raise AIResponseError(f"AI API returned status {response.status} for streaming request", response.status, _retry_after(response))
+            async for raw_line in response.content:
+                line = raw_line.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    break
+                chunk = json.loads(payload)
+                if chunk.get("usage"):
+                    usage.record_usage(model, chunk["usage"])
+                choices = chunk.get("choices") or []
+                delta = choices[0].get("delta", {}).get("content") if choices else None
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        if not parts:
+            raise AIResponseError("Empty streamed response from AI API")
+    log_info("Successfully received streamed response from AI")
+    if use_cache:
+        await store_response(cache_key, model, "".join(parts))
+
+async def fetch_ai_response(prompt: str, model: Optional[str] = None, max_tokens: Optional[int] = None, timeout: Optional[float] = None, use_cache: bool = True) -> str:
+    """
+    Получение ответа ИИ через кеш с объединением одинаковых одновременных запросов.
+
+    В отличие от get_ai_response, ошибки не превращаются в текст для пользователя,
+    а выбрасываются как исключения. Если модель не указана явно, модель и лимит токенов
+    выбираются по маршруту эндпоинта, а при медленном или ошибочном ответе основной модели
+    запрос повторяется на быстрой модели (такие ответы не кешируются).
+
+    Args:
+        prompt: Текст промпта.
+        model: Модель ИИ (по умолчанию модель маршрута).
+        max_tokens: Максимальное количество токенов в ответе (по умолчанию лимит маршрута).
+        timeout: Таймаут запроса в секундах (по умолчанию AI_REQUEST_TIMEOUT).
+        use_cache: Использовать ли кеш ответов.
+
+    Returns:
+        str: Текст ответа ИИ.
+
+    Raises:
+        AIResponseError: Если API вернул код ошибки или не вернул вариантов ответа.
+        asyncio.TimeoutError: Если превышен таймаут.
+        CircuitOpenError: Если предохранитель API ИИ разомкнут.
+    """
+    from src.ai.cache import make_cache_key, get_cached_response, store_response
+
+    route = routing.resolve_route()
+    allow_fallback = model is None
+    model = model or route.model
+    max_tokens = max_tokens or route.max_tokens
+    cache_key = make_cache_key(model, SYSTEM_PROMPT, prompt, max_tokens)
+    if use_cache:
+        cached = await get_cached_response(cache_key)
+        if cached is not None:
+            log_info(f"AI response served from cache for question: {prompt[:50]}...")
+            return cached
+
+    def call_model(selected_model: str, deadline: Optional[float]):
+        # Предохранитель, повторы с разбросом и дублирующие запросы в пределах срока маршрута
+        return resilience.call_with_resilience(
+            lambda: request_completion(prompt, selected_model, max_tokens, timeout),
+            timeout=deadline,
+            slot=scheduler.ai_slot
+        )
+
+    async def fetch_and_store() -> str:
+        content, fell_back = await routing.call_with_fallback(route, model, call_model, allow_fallback)
+        # Ответ быстрой модели не кешируется, чтобы после восстановления основной модели отдавать ее ответы
+        if use_cache and not fell_back:
+            await store_response(cache_key, model, content)
+        return content
+
+    # Одновременные одинаковые запросы объединяются в один запрос к API
+    return await singleflight.run(cache_key, fetch_and_store)
+
+async def get_ai_response(prompt: str, model: Optional[str] = None, max_tokens: Optional[int] = None, timeout: Optional[float] = None, use_cache: bool = True, similar: Optional[Tuple[str, str]] = None) -> str:
     """
     Отправляет запрос к API ИИ и возвращает ответ.
-    
+
     Параметры:
     - prompt: Текст запроса или промпта для ИИ.
-    - model: Модель ИИ для использования (по умолчанию "gpt-4o").
-    - max_tokens: Максимальное количество токенов в ответе (по умолчанию 700).
-    
+    - model: Модель ИИ для использования (по умолчанию модель маршрута эндпоинта, см. src/ai/routing.py).
+    - max_tokens: Максимальное количество токенов в ответе (по умолчанию лимит маршрута эндпоинта).
+    - timeout: Таймаут запроса в секундах (по умолчанию AI_REQUEST_TIMEOUT).
+    - use_cache: Использовать ли кеш ответов (по умолчанию True).
+    - similar: Контекст и вопрос пользователя для кеша похожих вопросов (см. src/ai/similarity.py).
+
     Возвращает:
     - Ответ от ИИ в виде строки или сообщение об ошибке.
     """
-    from time import time
     try:
-        # Простая проверка частоты запросов (антиспам)
-        if not hasattr(get_ai_response, "last_request_time") or time() - get_ai_response.last_request_time > 5:  # Ограничение 1 запрос каждые 5 секунд
-            get_ai_response.last_request_time = time()
-            
-            # Проверка подписки или баланса пользователя (заглушка)
-            # TODO: Реализовать проверку подписки/баланса пользователя
-            user_has_subscription = True  # Заглушка, предполагаем, что подписка есть
-            if not user_has_subscription:
-                log_info("AI request denied due to lack of subscription or balance")
-                return "Для использования ИИ требуется активная подписка или достаточный баланс. Пожалуйста, проверьте ваш статус."
-            
-            # Проверка локации пользователя (заглушка)
-            # TODO: Реализовать проверку локации пользователя
-            user_location_allowed = True  # Заглушка, предполагаем, что локация разрешена
-            if not user_location_allowed:
-                log_info("AI request denied due to restricted location")
-                return "Доступ к ИИ ограничен в вашей локации. Пожалуйста, свяжитесь с поддержкой для получения дополнительной информации."
-                
-            api_url = "https://api.proxyapi.ru/openai/v1/chat/completions"
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {OPENAI_API_KEY}"
-            }
-            data = {
-                "model": model,
-                "messages": [
-                    {"role": "system", "content": "Вы - высококвалифицированный ассистент, специализирующийся на предсказаниях, интерпретациях карт Таро, кофейной гущи и других эзотерических практик. Ваша задача - предоставлять пользователю глубокие, содержательные и персонализированные ответы на их вопросы. Используйте контекст, предоставленный пользователем, чтобы сделать ответ максимально релевантным. Если вопрос касается Таро, анализируйте карты и их возможные значения в контексте вопроса. Если вопрос о кофейной гуще, интерпретируйте образы и символы, которые могут быть видны на изображении. Старайтесь давать ответы, которые звучат естественно и вдохновляюще, избегая банальных фраз. Если контекст или данные отсутствуют, используйте общие знания и интуицию, чтобы дать полезный совет. Всегда сохраняйте тон доброжелательный и поддерживающий, чтобы пользователь чувствовал себя комфортно."},
-                    {"role": "user", "content": prompt}
-                ],
-                "max_tokens": max_tokens
-            }
-            
-            log_info(f"Sending AI prompt request with question: {prompt[:50]}...")
-            response = requests.post(api_url, headers=headers, json=data)
-            response_data = response.json()
-            # print(response_data)
-            if "choices" in response_data and len(response_data["choices"]) > 0:
-                log_info("Successfully received response from AI")
-                return response_data["choices"][0]["message"]["content"]
-            else:
-                log_error("No valid response choices from AI API")
-                return "К сожалению, произошла ошибка при получении ответа от ИИ. Пожалуйста, попробуйте снова через некоторое время."
-        else:
-            log_info("AI request skipped due to rate limiting")
-            return "Слишком много запросов к ИИ. Пожалуйста, подождите несколько секунд перед следующим запросом."
+        # Проверка подписки или баланса пользователя (заглушка)
+        # TODO: Реализовать проверку подписки/баланса пользователя
+        user_has_subscription = True  # Заглушка, предполагаем, что подписка есть
+        if not user_has_subscription:
+            log_info("AI request denied due to lack of subscription or balance")
+            return "Для использования ИИ требуется активная подписка или достаточный баланс. Пожалуйста, проверьте ваш статус."
+
+        # Проверка локации пользователя (заглушка)
+        # TODO: Реализовать проверку локации пользователя
+        user_location_allowed = True  # Заглушка, предполагаем, что локация разрешена
+        if not user_location_allowed:
+            log_info("AI request denied due to restricted location")
+            return "Доступ к ИИ ограничен в вашей локации. Пожалуйста, свяжитесь с поддержкой для получения дополнительной информации."
+
+        if similar is not None and use_cache:
+            cached = similarity.find_similar_response(*similar)
+            if cached is not None:
+                log_info(f"AI response reused for similar question: {similar[1][:50]}...")
+                return cached
+        response = await fetch_ai_response(prompt, model, max_tokens, timeout, use_cache)
+        if similar is not None and use_cache:
+            similarity.remember_response(*similar, response)
+        return response
+    except resilience.CircuitOpenError:
+        log_error(f"AI request rejected by circuit breaker: {prompt[:50]}...")
+        return "Сервис ИИ временно недоступен. Пожалуйста, попробуйте снова через несколько минут."
+    except AIResponseError as e:
+        log_error(str(e))
+        return "К сожалению, произошла ошибка при получении ответа от ИИ. Пожалуйста, попробуйте снова через некоторое время."
+    except asyncio.TimeoutError:
+        log_error(f"AI prompt request timed out: {prompt[:50]}...")
+        return "Превышено время ожидания ответа от ИИ. Пожалуйста, попробуйте снова через некоторое время."
     except Exception as e:
         log_error(f"Error in AI prompt request: {str(e)}")
         return f"Ошибка при запросе к ИИ: {str(e)}"
@@ -0,0 +1,255 @@
+import argparse
+import asyncio
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from src.utils.logger import log_info, log_warning
+from config.config import AI_CORPUS_CONCURRENCY, AI_MODEL_PRIMARY
+
+CORPUS_COLLECTION = "card_interpretations"
+
+ORIENTATION_UPRIGHT = "upright"
+ORIENTATION_REVERSED = "reversed"
+ORIENTATIONS = {
+    ORIENTATION_UPRIGHT: "в прямом положении",
+    ORIENTATION_REVERSED: "в перевернутом положении"
+}
+
+CATEGORY_GENERAL = "general"
+CATEGORY_SPIRITUAL_GROWTH = "spiritual_growth"
+CATEGORIES = {
+    CATEGORY_GENERAL: "в общем контексте",
+    "love": "в любви и отношениях",
+    "career": "в карьере и финансах",
+    "health": "в вопросах здоровья",
+    CATEGORY_SPIRITUAL_GROWTH: "в духовном росте"
+}
+
+# Названия категорий, которые присылают фронтенд и бот
+CATEGORY_ALIASES = {
+    "общее": CATEGORY_GENERAL,
+    "любовь": "love",
+    "отношения": "love",
+    "карьера": "career",
+    "работа": "career",
+    "финансы": "career",
+    "здоровье": "health",
+    "духовный рост": CATEGORY_SPIRITUAL_GROWTH,
+    "spiritual growth": CATEGORY_SPIRITUAL_GROWTH
+}
+
+# Записи корпуса не меняются после генерации, поэтому найденные записи хранятся в памяти
+# (не больше 78 карт * 2 положения * 5 категорий)
+_memo: Dict[str, str] = {}
+_stats = {"hits": 0, "misses": 0}
+
+def _tarot_cards() -> List[str]:
+    from src.api.routers.tarot import TAROT_CARDS
+    return TAROT_CARDS
+
+def corpus_key(card: str, orientation: str, category: str) -> str:
+    return f"{card}|{orientation}|{category}"
+
+def resolve_card_name(name: str) -> Optional[str]:
+    """
+    Поиск карты в колоде по названию без учета регистра.
+
+    Args:
+        name: Название карты.
+
+    Returns:
+        Optional[str]: Название карты из колоды или None, если такой карты нет.
+    """
+    normalized = " ".join(name.split()).lower()
+    for card in _tarot_cards():
+        if card.lower() == normalized:
+            return card
+    return None
+
+def card_for_index(index) -> Optional[str]:
+    """
+    Карта колоды по индексу из запроса (порядок TAROT_CARDS).
+
+    Args:
+        index: Индекс карты (число или строка с числом).
+
+    Returns:
+        Optional[str]: Название карты или None, если индекс некорректен или вне колоды.
+    """
+    cards = _tarot_cards()
+    try:
+        position = int(index)
+    except (TypeError, ValueError):
+        return None
+    if not 0 <= position < len(cards):
+        return None
+    return cards[position]
+
+def find_category(category: Optional[str]) -> Optional[str]:
+    """
+    Ключ категории корпуса для категории из запроса. Пустая категория считается общей.
+
+    Args:
+        category: Название категории (ключ корпуса или русское название).
+
+    Returns:
+        Optional[str]: Ключ категории корпуса или None, если для такой категории корпуса нет.
+    """
+    value = " ".join((category or "").split()).lower()
+    if not value:
+        return CATEGORY_GENERAL
+    if value in CATEGORIES:
+        return value
+    return CATEGORY_ALIASES.get(value)
+
+def normalize_category(category: Optional[str]) -> str:
+    """
+    Приведение категории к ключу корпуса. Неизвестные категории считаются общими.
+
+    Args:
+        category: Название категории (ключ корпуса или русское название).
+
+    Returns:
+        str: Ключ категории корпуса.
+    """
+    value = " ".join((category or "").split()).lower()
+    if value in CATEGORIES:
+        return value
+    return CATEGORY_ALIASES.get(value, CATEGORY_GENERAL)
+
+def build_corpus_prompt(card: str, orientation: str, category: str) -> str:
+    return (
+        f"Дай интерпретацию карты Таро {card} {ORIENTATIONS[orientation]} {CATEGORIES[category]}. "
+        "Опиши основное значение карты, ее влияние на ситуацию и короткий совет. Ответ до 150 слов."
+    )
+
+async def get_card_interpretations(db, keys: List[Tuple[str, str, str]]) -> List[Optional[str]]:
+    """
+    Получение готовых интерпретаций из корпуса одним запросом.
+
+    Args:
+        db: Объект базы данных.
+        keys: Список кортежей (карта, положение, категория).
+
+    Returns:
+        List[Optional[str]]: Интерпретации в порядке ключей, None для отсутствующих в корпусе.
+    """
+    ids = [corpus_key(*key) for key in keys]
+    missing = [key_id for key_id in set(ids) if key_id not in _memo]
+    if missing:
+        async for document in db[CORPUS_COLLECTION].find({"_id": {"$in": missing}}, {"text": 1}):
+            _memo[document["_id"]] = document["text"]
+    results = [_memo.get(key_id) for key_id in ids]
+    found = sum(1 for result in results if result is not None)
+    _stats["hits"] += found
+    _stats["misses"] += len(results) - found
+    return results
+
+async def get_card_interpretation(db, card: str, orientation: str = ORIENTATION_UPRIGHT, category: str = CATEGORY_GENERAL) -> Optional[str]:
+    """
+    Получение готовой интерпретации карты из корпуса.
+
+    Args:
+        db: Объект базы данных.
+        card: Название карты из колоды.
+        orientation: Положение карты (upright или reversed).
+        category: Ключ категории корпуса.
+
+    Returns:
+        Optional[str]: Интерпретация или None, если ее нет в корпусе.
+    """
+    return (await get_card_interpretations(db, [(card, orientation, category)]))[0]
+
+def get_corpus_stats() -> dict:
+    """
+    Получение статистики обращений к корпусу интерпретаций.
+
+    Returns:
+        dict: Количество найденных и не найденных интерпретаций и размер кеша в памяти.
+    """
+    return {**_stats, "memo_entries": len(_memo)}
+
+async def generate_corpus(db, concurrency: int = AI_CORPUS_CONCURRENCY, overwrite: bool = False, model: str = AI_MODEL_PRIMARY, max_tokens: int = 500) -> dict:
+    """
+    Генерация интерпретаций для всех сочетаний (карта, положение, категория).
+
+    Генерация возобновляемая: уже сохраненные сочетания пропускаются, поэтому после
+    прерывания достаточно запустить ее снова. Каждая интерпретация сохраняется сразу
+    после получения через upsert по ключу, так что повторный запуск ничего не дублирует.
+
+    Args:
+        db: Объект базы данных.
+        concurrency: Максимальное число одновременных запросов к ИИ.
+        overwrite: Перегенерировать ли уже сохраненные интерпретации.
+        model: Модель ИИ.
+        max_tokens: Максимальное количество токенов в одной интерпретации.
+
+    Returns:
+        dict: Общее число сочетаний, пропущенных, сгенерированных и неудачных.
+    """
+    from src.ai.client import fetch_ai_response
+    from src.ai.usage import set_usage_context
+    from src.db.indexes import ensure_indexes
+
+    set_usage_context(endpoint="batch corpus", user="system")
+    await ensure_indexes(db, [CORPUS_COLLECTION])
+    collection = db[CORPUS_COLLECTION]
+    combinations = [
+        (card, orientation, category)
+        for card in _tarot_cards()
+        for orientation in ORIENTATIONS
+        for category in CATEGORIES
+    ]
+    existing = set()
+    if not overwrite:
+        existing = {document["_id"] async for document in collection.find({}, {"_id": 1})}
+    todo = [combination for combination in combinations if corpus_key(*combination) not in existing]
+    result = {"total": len(combinations), "skipped": len(combinations) - len(todo), "generated": 0, "failed": 0}
+    log_info(f"Card corpus generation: {len(todo)} of {len(combinations)} interpretations to generate")
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def generate_one(card: str, orientation: str, category: str):
+        async with semaphore:
+            try:
+                text = await fetch_ai_response(build_corpus_prompt(card, orientation, category), model, max_tokens, use_cache=False)
+                await collection.update_one(
+                    {"_id": corpus_key(card, orientation, category)},
+                    {"$set": {
+                        "card": card,
+                        "orientation": orientation,
+                        "category": category,
+                        "text": text,
+                        "model": model,
+                        "created_at": datetime.now(timezone.utc)
+                    }},
+                    upsert=True
+                )
+                result["generated"] += 1
+                if result["generated"] % 50 == 0:
+                    log_info(f"Card corpus generation: {result['generated']} of {len(todo)} done")
+            except Exception as e:
+                result["failed"] += 1
+                log_warning(f"Card corpus generation failed for {card} ({orientation}, {category}): {str(e) or type(e).__name__}")
+
+    await asyncio.gather(*(generate_one(*combination) for combination in todo))
+    log_info(f"Card corpus generation finished: {result}")
+    return result
+
+async def _main(args):
+    from config.config import db
+    from src.ai.client import close_ai_client
+
+    from src.ai.usage import flush_usage
+
+    try:
+        result = await generate_corpus(db, concurrency=args.concurrency, overwrite=args.overwrite)
+    finally:
+        await flush_usage(db)
+        await close_ai_client()
+    print(result)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Генерация корпуса интерпретаций карт Таро")
+    parser.add_argument("--concurrency", type=int, default=AI_CORPUS_CONCURRENCY, help="Число одновременных запросов к ИИ")
+    parser.add_argument("--overwrite", action="store_true", help="Перегенерировать уже сохраненные интерпретации")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,176 @@
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+import aiohttp
+
+from src.ai.resilience import LatencyTracker
+from src.utils.logger import log_warning, log_info
+from config.config import (
+    AI_API_URL, OPENAI_API_KEY, AI_ENDPOINTS,
+    AI_ENDPOINT_COOLDOWN, AI_ENDPOINT_MAX_COOLDOWN
+)
+
+class AIEndpoint:
+    """
+    Одна точка доступа к API ИИ (адрес и ключ) со счетчиками нагрузки и состоянием исключения.
+    """
+
+    def __init__(self, url: str, api_key: str, weight: float = 1.0):
+        self.url = url
+        self.api_key = api_key
+        self.weight = max(weight, 0.01)
+        self.outstanding = 0
+        self.ejected_until = 0.0
+        self.consecutive_failures = 0
+        self.latencies = LatencyTracker()
+        self.stats = {"requests": 0, "errors": 0, "ejections": 0}
+
+    @property
+    def name(self) -> str:
+        # Ключ в метриках и логах показывается только последними символами
+        return f"{self.url} (key ...{self.api_key[-4:]})"
+
+    def is_available(self, now: float) -> bool:
+        return self.ejected_until <= now
+
+class EndpointPool:
+    """
+    Пул точек доступа к API ИИ.
+
+    Запрос отправляется в доступную точку с наименьшим числом выполняющихся запросов
+    с учетом веса. Точка, ответившая 429/5xx или недоступная по сети, исключается из пула
+    на время охлаждения, которое удваивается при повторных ошибках.
+    """
+
+    def __init__(self, endpoints: List[AIEndpoint], cooldown: float, max_cooldown: float):
+        if not endpoints:
+            raise ValueError("AI endpoint pool is empty")
+        self.endpoints = endpoints
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+
+    def acquire(self) -> AIEndpoint:
+        """
+        Выбор точки доступа для очередного запроса.
+
+        Returns:
+            AIEndpoint: Доступная точка с наименьшей нагрузкой на единицу веса; если исключены все,
+            точка, охлаждение которой закончится раньше других.
+        """
+        now = time.monotonic()
+        available = [endpoint for endpoint in self.endpoints if endpoint.is_available(now)]
+        if available:
+            lowest = min((endpoint.outstanding + 1) / endpoint.weight for endpoint in available)
+            candidates = [endpoint for endpoint in available if (endpoint.outstanding + 1) / endpoint.weight == lowest]
+            endpoint = random.choice(candidates)
+        else:
+            endpoint = min(self.endpoints, key=lambda item: item.ejected_until)
+        endpoint.outstanding += 1
+        endpoint.stats["requests"] += 1
+        return endpoint
+
+    def release(self, endpoint: AIEndpoint, ok: bool, latency: float, retry_after: Optional[float] = None):
+        """
+        Учет завершения запроса к точке доступа.
+
+        Args:
+            endpoint: Точка доступа, выданная acquire().
+            ok: Успешен ли запрос (False для 429/5xx и сетевых ошибок).
+            latency: Длительность запроса в секундах.
+            retry_after: Время охлаждения из заголовка Retry-After, если он был (не больше max_cooldown).
+        """
+        endpoint.outstanding -= 1
+        if ok:
+            endpoint.consecutive_failures = 0
+            endpoint.latencies.add(latency)
+            return
+        endpoint.stats["errors"] += 1
+        endpoint.consecutive_failures += 1
+        # Retry-After от точки доступа тоже ограничивается max_cooldown
+        cooldown = min(self.max_cooldown, retry_after or self.cooldown * 2 ** (endpoint.consecutive_failures - 1))
+        endpoint.ejected_until = time.monotonic() + cooldown
+        endpoint.stats["ejections"] += 1
+        log_warning(f"AI endpoint {endpoint.name} ejected for {cooldown:.0f}s after {endpoint.consecutive_failures} consecutive failures")
+
+    def snapshot(self) -> List[dict]:
+        now = time.monotonic()
+        result = []
+        for endpoint in self.endpoints:
+            p50 = endpoint.latencies.percentile(0.5)
+            result.append({
+                "endpoint": endpoint.name,
+                "weight": endpoint.weight,
+                "outstanding": endpoint.outstanding,
+                "available": endpoint.is_available(now),
+                "ejected_for": round(max(0.0, endpoint.ejected_until - now), 1),
+                **endpoint.stats,
+                "latency_p50": round(p50, 3) if p50 is not None else None
+            })
+        return result
+
+def parse_endpoints(value: str) -> List[AIEndpoint]:
+    """
+    Разбор списка точек доступа из строки конфигурации "url|api_key|weight;...".
+
+    Args:
+        value: Строка конфигурации AI_ENDPOINTS.
+
+    Returns:
+        List[AIEndpoint]: Точки доступа; если строка пустая, одна точка AI_API_URL с OPENAI_API_KEY.
+    """
+    endpoints = []
+    for item in value.split(";"):
+        parts = [part.strip() for part in item.split("|")]
+        if not parts[0]:
+            continue
+        api_key = parts[1] if len(parts) > 1 and parts[1] else OPENAI_API_KEY
+        weight = float(parts[2]) if len(parts) > 2 and parts[2] else 1.0
+        endpoints.append(AIEndpoint(parts[0], api_key, weight))
+    return endpoints or [AIEndpoint(AI_API_URL, OPENAI_API_KEY)]
+
+_pool = EndpointPool(parse_endpoints(AI_ENDPOINTS), AI_ENDPOINT_COOLDOWN, AI_ENDPOINT_MAX_COOLDOWN)
+if len(_pool.endpoints) > 1:
+    log_info(f"AI endpoint pool: {', '.join(endpoint.name for endpoint in _pool.endpoints)}")
+
+def _is_endpoint_failure(error: Exception) -> bool:
+    from src.ai.client import AIResponseError
+
+    if isinstance(error, (asyncio.TimeoutError, aiohttp.ClientError)):
+        return True
+    if isinstance(error, AIResponseError):
+        return error.status is not None and (error.status == 429 or error.status >= 500)
+    return False
+
+@asynccontextmanager
+async def endpoint_lease():
+    """
+    Контекст запроса к точке доступа из пула: выдает точку и учитывает результат запроса.
+
+    Yields:
+        AIEndpoint: Точка доступа для запроса.
+    """
+    endpoint = _pool.acquire()
+    started = time.monotonic()
+    try:
+        yield endpoint
+    except (asyncio.CancelledError, GeneratorExit):
+        endpoint.outstanding -= 1
+        raise
+    except Exception as e:
+        failed = _is_endpoint_failure(e)
+        _pool.release(endpoint, not failed, time.monotonic() - started, getattr(e, "retry_after", None) if failed else None)
+        raise
+    _pool.release(endpoint, True, time.monotonic() - started)
+
+def get_endpoint_stats() -> List[dict]:
+    """
+    Получение метрик точек доступа к API ИИ.
+
+    Returns:
+        List[dict]: Для каждой точки: вес, выполняющиеся запросы, доступность, оставшееся время
+        охлаждения, число запросов, ошибок, исключений и задержка p50.
+    """
+    return _pool.snapshot()
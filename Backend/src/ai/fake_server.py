@@ -0,0 +1,203 @@
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from typing import List
+
+from aiohttp import web
+
+from config.config import (
+    AI_FAKE_SERVER_HOST, AI_FAKE_SERVER_PORT, AI_FAKE_LATENCY, AI_FAKE_LATENCY_MS,
+    AI_FAKE_LATENCY_SIGMA, AI_FAKE_TAIL_ALPHA, AI_FAKE_MAX_LATENCY_MS, AI_FAKE_ERROR_RATE,
+    AI_FAKE_ERROR_STATUSES, AI_FAKE_HANG_RATE, AI_FAKE_COMPLETION_TOKENS, AI_FAKE_TOKEN_DELAY_MS
+)
+
+LATENCY_FIXED = "fixed"
+LATENCY_LOGNORMAL = "lognormal"
+LATENCY_HEAVY_TAIL = "heavy_tail"
+
+# Слова, из которых собирается ответ: один "токен" ответа - одно слово
+CANNED_WORDS = [
+    "Карты", "указывают", "на", "период", "перемен,", "в", "котором", "важно", "довериться",
+    "интуиции.", "Прислушайтесь", "к", "себе", "и", "не", "торопите", "события;", "ответ",
+    "придет", "в", "свое", "время."
+]
+
+class FakeServerSettings:
+    """
+    Параметры поддельного сервера: распределение задержки, доля ошибок и размер ответа.
+    """
+
+    def __init__(
+        self,
+        latency: str = AI_FAKE_LATENCY,
+        latency_ms: float = AI_FAKE_LATENCY_MS,
+        sigma: float = AI_FAKE_LATENCY_SIGMA,
+        tail_alpha: float = AI_FAKE_TAIL_ALPHA,
+        max_latency_ms: float = AI_FAKE_MAX_LATENCY_MS,
+        error_rate: float = AI_FAKE_ERROR_RATE,
+        error_statuses: str = AI_FAKE_ERROR_STATUSES,
+        hang_rate: float = AI_FAKE_HANG_RATE,
+        completion_tokens: int = AI_FAKE_COMPLETION_TOKENS,
+        token_delay_ms: float = AI_FAKE_TOKEN_DELAY_MS
+    ):
+        if latency not in (LATENCY_FIXED, LATENCY_LOGNORMAL, LATENCY_HEAVY_TAIL):
+            raise ValueError(f"Unknown latency distribution: {latency}")
+        self.latency = latency
+        self.latency_ms = latency_ms
+        self.sigma = sigma
+        self.tail_alpha = tail_alpha
+        self.max_latency_ms = max_latency_ms
+        self.error_rate = error_rate
+        self.error_statuses: List[int] = [int(status) for status in error_statuses.split(",") if status.strip()]
+        self.hang_rate = hang_rate
+        self.completion_tokens = completion_tokens
+        self.token_delay_ms = token_delay_ms
+
+    def sample_latency(self) -> float:
+        """
+        Задержка до первого байта ответа в секундах по выбранному распределению.
+
+        Returns:
+            float: Задержка в секундах, не больше max_latency_ms.
+        """
+        if self.latency == LATENCY_FIXED:
+            latency_ms = self.latency_ms
+        elif self.latency == LATENCY_LOGNORMAL:
+            # latency_ms - медиана распределения
+            latency_ms = random.lognormvariate(math.log(self.latency_ms), self.sigma)
+        else:
+            # Распределение Парето: большинство ответов около latency_ms, редкие - в разы дольше
+            latency_ms = self.latency_ms * random.paretovariate(self.tail_alpha)
+        return min(latency_ms, self.max_latency_ms) / 1000.0
+
+def _count_prompt_tokens(messages: list) -> int:
+    # Грубая оценка: около 4 символов на токен
+    return sum(len(str(message.get("content", ""))) for message in messages) // 4 + 1
+
+def _completion_words(max_tokens: int, completion_tokens: int) -> List[str]:
+    count = max(1, min(completion_tokens, max_tokens or completion_tokens))
+    return [CANNED_WORDS[i % len(CANNED_WORDS)] for i in range(count)]
+
+def _usage(prompt_tokens: int, completion_tokens: int) -> dict:
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens
+    }
+
+async def chat_completions(request: web.Request) -> web.StreamResponse:
+    settings: FakeServerSettings = request.app["settings"]
+    stats = request.app["stats"]
+    stats["requests"] += 1
+    stats["in_flight"] += 1
+    stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+    try:
+        body = await request.json()
+        if random.random() < settings.hang_rate:
+            # Зависший запрос: клиент должен отвалиться по своему таймауту
+            stats["hung"] += 1
+            await asyncio.sleep(settings.max_latency_ms / 1000.0)
+        await asyncio.sleep(settings.sample_latency())
+        if settings.error_statuses and random.random() < settings.error_rate:
+            status = random.choice(settings.error_statuses)
+            stats["errors"] += 1
+            headers = {"Retry-After": "1"} if status == 429 else None
+            return web.json_response(
+                {"error": {"message": f"Injected error {status}", "type": "fake_server_error"}},
+                status=status,
+                headers=headers
+            )
+
+        model = body.get("model", "gpt-4o")
+        words = _completion_words(body.get("max_tokens"), settings.completion_tokens)
+        prompt_tokens = _count_prompt_tokens(body.get("messages", []))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        stats["completion_tokens"] += len(words)
+
+        if not body.get("stream"):
+            return web.json_response({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)}, "finish_reason": "stop"}],
+                "usage": _usage(prompt_tokens, len(words))
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+
+        async def send(chunk: dict):
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+        base = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model}
+        await send({**base, "choices": [{"index": 0, "delta": {"role": "assistant"}, "finish_reason": None}]})
+        for index, word in enumerate(words):
+            await send({**base, "choices": [{"index": 0, "delta": {"content": word if index == 0 else " " + word}, "finish_reason": None}]})
+            await asyncio.sleep(settings.token_delay_ms / 1000.0)
+        await send({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if (body.get("stream_options") or {}).get("include_usage"):
+            await send({**base, "choices": [], "usage": _usage(prompt_tokens, len(words))})
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+    finally:
+        stats["in_flight"] -= 1
+
+async def server_stats(request: web.Request) -> web.Response:
+    return web.json_response(request.app["stats"])
+
+def create_app(settings: FakeServerSettings = None) -> web.Application:
+    """
+    Создание приложения поддельного OpenAI-совместимого сервера.
+
+    Сервер отвечает на POST /v1/chat/completions в обычном и потоковом режимах
+    заготовленным текстом со счетчиками токенов, а GET /stats возвращает счетчики запросов.
+
+    Args:
+        settings: Параметры сервера (по умолчанию берутся из конфигурации AI_FAKE_*).
+
+    Returns:
+        web.Application: Приложение aiohttp.
+    """
+    app = web.Application()
+    app["settings"] = settings or FakeServerSettings()
+    app["stats"] = {"requests": 0, "errors": 0, "hung": 0, "in_flight": 0, "max_in_flight": 0, "completion_tokens": 0}
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_get("/stats", server_stats)
+    return app
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Поддельный OpenAI-совместимый сервер для нагрузочного тестирования")
+    parser.add_argument("--host", default=AI_FAKE_SERVER_HOST)
+    parser.add_argument("--port", type=int, default=AI_FAKE_SERVER_PORT)
+    parser.add_argument("--latency", choices=[LATENCY_FIXED, LATENCY_LOGNORMAL, LATENCY_HEAVY_TAIL], default=AI_FAKE_LATENCY, help="Распределение задержки")
+    parser.add_argument("--latency-ms", type=float, default=AI_FAKE_LATENCY_MS, help="Фиксированная задержка или медиана/масштаб распределения")
+    parser.add_argument("--sigma", type=float, default=AI_FAKE_LATENCY_SIGMA, help="Сигма логнормального распределения")
+    parser.add_argument("--tail-alpha", type=float, default=AI_FAKE_TAIL_ALPHA, help="Параметр формы распределения Парето (меньше - тяжелее хвост)")
+    parser.add_argument("--max-latency-ms", type=float, default=AI_FAKE_MAX_LATENCY_MS, help="Верхняя граница задержки и время зависания")
+    parser.add_argument("--error-rate", type=float, default=AI_FAKE_ERROR_RATE, help="Доля ответов с ошибкой")
+    parser.add_argument("--error-statuses", default=AI_FAKE_ERROR_STATUSES, help="Коды ошибок через запятую")
+    parser.add_argument("--hang-rate", type=float, default=AI_FAKE_HANG_RATE, help="Доля зависающих запросов")
+    parser.add_argument("--completion-tokens", type=int, default=AI_FAKE_COMPLETION_TOKENS, help="Число токенов в ответе")
+    parser.add_argument("--token-delay-ms", type=float, default=AI_FAKE_TOKEN_DELAY_MS, help="Пауза между токенами в потоковом режиме")
+    args = parser.parse_args()
+    fake_settings = FakeServerSettings(
+        latency=args.latency,
+        latency_ms=args.latency_ms,
+        sigma=args.sigma,
+        tail_alpha=args.tail_alpha,
+        max_latency_ms=args.max_latency_ms,
+        error_rate=args.error_rate,
+        error_statuses=args.error_statuses,
+        hang_rate=args.hang_rate,
+        completion_tokens=args.completion_tokens,
+        token_delay_ms=args.token_delay_ms
+    )
+    print(f"Fake AI server on http://{args.host}:{args.port}/v1/chat/completions ({args.latency}, {args.latency_ms} ms)")
+    web.run_app(create_app(fake_settings), host=args.host, port=args.port, print=None)
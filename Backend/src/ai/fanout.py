@@ -0,0 +1,49 @@
+import asyncio
+from typing import List, Optional
+
+from src.utils.logger import log_warning
+from config.config import AI_FANOUT_CONCURRENCY, AI_FANOUT_DEADLINE
+
+async def gather_ai_responses(prompts: List[str], concurrency: int = AI_FANOUT_CONCURRENCY, deadline: float = AI_FANOUT_DEADLINE, **kwargs) -> List[Optional[str]]:
+    """
+    Параллельное выполнение нескольких промптов с ограничением одновременности и общим дедлайном.
+
+    Промпты, не успевшие выполниться к дедлайну или завершившиеся ошибкой, возвращаются как None,
+    остальные результаты возвращаются как есть (частичный результат). Отмена по дедлайну не прерывает
+    уже отправленные запросы к API: их ответы попадут в кеш и пригодятся следующему вызову.
+
+    Args:
+        prompts: Список промптов.
+        concurrency: Максимальное число одновременных запросов.
+        deadline: Общий дедлайн в секундах на все промпты.
+        **kwargs: Дополнительные параметры fetch_ai_response (model, max_tokens, use_cache).
+
+    Returns:
+        List[Optional[str]]: Ответы в порядке промптов, None для невыполненных.
+    """
+    from src.ai.client import fetch_ai_response
+
+    if not prompts:
+        return []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(prompt: str) -> str:
+        async with semaphore:
+            return await fetch_ai_response(prompt, **kwargs)
+
+    tasks = [asyncio.ensure_future(run_one(prompt)) for prompt in prompts]
+    done, pending = await asyncio.wait(tasks, timeout=deadline)
+    for task in pending:
+        task.cancel()
+
+    results = []
+    for prompt, task in zip(prompts, tasks):
+        if task in done and task.exception() is None:
+            results.append(task.result())
+        else:
+            if task in done:
+                log_warning(f"AI fan-out prompt failed: {prompt[:50]}...: {str(task.exception())}")
+            results.append(None)
+    if pending:
+        log_warning(f"AI fan-out deadline of {deadline}s exceeded, {len(pending)} of {len(prompts)} prompts not completed")
+    return results
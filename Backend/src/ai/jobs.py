@@ -0,0 +1,293 @@
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ReturnDocument
+
+from src.ai.rate_limit import resolve_plan
+from src.ai.scheduler import set_priority_class
+from src.ai.usage import set_usage_context
+from src.utils.logger import log_info, log_warning, log_error
+from config.config import (
+    AI_JOB_WORKERS, AI_JOB_LEASE_SECONDS, AI_JOB_MAX_ATTEMPTS,
+    AI_JOB_POLL_INTERVAL, AI_JOB_MAX_WAIT, AI_JOB_RESULT_TTL
+)
+
+JOBS_COLLECTION = "ai_jobs"
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+FINAL_STATUSES = (STATUS_DONE, STATUS_FAILED)
+
+# Обработчики задач по типу: async handler(db, payload, job_id) -> dict с результатом
+_handlers: Dict[str, Callable[..., Awaitable[dict]]] = {}
+_workers: List[asyncio.Task] = []
+# Уведомления воркеров этого процесса о новых задачах; задачи других процессов
+# подбираются опросом раз в AI_JOB_POLL_INTERVAL
+_notify: Optional[asyncio.Queue] = None
+# Ожидающие long-poll запросы по идентификатору задачи и число ожидающих каждой задачи
+_waiters: Dict[str, asyncio.Event] = {}
+_waiter_counts: Dict[str, int] = {}
+_stats = {"enqueued": 0, "completed": 0, "failed": 0, "retried": 0, "lost_leases": 0}
+
+def register_job_handler(kind: str, handler: Callable[..., Awaitable[dict]]):
+    """
+    Регистрация обработчика задач указанного типа.
+
+    Args:
+        kind: Тип задачи (например, "tarot_draw").
+        handler: Корутина handler(db, payload, job_id), возвращающая результат задачи. Попытка
+            может повториться, поэтому побочные эффекты обработчика привязываются к job_id,
+            а ошибки выбрасываются, а не возвращаются в результате.
+    """
+    _handlers[kind] = handler
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+def _get_notify() -> asyncio.Queue:
+    global _notify
+    if _notify is None:
+        _notify = asyncio.Queue(maxsize=1000)
+    return _notify
+
+async def enqueue_job(db, kind: str, payload: dict, user_id: Optional[str] = None) -> str:
+    """
+    Постановка задачи в очередь.
+
+    Args:
+        db: Объект базы данных.
+        kind: Тип задачи, для которого зарегистрирован обработчик.
+        payload: Параметры задачи.
+        user_id: Идентификатор пользователя, поставившего задачу.
+
+    Returns:
+        str: Идентификатор задачи.
+    """
+    if kind not in _handlers:
+        raise ValueError(f"Unknown job kind: {kind}")
+    job_id = uuid.uuid4().hex
+    now = _now()
+    await db[JOBS_COLLECTION].insert_one({
+        "_id": job_id,
+        "kind": kind,
+        "user_id": user_id,
+        "payload": payload,
+        "status": STATUS_QUEUED,
+        "attempts": 0,
+        "created_at": now,
+        "updated_at": now
+    })
+    _stats["enqueued"] += 1
+    try:
+        _get_notify().put_nowait(job_id)
+    except asyncio.QueueFull:
+        pass  # Воркеры и так заняты, задачу подберет опрос
+    log_info(f"AI job {job_id} ({kind}) enqueued for user {user_id}")
+    return job_id
+
+async def _claim_job(db) -> Optional[dict]:
+    # Берем самую старую задачу из очереди или задачу, чей воркер не продлил аренду (упал процесс).
+    # Каждый захват получает свой lease_owner: продление и запись результата проходят только
+    # у текущего владельца, поэтому воркер, потерявший аренду, не перезапишет задачу
+    now = _now()
+    return await db[JOBS_COLLECTION].find_one_and_update(
+        {"$or": [
+            {"status": STATUS_QUEUED},
+            {"status": STATUS_RUNNING, "lease_until": {"$lt": now}}
+        ]},
+        {
+            "$set": {
+                "status": STATUS_RUNNING, "started_at": now, "updated_at": now,
+                "lease_until": now + timedelta(seconds=AI_JOB_LEASE_SECONDS), "lease_owner": uuid.uuid4().hex
+            },
+            "$inc": {"attempts": 1}
+        },
+        sort=[("created_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+async def _finish_job(db, job: dict, status: str, result: Optional[dict] = None, error: Optional[str] = None):
+    job_id = job["_id"]
+    now = _now()
+    update = {
+        "status": status,
+        "updated_at": now,
+        "finished_at": now,
+        "expires_at": now + timedelta(seconds=AI_JOB_RESULT_TTL)
+    }
+    if result is not None:
+        update["result"] = result
+    if error is not None:
+        update["error"] = error
+    finished = await db[JOBS_COLLECTION].update_one(
+        {"_id": job_id, "lease_owner": job["lease_owner"]},
+        {"$set": update, "$unset": {"lease_until": "", "lease_owner": ""}}
+    )
+    if not finished.matched_count:
+        _stats["lost_leases"] += 1
+        log_warning(f"AI job {job_id} was reclaimed by another worker, result of this attempt discarded")
+        return
+    _stats["completed" if status == STATUS_DONE else "failed"] += 1
+    event = _waiters.pop(job_id, None)
+    if event is not None:
+        event.set()
+
+async def _heartbeat(db, job: dict, task: asyncio.Task):
+    # Продление аренды, пока выполняется обработчик: вызов ИИ с повторами и запасным маршрутом
+    # может идти дольше AI_JOB_LEASE_SECONDS
+    while True:
+        await asyncio.sleep(AI_JOB_LEASE_SECONDS / 3)
+        try:
+            renewed = await db[JOBS_COLLECTION].update_one(
+                {"_id": job["_id"], "lease_owner": job["lease_owner"]},
+                {"$set": {"lease_until": _now() + timedelta(seconds=AI_JOB_LEASE_SECONDS)}}
+            )
+        except Exception as e:
+            log_warning(f"Could not renew lease of AI job {job['_id']}: {str(e)}")
+            continue
+        if not renewed.matched_count:
+            # Задачу уже выполняет другой воркер: эта попытка прерывается, чтобы не повторять запрос к ИИ
+            log_warning(f"AI job {job['_id']} lease lost, cancelling this attempt")
+            task.cancel()
+            return
+
+async def _run_job(db, job: dict):
+    job_id = job["_id"]
+    handler = _handlers.get(job["kind"])
+    if handler is None:
+        await _finish_job(db, job, STATUS_FAILED, error=f"Unknown job kind: {job['kind']}")
+        return
+    if job["attempts"] > AI_JOB_MAX_ATTEMPTS:
+        await _finish_job(db, job, STATUS_FAILED, error="Job exceeded the maximum number of attempts")
+        log_error(f"AI job {job_id} ({job['kind']}) abandoned after {AI_JOB_MAX_ATTEMPTS} attempts")
+        return
+    set_usage_context(endpoint=f"job {job['kind']}", user=f"user:{job['user_id']}" if job.get("user_id") else "unknown")
+    heartbeat = None
+    try:
+        set_priority_class(await resolve_plan(db, job.get("user_id")))
+        task = asyncio.create_task(handler(db, job["payload"], job_id))
+        heartbeat = asyncio.create_task(_heartbeat(db, job, task))
+        try:
+            result = await task
+        except asyncio.CancelledError:
+            if heartbeat.done():
+                # Аренду потерял этот воркер, задачу завершит новый владелец
+                _stats["lost_leases"] += 1
+                return
+            task.cancel()
+            raise
+    except Exception as e:
+        if job["attempts"] < AI_JOB_MAX_ATTEMPTS:
+            requeued = await db[JOBS_COLLECTION].update_one(
+                {"_id": job_id, "lease_owner": job["lease_owner"]},
+                {"$set": {"status": STATUS_QUEUED, "updated_at": _now(), "error": str(e)}, "$unset": {"lease_until": "", "lease_owner": ""}}
+            )
+            if requeued.matched_count:
+                _stats["retried"] += 1
+                log_warning(f"AI job {job_id} ({job['kind']}) failed, requeued: {str(e)}")
+        else:
+            log_error(f"AI job {job_id} ({job['kind']}) failed: {str(e)}")
+            await _finish_job(db, job, STATUS_FAILED, error=str(e))
+        return
+    finally:
+        if heartbeat is not None:
+            heartbeat.cancel()
+    await _finish_job(db, job, STATUS_DONE, result=result)
+    log_info(f"AI job {job_id} ({job['kind']}) completed")
+
+async def _worker(db):
+    notify = _get_notify()
+    while True:
+        try:
+            job = await _claim_job(db)
+        except Exception as e:
+            log_warning(f"AI job worker could not claim a job: {str(e)}")
+            await asyncio.sleep(AI_JOB_POLL_INTERVAL)
+            continue
+        if job is None:
+            try:
+                await asyncio.wait_for(notify.get(), timeout=AI_JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        try:
+            await _run_job(db, job)
+        except Exception as e:
+            # Ошибка записи результата: задача останется running и будет повторена после истечения аренды
+            log_error(f"AI job worker error for job {job['_id']}: {str(e)}")
+
+def start_job_workers(db, workers: int = AI_JOB_WORKERS):
+    """
+    Запуск воркеров очереди задач в текущем event loop.
+
+    Args:
+        db: Объект базы данных.
+        workers: Число воркеров (одновременно выполняемых задач).
+    """
+    if _workers:
+        return
+    for _ in range(workers):
+        _workers.append(asyncio.create_task(_worker(db)))
+    log_info(f"Started {workers} AI job workers")
+
+async def stop_job_workers():
+    """
+    Остановка воркеров очереди задач. Прерванные задачи будут повторены после истечения аренды.
+    """
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+
+async def wait_for_job(db, job_id: str, user_id: str, wait: float = 0) -> Optional[dict]:
+    """
+    Получение задачи с ожиданием ее завершения (long-poll).
+
+    Args:
+        db: Объект базы данных.
+        job_id: Идентификатор задачи.
+        user_id: Идентификатор пользователя; задачи других пользователей не возвращаются.
+        wait: Сколько секунд ждать завершения (не больше AI_JOB_MAX_WAIT).
+
+    Returns:
+        Optional[dict]: Документ задачи или None, если задача не найдена или принадлежит другому пользователю.
+    """
+    deadline = time.monotonic() + max(0.0, min(wait, AI_JOB_MAX_WAIT))
+    registered = False
+    try:
+        while True:
+            job = await db[JOBS_COLLECTION].find_one({"_id": job_id, "user_id": user_id})
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in FINAL_STATUSES or remaining <= 0:
+                return job
+            if not registered:
+                _waiter_counts[job_id] = _waiter_counts.get(job_id, 0) + 1
+                registered = True
+            # Задачи этого процесса будят ожидающих сразу, задачи других процессов видны при повторном чтении
+            event = _waiters.setdefault(job_id, asyncio.Event())
+            try:
+                await asyncio.wait_for(event.wait(), timeout=min(remaining, AI_JOB_POLL_INTERVAL))
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        # Запись об ожидании удаляется, когда ушел последний ожидающий (в том числе по таймауту или разрыву соединения)
+        if registered:
+            _waiter_counts[job_id] -= 1
+            if not _waiter_counts[job_id]:
+                del _waiter_counts[job_id]
+                _waiters.pop(job_id, None)
+
+def get_job_stats() -> dict:
+    """
+    Получение статистики очереди задач.
+
+    Returns:
+        dict: Количество поставленных, выполненных, неудачных и повторенных задач, попыток, потерявших
+        аренду, число воркеров и задач с ожидающими запросами.
+    """
+    return {**_stats, "workers": len(_workers), "waiters": len(_waiters)}
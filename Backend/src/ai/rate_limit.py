@@ -0,0 +1,159 @@
+import math
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+from config.config import (
+    AI_RATE_LIMIT_ENABLED, AI_RATE_FREE_BURST, AI_RATE_FREE_PER_MINUTE,
+    AI_RATE_SUBSCRIBER_BURST, AI_RATE_SUBSCRIBER_PER_MINUTE,
+    AI_RATE_IDLE_TTL, AI_RATE_MAX_BUCKETS, AI_PRIORITY_ENABLED
+)
+
+PLAN_FREE = "free"
+PLAN_SUBSCRIBER = "subscriber"
+
+class TokenBucketLimiter:
+    """
+    Ограничитель частоты запросов на основе корзин токенов, по одной на ключ.
+
+    Корзины хранятся в OrderedDict в порядке последнего обращения, поэтому проверка
+    и вытеснение неактивных корзин выполняются за амортизированное O(1).
+    """
+
+    def __init__(self, plans: Dict[str, Tuple[float, float]], idle_ttl: float, max_buckets: int):
+        # plans: план -> (емкость корзины, пополнение в токенах в секунду)
+        self.plans = plans
+        self.idle_ttl = idle_ttl
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()
+        self.stats = {plan: {"allowed": 0, "denied": 0} for plan in plans}
+
+    def _evict(self, now: float):
+        while self._buckets:
+            key, (_, last_seen, _) = next(iter(self._buckets.items()))
+            if now - last_seen <= self.idle_ttl and len(self._buckets) < self.max_buckets:
+                break
+            del self._buckets[key]
+
+    def consume(self, key: str, plan: str, cost: float = 1.0) -> float:
+        """
+        Попытка списать токены из корзины ключа.
+
+        Args:
+            key: Ключ корзины (идентификатор пользователя).
+            plan: План пользователя, определяющий емкость и скорость пополнения.
+            cost: Количество списываемых токенов.
+
+        Returns:
+            float: 0, если запрос разрешен, иначе число секунд до появления нужных токенов.
+        """
+        now = time.monotonic()
+        self._evict(now)
+        burst, rate = self.plans[plan]
+        bucket = self._buckets.pop(key, None)
+        if bucket is None:
+            tokens = burst
+        else:
+            tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+        if tokens >= cost:
+            self._buckets[key] = (tokens - cost, now, plan)
+            self.stats[plan]["allowed"] += 1
+            return 0.0
+        self._buckets[key] = (tokens, now, plan)
+        self.stats[plan]["denied"] += 1
+        return (cost - tokens) / rate
+
+    def __len__(self):
+        return len(self._buckets)
+
+_limiter = TokenBucketLimiter(
+    {
+        PLAN_FREE: (AI_RATE_FREE_BURST, AI_RATE_FREE_PER_MINUTE / 60.0),
+        PLAN_SUBSCRIBER: (AI_RATE_SUBSCRIBER_BURST, AI_RATE_SUBSCRIBER_PER_MINUTE / 60.0),
+    },
+    idle_ttl=AI_RATE_IDLE_TTL,
+    max_buckets=AI_RATE_MAX_BUCKETS
+)
+
+def is_subscriber(user) -> bool:
+    """
+    Проверка, есть ли у пользователя действующая подписка.
+
+    Args:
+        user: Объект User или None.
+
+    Returns:
+        bool: True, если подписка активна и не истекла.
+    """
+    if user is None or user.subscription_status != "active":
+        return False
+    return user.subscription_expires is None or user.subscription_expires > datetime.now()
+
+async def resolve_plan(db, user_id: Optional[str]) -> str:
+    """
+    Определение плана пользователя по подписке.
+
+    Args:
+        db: Объект базы данных.
+        user_id: Идентификатор пользователя (может отсутствовать или быть "unknown").
+
+    Returns:
+        str: PLAN_SUBSCRIBER для действующей подписки, иначе PLAN_FREE.
+    """
+    if not user_id or user_id == "unknown":
+        return PLAN_FREE
+    from src.db.operations import get_user_by_user_id
+    user = await get_user_by_user_id(db, user_id)
+    return PLAN_SUBSCRIBER if is_subscriber(user) else PLAN_FREE
+
+async def enforce_ai_rate_limit(db, user_id: Optional[str], fallback_key: Optional[str] = None):
+    """
+    Проверка лимита запросов к ИИ для пользователя.
+
+    Лимит считается по user_id с учетом плана (подписчик или бесплатный); план также задает
+    класс приоритета запросов к ИИ в планировщике.
+    Для анонимных запросов используется fallback_key (например, IP клиента) и бесплатный план.
+    Тот же ключ используется для учета расхода токенов запроса.
+
+    Args:
+        db: Объект базы данных.
+        user_id: Идентификатор пользователя (может отсутствовать или быть "unknown").
+        fallback_key: Ключ для анонимных запросов.
+
+    Raises:
+        HTTPException: 429 с заголовком Retry-After, если лимит исчерпан.
+    """
+    from src.ai.usage import set_usage_context
+    from src.ai.scheduler import set_priority_class
+
+    key = f"user:{user_id}" if user_id and user_id != "unknown" else f"anon:{fallback_key or 'unknown'}"
+    # Расход токенов дальнейших запросов к ИИ записывается на этот же ключ
+    set_usage_context(user=key)
+    if not AI_RATE_LIMIT_ENABLED and not AI_PRIORITY_ENABLED:
+        return
+    plan = await resolve_plan(db, user_id)
+    # Запросы подписчиков обслуживаются планировщиком в приоритетном классе
+    set_priority_class(plan)
+    if not AI_RATE_LIMIT_ENABLED:
+        return
+    retry_after = _limiter.consume(key, plan)
+    if retry_after > 0:
+        from src.utils.logger import log_info
+        log_info(f"AI rate limit exceeded for {key} ({plan}), retry after {retry_after:.1f}s")
+        raise HTTPException(
+            status_code=429,
+            detail="Слишком много запросов к ИИ. Пожалуйста, подождите несколько секунд перед следующим запросом.",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+
+def get_rate_limit_stats() -> dict:
+    """
+    Получение статистики ограничителя частоты запросов.
+
+    Returns:
+        dict: Количество разрешенных и отклоненных запросов по планам и число активных корзин.
+    """
+    return {"enabled": AI_RATE_LIMIT_ENABLED, "buckets": len(_limiter), "plans": _limiter.stats}
@@ -0,0 +1,299 @@
+import asyncio
+import random
+import time
+from collections import deque
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import AsyncContextManager, Awaitable, Callable, Optional
+
+import aiohttp
+
+from src.utils.logger import log_warning
+from config.config import (
+    AI_BREAKER_WINDOW, AI_BREAKER_MIN_CALLS, AI_BREAKER_ERROR_RATE,
+    AI_BREAKER_SLOW_CALL, AI_BREAKER_SLOW_CALL_RATE, AI_BREAKER_OPEN_SECONDS,
+    AI_RETRY_ATTEMPTS, AI_RETRY_BASE_DELAY, AI_RETRY_MAX_DELAY,
+    AI_HEDGE_ENABLED, AI_HEDGE_PERCENTILE, AI_HEDGE_MIN_DELAY
+)
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+class CircuitOpenError(Exception):
+    """
+    Запрос отклонен без обращения к API ИИ: предохранитель открыт из-за деградации API.
+    """
+
+class CircuitBreaker:
+    """
+    Предохранитель для API ИИ.
+
+    Считает исходы последних вызовов в скользящем окне и размыкается, если доля ошибок
+    или медленных вызовов превышает порог. В разомкнутом состоянии вызовы сразу отклоняются;
+    по истечении open_seconds пропускается один пробный вызов, успех которого замыкает цепь.
+    """
+
+    def __init__(self, window: int, min_calls: int, error_rate: float, slow_call: float, slow_call_rate: float, open_seconds: float):
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call = slow_call
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.state = STATE_CLOSED
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.stats = {"opened": 0, "rejected": 0}
+
+    def before_call(self) -> bool:
+        """
+        Проверка перед вызовом.
+
+        Returns:
+            bool: True, если вызов является пробным (в полуоткрытом состоянии).
+
+        Raises:
+            CircuitOpenError: Если вызов отклонен.
+        """
+        if self.state == STATE_OPEN:
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                self.stats["rejected"] += 1
+                raise CircuitOpenError("AI circuit breaker is open")
+            self.state = STATE_HALF_OPEN
+        if self.state == STATE_HALF_OPEN:
+            if self._probe_in_flight:
+                self.stats["rejected"] += 1
+                raise CircuitOpenError("AI circuit breaker is half-open, probe in flight")
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record(self, ok: bool, latency: float, probe: bool = False):
+        slow = latency >= self.slow_call
+        if probe:
+            self._probe_in_flight = False
+            if ok and not slow:
+                self.state = STATE_CLOSED
+                self._outcomes.clear()
+            else:
+                self._open("probe call failed")
+            return
+        if self.state != STATE_CLOSED:
+            # Вызовы, начатые до размыкания, на решение о замыкании не влияют
+            return
+        self._outcomes.append((ok, slow))
+        if len(self._outcomes) < self.min_calls:
+            return
+        errors = sum(1 for outcome_ok, _ in self._outcomes if not outcome_ok) / len(self._outcomes)
+        slow_calls = sum(1 for _, outcome_slow in self._outcomes if outcome_slow) / len(self._outcomes)
+        if errors >= self.error_rate:
+            self._open(f"error rate {errors:.0%}")
+        elif slow_calls >= self.slow_call_rate:
+            self._open(f"slow call rate {slow_calls:.0%}")
+
+    def release(self, probe: bool = False):
+        # Вызов отменен без результата: освобождаем пробный слот, не влияя на статистику
+        if probe:
+            self._probe_in_flight = False
+
+    def _open(self, reason: str):
+        self.state = STATE_OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self.stats["opened"] += 1
+        log_warning(f"AI circuit breaker opened: {reason}")
+
+    def snapshot(self) -> dict:
+        outcomes = len(self._outcomes)
+        return {
+            "state": self.state,
+            "window_calls": outcomes,
+            "window_error_rate": round(sum(1 for ok, _ in self._outcomes if not ok) / outcomes, 4) if outcomes else 0.0,
+            **self.stats
+        }
+
+class LatencyTracker:
+    """
+    Скользящее окно задержек успешных вызовов для расчета перцентилей.
+    """
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+
+    def add(self, latency: float):
+        self._samples.append(latency)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def __len__(self):
+        return len(self._samples)
+
+_breaker = CircuitBreaker(
+    window=AI_BREAKER_WINDOW,
+    min_calls=AI_BREAKER_MIN_CALLS,
+    error_rate=AI_BREAKER_ERROR_RATE,
+    slow_call=AI_BREAKER_SLOW_CALL,
+    slow_call_rate=AI_BREAKER_SLOW_CALL_RATE,
+    open_seconds=AI_BREAKER_OPEN_SECONDS
+)
+_latencies = LatencyTracker()
+_stats = {"retries": 0, "hedged": 0, "hedge_wins": 0}
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Проверка, имеет ли смысл повторять вызов после ошибки.
+
+    Повторяются таймауты, сетевые ошибки, ответы 429/5xx и ответы без вариантов.
+    Прочие ответы 4xx означают ошибку запроса и не повторяются.
+
+    Args:
+        error: Исключение, выброшенное вызовом.
+
+    Returns:
+        bool: True, если ошибка временная.
+    """
+    from src.ai.client import AIResponseError
+
+    if isinstance(error, (asyncio.TimeoutError, aiohttp.ClientError)):
+        return True
+    if isinstance(error, AIResponseError):
+        return error.status is None or error.status == 429 or error.status >= 500
+    return False
+
+@asynccontextmanager
+async def guarded_call(track_latency: bool = True):
+    """
+    Контекст одного вызова API ИИ под защитой предохранителя.
+
+    Args:
+        track_latency: Учитывать ли длительность вызова (для потоков отключается,
+            так как их длительность зависит от длины ответа).
+
+    Raises:
+        CircuitOpenError: Если предохранитель разомкнут.
+    """
+    probe = _breaker.before_call()
+    started = time.monotonic()
+    try:
+        yield
+    except (asyncio.CancelledError, GeneratorExit):
+        _breaker.release(probe)
+        raise
+    except Exception as e:
+        _breaker.record(not is_retryable(e), time.monotonic() - started if track_latency else 0.0, probe)
+        raise
+    latency = time.monotonic() - started
+    _breaker.record(True, latency if track_latency else 0.0, probe)
+    if track_latency:
+        _latencies.add(latency)
+
+def _remaining(deadline: Optional[float]) -> Optional[float]:
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+async def _attempt(call: Callable[[], Awaitable], deadline: Optional[float] = None, slot: Optional[Callable[[], AsyncContextManager]] = None):
+    async with AsyncExitStack() as stack:
+        # Слот занимается до входа в предохранитель: ожидание в локальной очереди не считается
+        # задержкой API и не влияет на решение о размыкании и порог дублирующего запроса
+        if slot is not None:
+            await asyncio.wait_for(stack.enter_async_context(slot()), timeout=_remaining(deadline))
+        # Таймаут внутри guarded_call: вызов, не уложившийся в срок, учитывается предохранителем
+        # как медленная ошибка, а не как отмена без результата
+        async with guarded_call():
+            return await asyncio.wait_for(call(), timeout=_remaining(deadline))
+
+def _hedge_delay() -> Optional[float]:
+    if not AI_HEDGE_ENABLED or len(_latencies) < 20:
+        return None
+    return max(AI_HEDGE_MIN_DELAY, _latencies.percentile(AI_HEDGE_PERCENTILE))
+
+async def _hedged_attempt(call: Callable[[], Awaitable], deadline: Optional[float] = None, slot: Optional[Callable[[], AsyncContextManager]] = None):
+    delay = _hedge_delay()
+    if delay is None:
+        return await _attempt(call, deadline, slot)
+    primary = asyncio.ensure_future(_attempt(call, deadline, slot))
+    pending = {primary}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=delay)
+        if done:
+            return primary.result()
+        # Основной запрос дольше p95: отправляем дублирующий и берем первый успешный ответ
+        _stats["hedged"] += 1
+        backup = asyncio.ensure_future(_attempt(call, deadline, slot))
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is backup:
+                        _stats["hedge_wins"] += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def call_with_resilience(call: Callable[[], Awaitable], idempotent: bool = True, timeout: Optional[float] = None, slot: Optional[Callable[[], AsyncContextManager]] = None):
+    """
+    Вызов API ИИ через предохранитель с повторами и дублирующими запросами.
+
+    Идемпотентные вызовы повторяются при временных ошибках до AI_RETRY_ATTEMPTS раз
+    с экспоненциальной задержкой и случайным разбросом (full jitter). Если включен
+    AI_HEDGE_ENABLED, при задержке дольше p95 отправляется дублирующий запрос.
+
+    Args:
+        call: Функция без аргументов, возвращающая корутину вызова API.
+        idempotent: Можно ли безопасно повторять вызов.
+        timeout: Общий срок на все попытки в секундах. Попытка, прерванная по сроку,
+            учитывается предохранителем как ошибка; повтор, не успевающий до срока, не выполняется.
+        slot: Фабрика контекста слота локальной очереди (например, scheduler.ai_slot). Слот
+            занимается на каждую попытку и дублирующий запрос до начала отсчета задержки.
+
+    Returns:
+        Результат call().
+
+    Raises:
+        CircuitOpenError: Если предохранитель разомкнут.
+        asyncio.TimeoutError: Если срок истек.
+        Exception: Последняя ошибка вызова, если повторы не помогли.
+    """
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    attempts = AI_RETRY_ATTEMPTS + 1 if idempotent else 1
+    for attempt in range(attempts):
+        try:
+            if idempotent:
+                return await _hedged_attempt(call, deadline, slot)
+            return await _attempt(call, deadline, slot)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            if attempt == attempts - 1 or not is_retryable(e):
+                raise
+            delay = random.uniform(0, min(AI_RETRY_MAX_DELAY, AI_RETRY_BASE_DELAY * 2 ** attempt))
+            remaining = _remaining(deadline)
+            if remaining is not None and delay >= remaining:
+                raise
+            _stats["retries"] += 1
+            log_warning(f"AI call failed ({str(e) or type(e).__name__}), retry {attempt + 1} of {AI_RETRY_ATTEMPTS} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+def get_resilience_stats() -> dict:
+    """
+    Получение состояния предохранителя и статистики повторов.
+
+    Returns:
+        dict: Состояние предохранителя, число повторов и дублирующих запросов, p50/p95 задержки.
+    """
+    p50 = _latencies.percentile(0.5)
+    p95 = _latencies.percentile(0.95)
+    return {
+        "breaker": _breaker.snapshot(),
+        **_stats,
+        "latency_p50": round(p50, 3) if p50 is not None else None,
+        "latency_p95": round(p95, 3) if p95 is not None else None
+    }
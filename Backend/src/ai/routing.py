@@ -0,0 +1,133 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from src.ai.resilience import CircuitOpenError, LatencyTracker
+from src.ai.usage import current_endpoint
+from src.utils.logger import log_warning
+from config.config import (
+    AI_ROUTING_ENABLED, AI_MODEL_PRIMARY, AI_MODEL_FAST,
+    AI_ROUTE_SHORT_MAX_TOKENS, AI_ROUTE_STANDARD_MAX_TOKENS, AI_ROUTE_FALLBACK_AFTER
+)
+
+class AIRoute:
+    """
+    Класс промптов: модель, лимит токенов ответа и быстрая модель на случай
+    медленного или недоступного основного ответа.
+    """
+
+    def __init__(self, name: str, model: str, max_tokens: int, fallback_model: Optional[str] = None, fallback_after: Optional[float] = None):
+        self.name = name
+        self.model = model
+        self.max_tokens = max_tokens
+        self.fallback_model = fallback_model if fallback_model != model else None
+        self.fallback_after = fallback_after
+
+ROUTE_SHORT = AIRoute("short", AI_MODEL_FAST, AI_ROUTE_SHORT_MAX_TOKENS)
+ROUTE_STANDARD = AIRoute("standard", AI_MODEL_PRIMARY, AI_ROUTE_STANDARD_MAX_TOKENS, AI_MODEL_FAST, AI_ROUTE_FALLBACK_AFTER)
+ROUTE_DISABLED = AIRoute("default", AI_MODEL_PRIMARY, AI_ROUTE_STANDARD_MAX_TOKENS)
+
+# Эндпоинты с короткими промптами и ответами; остальные идут по стандартному маршруту
+ENDPOINT_ROUTES: Dict[str, AIRoute] = {
+    "GET /cards/list": ROUTE_SHORT,
+    "POST /tarot-reading": ROUTE_SHORT,
+}
+
+_latencies: Dict[str, LatencyTracker] = {}
+_stats: Dict[str, dict] = {}
+
+def resolve_route(endpoint: Optional[str] = None) -> AIRoute:
+    """
+    Выбор маршрута для текущего запроса по эндпоинту.
+
+    Args:
+        endpoint: Эндпоинт (по умолчанию эндпоинт текущего контекста запроса).
+
+    Returns:
+        AIRoute: Маршрут с моделью и лимитом токенов.
+    """
+    if not AI_ROUTING_ENABLED:
+        return ROUTE_DISABLED
+    return ENDPOINT_ROUTES.get(endpoint or current_endpoint(), ROUTE_STANDARD)
+
+def _route_stats(route: AIRoute) -> dict:
+    if route.name not in _stats:
+        _stats[route.name] = {"requests": 0, "fallbacks": 0, "errors": 0, "models": {}}
+        _latencies[route.name] = LatencyTracker()
+    return _stats[route.name]
+
+def _record(route: AIRoute, model: str, started: float):
+    stats = _route_stats(route)
+    stats["models"][model] = stats["models"].get(model, 0) + 1
+    _latencies[route.name].add(time.monotonic() - started)
+
+async def call_with_fallback(route: AIRoute, model: str, call: Callable[[str, Optional[float]], Awaitable[str]], allow_fallback: bool = True) -> Tuple[str, bool]:
+    """
+    Вызов основной модели маршрута с переходом на быструю модель.
+
+    Если основная модель не ответила за fallback_after секунд или вернула ошибку,
+    запрос повторяется на быстрой модели. Срок fallback_after передается в вызов и соблюдается
+    слоем устойчивости (src/ai/resilience.py), чтобы прерванные по сроку попытки учитывались
+    предохранителем. При разомкнутом предохранителе переход не выполняется:
+    обе модели обслуживаются одним API.
+
+    Args:
+        route: Маршрут запроса.
+        model: Основная модель для этого вызова.
+        call: Функция call(model, timeout), выполняющая запрос к указанной модели за timeout
+            секунд (None — без общего срока).
+        allow_fallback: Разрешен ли переход на быструю модель.
+
+    Returns:
+        Tuple[str, bool]: Ответ и признак того, что ответ получен от быстрой модели.
+    """
+    stats = _route_stats(route)
+    stats["requests"] += 1
+    started = time.monotonic()
+    fallback_model = route.fallback_model if allow_fallback and model != route.fallback_model else None
+    try:
+        content = await call(model, route.fallback_after if fallback_model else None)
+    except CircuitOpenError:
+        stats["errors"] += 1
+        raise
+    except Exception as e:
+        if not fallback_model:
+            stats["errors"] += 1
+            raise
+        stats["fallbacks"] += 1
+        reason = "timed out" if isinstance(e, asyncio.TimeoutError) else f"failed ({str(e) or type(e).__name__})"
+        log_warning(f"AI route {route.name}: {model} {reason}, falling back to {fallback_model}")
+        try:
+            content = await call(fallback_model, None)
+        except Exception:
+            stats["errors"] += 1
+            raise
+        _record(route, fallback_model, started)
+        return content, True
+    _record(route, model, started)
+    return content, False
+
+def get_routing_stats() -> dict:
+    """
+    Получение статистики маршрутизации по маршрутам.
+
+    Returns:
+        dict: Для каждого маршрута: модель, лимит токенов, число запросов, переходов на быструю модель,
+        ошибок, ответов по моделям и задержки p50/p95.
+    """
+    routes = {}
+    for route in (ROUTE_SHORT, ROUTE_STANDARD, ROUTE_DISABLED):
+        stats = _stats.get(route.name)
+        if stats is None:
+            continue
+        p50 = _latencies[route.name].percentile(0.5)
+        p95 = _latencies[route.name].percentile(0.95)
+        routes[route.name] = {
+            "model": route.model,
+            "max_tokens": route.max_tokens,
+            "fallback_model": route.fallback_model,
+            **stats,
+            "latency_p50": round(p50, 3) if p50 is not None else None,
+            "latency_p95": round(p95, 3) if p95 is not None else None
+        }
+    return {"enabled": AI_ROUTING_ENABLED, "routes": routes}
@@ -0,0 +1,189 @@
+import asyncio
+import contextvars
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, List, Optional, Tuple
+
+from src.ai.resilience import LatencyTracker
+from config.config import (
+    AI_MAX_CONCURRENCY, AI_PRIORITY_ENABLED,
+    AI_PRIORITY_SUBSCRIBER_WEIGHT, AI_PRIORITY_FREE_WEIGHT,
+    AI_PRIORITY_SUBSCRIBER_CONCURRENCY, AI_PRIORITY_FREE_CONCURRENCY,
+    AI_PRIORITY_MAX_WAIT
+)
+
+CLASS_SUBSCRIBER = "subscriber"
+CLASS_FREE = "free"
+
+# Класс приоритета текущего запроса; задается ограничителем частоты запросов и воркерами задач
+_priority: contextvars.ContextVar[str] = contextvars.ContextVar("ai_priority_class", default=CLASS_FREE)
+
+class PriorityClass:
+    """
+    Класс приоритета: вес в справедливой очереди, лимит одновременных запросов и очередь ожидающих.
+    """
+
+    def __init__(self, name: str, weight: float, concurrency: int):
+        self.name = name
+        self.weight = max(weight, 0.01)
+        self.concurrency = max(concurrency, 1)
+        self.active = 0
+        self.last_finish = 0.0
+        # (виртуальное время окончания, время постановки в очередь, future)
+        self.waiters: Deque[Tuple[float, float, asyncio.Future]] = deque()
+        self.waits = LatencyTracker(1000)
+        self.stats = {"granted": 0, "queued": 0, "promoted": 0, "cancelled": 0, "max_depth": 0}
+
+class PriorityScheduler:
+    """
+    Планировщик запросов к API ИИ со взвешенной справедливой очередью между классами.
+
+    Пока есть свободные слоты, запросы проходят сразу. При насыщении каждый ожидающий запрос
+    получает виртуальное время окончания (время класса + 1 / вес), и освободившийся слот
+    отдается запросу с наименьшим временем среди классов, не исчерпавших свой лимит.
+    Запрос, прождавший дольше max_wait, получает слот первым, поэтому бесплатный класс
+    не голодает даже при постоянной нагрузке подписчиков.
+    """
+
+    def __init__(self, classes: List[PriorityClass], total: int, max_wait: float):
+        self.classes: Dict[str, PriorityClass] = {item.name: item for item in classes}
+        self.total = total
+        self.max_wait = max_wait
+        self.active = 0
+        self.virtual_time = 0.0
+
+    def _has_capacity(self, item: PriorityClass) -> bool:
+        return self.active < self.total and item.active < item.concurrency
+
+    def _grant(self, item: PriorityClass, enqueued: float, now: float):
+        self.active += 1
+        item.active += 1
+        item.stats["granted"] += 1
+        item.waits.add(now - enqueued)
+
+    def _next_waiter(self, now: float) -> Optional[PriorityClass]:
+        ready = [item for item in self.classes.values() if item.waiters and item.active < item.concurrency]
+        if not ready:
+            return None
+        overdue = [item for item in ready if now - item.waiters[0][1] >= self.max_wait]
+        if overdue:
+            item = min(overdue, key=lambda candidate: candidate.waiters[0][1])
+            item.stats["promoted"] += 1
+            return item
+        return min(ready, key=lambda candidate: candidate.waiters[0][0])
+
+    def _dispatch(self):
+        now = time.monotonic()
+        while self.active < self.total:
+            item = self._next_waiter(now)
+            if item is None:
+                return
+            finish, enqueued, future = item.waiters.popleft()
+            if future.done():
+                continue
+            self.virtual_time = max(self.virtual_time, finish)
+            self._grant(item, enqueued, now)
+            future.set_result(None)
+
+    def _release(self, item: PriorityClass):
+        self.active -= 1
+        item.active -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, class_name: str):
+        """
+        Занятие слота для запроса к API ИИ.
+
+        Args:
+            class_name: Класс приоритета запроса.
+        """
+        item = self.classes.get(class_name) or self.classes[CLASS_FREE]
+        now = time.monotonic()
+        if not item.waiters and self._has_capacity(item):
+            self._grant(item, now, now)
+        else:
+            finish = max(self.virtual_time, item.last_finish) + 1.0 / item.weight
+            item.last_finish = finish
+            future = asyncio.get_running_loop().create_future()
+            item.waiters.append((finish, now, future))
+            item.stats["queued"] += 1
+            item.stats["max_depth"] = max(item.stats["max_depth"], len(item.waiters))
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Слот уже выдан, но запрос отменен до начала: слот возвращается следующему
+                    self._release(item)
+                else:
+                    try:
+                        item.waiters.remove((finish, now, future))
+                    except ValueError:
+                        pass
+                item.stats["cancelled"] += 1
+                raise
+        try:
+            yield
+        finally:
+            self._release(item)
+
+    def snapshot(self) -> dict:
+        classes = {}
+        for item in self.classes.values():
+            p50 = item.waits.percentile(0.5)
+            p99 = item.waits.percentile(0.99)
+            classes[item.name] = {
+                "weight": item.weight,
+                "concurrency": item.concurrency,
+                "active": item.active,
+                "queue_depth": len(item.waiters),
+                **item.stats,
+                "wait_p50": round(p50, 3) if p50 is not None else None,
+                "wait_p99": round(p99, 3) if p99 is not None else None
+            }
+        return {"active": self.active, "total": self.total, "classes": classes}
+
+def _build_scheduler() -> PriorityScheduler:
+    if not AI_PRIORITY_ENABLED:
+        # Без приоритетов все запросы делят один класс с общим лимитом, как обычный семафор
+        return PriorityScheduler([PriorityClass(CLASS_FREE, 1.0, AI_MAX_CONCURRENCY)], AI_MAX_CONCURRENCY, float("inf"))
+    return PriorityScheduler(
+        [
+            PriorityClass(CLASS_SUBSCRIBER, AI_PRIORITY_SUBSCRIBER_WEIGHT, AI_PRIORITY_SUBSCRIBER_CONCURRENCY),
+            PriorityClass(CLASS_FREE, AI_PRIORITY_FREE_WEIGHT, AI_PRIORITY_FREE_CONCURRENCY),
+        ],
+        AI_MAX_CONCURRENCY,
+        AI_PRIORITY_MAX_WAIT
+    )
+
+_scheduler = _build_scheduler()
+
+def set_priority_class(class_name: str):
+    """
+    Установка класса приоритета для запросов к ИИ в текущем контексте.
+
+    Args:
+        class_name: Класс приоритета (subscriber или free).
+    """
+    _priority.set(class_name)
+
+def ai_slot():
+    """
+    Слот для запроса к API ИИ с учетом класса приоритета текущего контекста.
+
+    Returns:
+        Асинхронный контекстный менеджер, удерживающий слот на время запроса.
+    """
+    return _scheduler.slot(_priority.get())
+
+def get_scheduler_stats() -> dict:
+    """
+    Получение статистики планировщика запросов к ИИ.
+
+    Returns:
+        dict: Занятые слоты и для каждого класса: вес, лимит, занятые слоты, глубина очереди,
+        число выданных, ожидавших, повышенных по времени ожидания и отмененных запросов,
+        время ожидания p50/p99.
+    """
+    return {"enabled": AI_PRIORITY_ENABLED, **_scheduler.snapshot()}
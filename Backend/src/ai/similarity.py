@@ -0,0 +1,204 @@
+import hashlib
+import random
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from config.config import (
+    AI_SIMILARITY_CACHE_ENABLED, AI_SIMILARITY_THRESHOLD, AI_SIMILARITY_MAX_ENTRIES,
+    AI_SIMILARITY_TTL, AI_SIMILARITY_PERMUTATIONS, AI_SIMILARITY_BANDS
+)
+
+STOP_WORDS = frozenset("""
+а без более бы был была были было быть в вам вас весь во вот все всего всех вы где да даже для до его ее ей ему
+если есть еще же за здесь и из или им их к как ко когда кто ли либо мне меня мной мой моя мое мои мы на над нам
+нас не него нее нет ни них но ну о об однако он она они оно от очень по под при про с со так также такой там те
+тебе тебя то того тоже той только том ты у уже хотя чего чей чем что чтобы чье чья эта эти это этого этой этом я
+скажи подскажи расскажи пожалуйста ли можно будет будут
+""".split())
+
+# Упрощенное отсечение окончаний: сравниваются основы слов, а не словоформы
+ENDINGS = sorted("""
+ами ями ого его ому ему ыми ими ешь ишь ете ите ая яя ое ее ые ие ый ий ой ей ую юю ом ем ах ях ам ям ов ев
+ть ет ит ут ют ат ят ла ло ли а я о е ы и у ю ь
+""".split(), key=len, reverse=True)
+
+_MERSENNE_PRIME = (1 << 61) - 1
+
+def normalize_question(text: str) -> List[str]:
+    """
+    Нормализация вопроса: нижний регистр, ё -> е, без пунктуации и стоп-слов, с отсеченными окончаниями.
+
+    Args:
+        text: Вопрос пользователя.
+
+    Returns:
+        List[str]: Основы значимых слов вопроса.
+    """
+    words = re.findall(r"[a-zа-я0-9]+", text.lower().replace("ё", "е"))
+    stems = []
+    for word in words:
+        if word in STOP_WORDS:
+            continue
+        for ending in ENDINGS:
+            if word.endswith(ending) and len(word) - len(ending) >= 3:
+                word = word[:-len(ending)]
+                break
+        stems.append(word)
+    return stems
+
+def shingles(stems: List[str], size: int = 3) -> FrozenSet[str]:
+    # Символьные n-граммы устойчивее к перестановке и словоформам, чем пары слов
+    text = " ".join(stems)
+    if len(text) <= size:
+        return frozenset([text]) if text else frozenset()
+    return frozenset(text[i:i + size] for i in range(len(text) - size + 1))
+
+class SimilarityIndex:
+    """
+    Индекс похожих вопросов: MinHash-сигнатуры и LSH-корзины в памяти процесса.
+
+    Кандидаты ищутся по совпадению хотя бы одной полосы сигнатуры в том же контексте
+    (карты и тип гадания), после чего для них считается точное сходство Жаккара.
+    Размер индекса ограничен, самые старые записи вытесняются первыми.
+    """
+
+    def __init__(self, num_perm: int, bands: int, max_entries: int, ttl: float, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("MinHash permutations must be divisible by LSH bands")
+        rng = random.Random(seed)
+        self._permutations = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(num_perm)]
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # id -> (время добавления, контекст, шинглы, ключи корзин, ответ) в порядке добавления
+        self._entries: "OrderedDict[int, Tuple[float, str, FrozenSet[str], List[int], str]]" = OrderedDict()
+        self._buckets: Dict[int, Set[int]] = {}
+        self._next_id = 0
+        self.stats = {"lookups": 0, "hits": 0, "stores": 0, "evictions": 0}
+
+    def _signature(self, shingle_set: FrozenSet[str]) -> List[int]:
+        hashes = [int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big") for shingle in shingle_set]
+        return [min((a * value + b) % _MERSENNE_PRIME for value in hashes) for a, b in self._permutations]
+
+    def _band_keys(self, context: str, shingle_set: FrozenSet[str]) -> List[int]:
+        signature = self._signature(shingle_set)
+        return [hash((context, band, tuple(signature[band * self.rows:(band + 1) * self.rows]))) for band in range(self.bands)]
+
+    def _evict(self, now: float):
+        while self._entries:
+            entry_id, (created, _, _, band_keys, _) = next(iter(self._entries.items()))
+            if now - created <= self.ttl and len(self._entries) < self.max_entries:
+                break
+            del self._entries[entry_id]
+            for key in band_keys:
+                bucket = self._buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(entry_id)
+                    if not bucket:
+                        del self._buckets[key]
+            self.stats["evictions"] += 1
+
+    def _best_match(self, context: str, shingle_set: FrozenSet[str], band_keys: List[int]) -> Tuple[Optional[str], float]:
+        candidates = set()
+        for key in band_keys:
+            candidates.update(self._buckets.get(key, ()))
+        best_response, best_similarity = None, 0.0
+        for entry_id in candidates:
+            _, entry_context, entry_shingles, _, response = self._entries[entry_id]
+            if entry_context != context:
+                continue
+            similarity = len(shingle_set & entry_shingles) / len(shingle_set | entry_shingles)
+            if similarity > best_similarity:
+                best_response, best_similarity = response, similarity
+        return best_response, best_similarity
+
+    def lookup(self, context: str, question: str, threshold: float) -> Optional[str]:
+        """
+        Поиск ответа на похожий вопрос в том же контексте.
+
+        Args:
+            context: Контекст вопроса (например, тип гадания и карты).
+            question: Вопрос пользователя.
+            threshold: Минимальное сходство Жаккара для повторного использования ответа.
+
+        Returns:
+            Optional[str]: Ответ на похожий вопрос или None.
+        """
+        self.stats["lookups"] += 1
+        self._evict(time.monotonic())
+        shingle_set = shingles(normalize_question(question))
+        if not shingle_set:
+            return None
+        response, similarity = self._best_match(context, shingle_set, self._band_keys(context, shingle_set))
+        if response is not None and similarity >= threshold:
+            self.stats["hits"] += 1
+            return response
+        return None
+
+    def add(self, context: str, question: str, response: str):
+        """
+        Добавление ответа в индекс. Ответ на тот же вопрос в том же контексте не дублируется.
+
+        Args:
+            context: Контекст вопроса.
+            question: Вопрос пользователя.
+            response: Ответ ИИ.
+        """
+        now = time.monotonic()
+        self._evict(now)
+        shingle_set = shingles(normalize_question(question))
+        if not shingle_set:
+            return
+        band_keys = self._band_keys(context, shingle_set)
+        if self._best_match(context, shingle_set, band_keys)[1] >= 1.0:
+            return
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = (now, context, shingle_set, band_keys, response)
+        for key in band_keys:
+            self._buckets.setdefault(key, set()).add(entry_id)
+        self.stats["stores"] += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+_index = SimilarityIndex(AI_SIMILARITY_PERMUTATIONS, AI_SIMILARITY_BANDS, AI_SIMILARITY_MAX_ENTRIES, AI_SIMILARITY_TTL)
+
+def find_similar_response(context: str, question: str) -> Optional[str]:
+    """
+    Поиск ответа на похожий вопрос, если кеш похожих вопросов включен.
+
+    Args:
+        context: Контекст вопроса (тип гадания, карты, категория).
+        question: Вопрос пользователя.
+
+    Returns:
+        Optional[str]: Ответ с сходством не ниже AI_SIMILARITY_THRESHOLD или None.
+    """
+    if not AI_SIMILARITY_CACHE_ENABLED:
+        return None
+    return _index.lookup(context, question, AI_SIMILARITY_THRESHOLD)
+
+def remember_response(context: str, question: str, response: str):
+    """
+    Сохранение успешного ответа в кеш похожих вопросов, если он включен.
+
+    Args:
+        context: Контекст вопроса.
+        question: Вопрос пользователя.
+        response: Ответ ИИ.
+    """
+    if AI_SIMILARITY_CACHE_ENABLED:
+        _index.add(context, question, response)
+
+def get_similarity_stats() -> dict:
+    """
+    Получение статистики кеша похожих вопросов.
+
+    Returns:
+        dict: Поиски, попадания, записи, вытеснения и размер индекса.
+    """
+    return {"enabled": AI_SIMILARITY_CACHE_ENABLED, "entries": len(_index), **_index.stats}
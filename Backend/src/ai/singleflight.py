@@ -0,0 +1,53 @@
+import asyncio
+from typing import Awaitable, Callable, Dict
+
+# Запросы к ИИ, выполняющиеся в данный момент, по ключу промпта
+_inflight: Dict[str, asyncio.Future] = {}
+_stats = {"leaders": 0, "coalesced": 0, "detached": 0}
+
+def _on_done(key: str, future: asyncio.Future):
+    if _inflight.get(key) is future:
+        del _inflight[key]
+    # Забираем исключение, чтобы asyncio не ругался, если все вызывающие уже отключились
+    if not future.cancelled():
+        future.exception()
+
+async def run(key: str, factory: Callable[[], Awaitable]):
+    """
+    Выполнение запроса с объединением одновременных вызовов с одинаковым ключом.
+
+    Первый вызывающий запускает factory() как отдельную задачу, остальные ожидают её результат.
+    Задача защищена от отмены: отключение одного из вызывающих не прерывает общий запрос,
+    и его результат достается остальным (и попадает в кеш).
+
+    Args:
+        key: Ключ промпта.
+        factory: Функция без аргументов, возвращающая корутину запроса.
+
+    Returns:
+        Результат factory() или исключение, выброшенное ею.
+    """
+    future = _inflight.get(key)
+    if future is None:
+        future = asyncio.ensure_future(factory())
+        _inflight[key] = future
+        future.add_done_callback(lambda f: _on_done(key, f))
+        _stats["leaders"] += 1
+    else:
+        _stats["coalesced"] += 1
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        if not future.done():
+            _stats["detached"] += 1
+        raise
+
+def get_singleflight_stats() -> dict:
+    """
+    Получение статистики объединения запросов.
+
+    Returns:
+        dict: Количество запросов к API (leaders), объединенных вызовов (coalesced),
+        отключившихся вызывающих (detached) и выполняющихся сейчас запросов.
+    """
+    return {**_stats, "in_flight": len(_inflight)}
@@ -0,0 +1,216 @@
+import asyncio
+import contextvars
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import Request
+from pymongo import UpdateOne
+
+from src.utils.logger import log_info, log_warning
+from config.config import AI_USAGE_FLUSH_INTERVAL, AI_USAGE_MAX_PENDING, AI_TOKEN_PRICES
+
+USAGE_COLLECTION = "ai_usage_daily"
+GROUP_FIELDS = ("endpoint", "user", "model", "day")
+
+# Эндпоинт и пользователь текущего запроса; задаются зависимостью приложения,
+# ограничителем частоты запросов и воркерами задач
+_endpoint: contextvars.ContextVar[str] = contextvars.ContextVar("ai_usage_endpoint", default="unknown")
+_user: contextvars.ContextVar[str] = contextvars.ContextVar("ai_usage_user", default="unknown")
+
+# (день, эндпоинт, пользователь, модель) -> [запросы, токены промпта, токены ответа]
+_pending: Dict[Tuple[str, str, str, str], List[int]] = {}
+_flusher: Optional[asyncio.Task] = None
+_stats = {"recorded": 0, "flushes": 0, "flush_errors": 0, "dropped": 0}
+
+def _parse_prices(value: str) -> Dict[str, Tuple[float, float]]:
+    prices = {}
+    for item in value.split(","):
+        parts = item.strip().split(":")
+        if len(parts) == 3:
+            prices[parts[0]] = (float(parts[1]), float(parts[2]))
+    return prices
+
+_prices = _parse_prices(AI_TOKEN_PRICES)
+
+def set_usage_context(endpoint: Optional[str] = None, user: Optional[str] = None):
+    """
+    Установка эндпоинта и пользователя, на которых записывается расход токенов в текущем контексте.
+
+    Args:
+        endpoint: Эндпоинт (например, "POST /tarot/draw").
+        user: Ключ пользователя (например, "user:123" или "anon:1.2.3.4").
+    """
+    if endpoint is not None:
+        _endpoint.set(endpoint)
+    if user is not None:
+        _user.set(user)
+
+def current_endpoint() -> str:
+    """
+    Эндпоинт, на который записывается расход токенов в текущем контексте.
+
+    Returns:
+        str: Эндпоинт (например, "POST /tarot/draw") или "unknown".
+    """
+    return _endpoint.get()
+
+async def track_usage_endpoint(request: Request):
+    """
+    Зависимость приложения: записывает расход токенов запроса на шаблон пути эндпоинта.
+
+    Args:
+        request: Текущий HTTP-запрос.
+    """
+    route = request.scope.get("route")
+    path = getattr(route, "path", request.url.path)
+    _endpoint.set(f"{request.method} {path}")
+    _user.set("unknown")
+
+def record_usage(model: str, usage: Optional[dict]):
+    """
+    Учет расхода токенов одного ответа API в памяти, без записи в базу.
+
+    Args:
+        model: Модель ИИ.
+        usage: Блок usage ответа API (prompt_tokens, completion_tokens).
+    """
+    if not usage:
+        return
+    key = (datetime.now(timezone.utc).strftime("%Y-%m-%d"), _endpoint.get(), _user.get(), model)
+    counters = _pending.get(key)
+    if counters is None:
+        if len(_pending) >= AI_USAGE_MAX_PENDING:
+            _stats["dropped"] += 1
+            return
+        counters = _pending[key] = [0, 0, 0]
+    counters[0] += 1
+    counters[1] += int(usage.get("prompt_tokens") or 0)
+    counters[2] += int(usage.get("completion_tokens") or 0)
+    _stats["recorded"] += 1
+
+def _rollup_id(day: str, endpoint: str, user: str, model: str) -> str:
+    return f"{day}|{endpoint}|{user}|{model}"
+
+async def flush_usage(db):
+    """
+    Запись накопленных счетчиков в дневные сводки одной пачкой $inc-upsert.
+
+    При ошибке записи счетчики возвращаются в память и будут записаны при следующем сбросе.
+
+    Args:
+        db: Объект базы данных.
+    """
+    global _pending
+    if not _pending:
+        return
+    batch, _pending = _pending, {}
+    operations = [
+        UpdateOne(
+            {"_id": _rollup_id(day, endpoint, user, model)},
+            {
+                "$inc": {"requests": requests, "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens},
+                "$setOnInsert": {"day": day, "endpoint": endpoint, "user": user, "model": model}
+            },
+            upsert=True
+        )
+        for (day, endpoint, user, model), (requests, prompt_tokens, completion_tokens) in batch.items()
+    ]
+    try:
+        await db[USAGE_COLLECTION].bulk_write(operations, ordered=False)
+        _stats["flushes"] += 1
+    except Exception as e:
+        _stats["flush_errors"] += 1
+        log_warning(f"Could not flush AI usage counters, {len(batch)} rollups kept in memory: {str(e)}")
+        for key, counters in batch.items():
+            pending = _pending.setdefault(key, [0, 0, 0])
+            for index, value in enumerate(counters):
+                pending[index] += value
+
+async def _flush_periodically(db):
+    while True:
+        await asyncio.sleep(AI_USAGE_FLUSH_INTERVAL)
+        await flush_usage(db)
+
+def start_usage_flusher(db):
+    """
+    Запуск периодического сброса счетчиков расхода токенов в базу.
+
+    Args:
+        db: Объект базы данных.
+    """
+    global _flusher
+    if _flusher is None:
+        _flusher = asyncio.create_task(_flush_periodically(db))
+        log_info(f"AI usage metering started, flush every {AI_USAGE_FLUSH_INTERVAL}s")
+
+async def stop_usage_flusher(db):
+    """
+    Остановка периодического сброса с записью оставшихся счетчиков.
+
+    Args:
+        db: Объект базы данных.
+    """
+    global _flusher
+    if _flusher is not None:
+        _flusher.cancel()
+        await asyncio.gather(_flusher, return_exceptions=True)
+        _flusher = None
+    await flush_usage(db)
+
+def _cost(model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    price = _prices.get(model)
+    if price is None:
+        return None
+    return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+async def get_usage_report(db, group_by: str = "endpoint", days: int = 7, limit: int = 50) -> List[dict]:
+    """
+    Сводка расхода токенов за последние дни с группировкой по эндпоинту, пользователю, модели или дню.
+
+    Args:
+        db: Объект базы данных.
+        group_by: Поле группировки: endpoint, user, model или day.
+        days: За сколько последних дней (включая сегодня) строить сводку.
+        limit: Максимальное число строк, по убыванию общего числа токенов.
+
+    Returns:
+        List[dict]: Строки сводки с числом запросов, токенами и оценкой стоимости в долларах
+        (None, если для модели не задана цена).
+    """
+    if group_by not in GROUP_FIELDS:
+        raise ValueError(f"Unsupported group_by: {group_by}")
+    since = (datetime.now(timezone.utc) - timedelta(days=max(1, days) - 1)).strftime("%Y-%m-%d")
+    pipeline = [
+        {"$match": {"day": {"$gte": since}}},
+        {"$group": {
+            "_id": {"key": f"${group_by}", "model": "$model"},
+            "requests": {"$sum": "$requests"},
+            "prompt_tokens": {"$sum": "$prompt_tokens"},
+            "completion_tokens": {"$sum": "$completion_tokens"}
+        }}
+    ]
+    # Стоимость зависит от модели, поэтому строки сначала группируются вместе с моделью
+    rows: Dict[str, dict] = {}
+    async for document in db[USAGE_COLLECTION].aggregate(pipeline):
+        key = document["_id"]["key"]
+        row = rows.setdefault(key, {group_by: key, "requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cost": 0.0})
+        row["requests"] += document["requests"]
+        row["prompt_tokens"] += document["prompt_tokens"]
+        row["completion_tokens"] += document["completion_tokens"]
+        row["total_tokens"] += document["prompt_tokens"] + document["completion_tokens"]
+        cost = _cost(document["_id"]["model"], document["prompt_tokens"], document["completion_tokens"])
+        row["cost"] = None if cost is None or row["cost"] is None else row["cost"] + cost
+    report = sorted(rows.values(), key=lambda row: row["total_tokens"], reverse=True)[:limit]
+    for row in report:
+        if row["cost"] is not None:
+            row["cost"] = round(row["cost"], 4)
+    return report
+
+def get_usage_stats() -> dict:
+    """
+    Получение статистики учета расхода токенов.
+
+    Returns:
+        dict: Число учтенных ответов, сбросов, ошибок сброса, отброшенных записей и незаписанных сводок.
+    """
+    return {**_stats, "pending_rollups": len(_pending)}
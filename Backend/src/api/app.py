@@ -1,12 +1,15 @@
-from fastapi import FastAPI, HTTPException, Depends, Security, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, Security
 from fastapi.security import APIKeyHeader
 from fastapi.middleware.cors import CORSMiddleware
 from config.config import API_KEY, get_db
-from src.api.routers import tarot, coffee, user, info, ai, feedback, cards, payment
-from src.db.operations import create_log
-from src.utils.logger import get_log_queue
+from src.api.routers import tarot, coffee, user, info, ai, feedback, cards, payment, jobs
+from src.ai.usage import track_usage_endpoint
 
-app = FastAPI(title="ZodiacBot API", description="API for ZodiacBot functionalities")
+app = FastAPI(
+    title="ZodiacBot API",
+    description="API for ZodiacBot functionalities",
+    dependencies=[Depends(track_usage_endpoint)]  # Учет расхода токенов ИИ по эндпоинтам
+)
 
 # Настройка CORS
 app.add_middleware(
@@ -20,23 +23,46 @@ app.add_middleware(
 @app.on_event("startup")
 async def startup_event():
     """
-    Событие при старте приложения для обработки очереди логов.
+    Событие при старте приложения: запуск пакетной записи логов в базу и переигрывания
+    локального журнала записей, создание индексов, запуск воркеров очереди задач и сброса
+    счетчиков расхода токенов.
     """
-    from src.utils.logger import get_log_queue
-    from src.db.operations import create_log
-    import asyncio
-    
-    async def background_log_processor(db=Depends(get_db)):
-        log_queue = get_log_queue()
-        while True:
-            if log_queue:
-                log_entry = log_queue.popleft()
-                await create_log(db, log_entry["level"], log_entry["message"])
-            await asyncio.sleep(1)  # Проверять очередь каждую секунду
-    
-    # Запуск фоновой задачи для обработки логов
-    # Это временное решение, может потребоваться более надежный способ
-    # asyncio.create_task(background_log_processor())
+    from config.config import db
+    from src.db.spool import start_spool_replay
+    from src.utils.log_sink import start_log_sink
+    start_log_sink(db)
+    start_spool_replay(db)
+
+    from src.ai.jobs import start_job_workers
+    from src.ai.usage import start_usage_flusher
+    from src.db.indexes import apply_index_registry
+    from src.utils.logger import log_warning
+    try:
+        await apply_index_registry(db)
+    except Exception as e:
+        log_warning(f"Could not apply MongoDB index registry: {str(e)}")
+    start_job_workers(db)
+    start_usage_flusher(db)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """
+    Событие при остановке приложения: остановка воркеров очереди задач, запись счетчиков
+    расхода токенов, закрытие пула соединений клиента ИИ, запись оставшихся логов и закрытие
+    локального журнала записей (непереигранные сегменты переигрываются при следующем запуске).
+    """
+    from config.config import db
+    from src.ai.client import close_ai_client
+    from src.ai.jobs import stop_job_workers
+    from src.ai.usage import stop_usage_flusher
+    from src.db.spool import stop_spool_replay
+    from src.utils.log_sink import stop_log_sink
+    await stop_job_workers()
+    await stop_usage_flusher(db)
+    await close_ai_client()
+    # Последним, чтобы в базу попали и логи остановки
+    await stop_log_sink(db)
+    await stop_spool_replay()
 
 # API Key security
 api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
@@ -47,7 +73,7 @@ async def get_api_key(api_key: str = Security(api_key_header)):
     return api_key
 
 @app.get("/health", tags=["health"])
-async def health_check(background_tasks: BackgroundTasks, api_key: str = Depends(get_api_key), db=Depends(get_db)):
+async def health_check(api_key: str = Depends(get_api_key)):
     """
     Проверка состояния API.
     
@@ -64,23 +90,8 @@ async def health_check(background_tasks: BackgroundTasks, api_key: str = Depends
     from src.utils.logger import log_info
     
     log_info("Health check requested")
-    
-    # Добавляем фоновую задачу для обработки очереди логов
-    background_tasks.add_task(process_log_queue, db)
     return {"status": "ok"}
 
-async def process_log_queue(db):
-    """
-    Обработка очереди логов и запись их в базу данных.
-    
-    Args:
-        db: Объект базы данных.
-    """
-    log_queue = get_log_queue()
-    while log_queue:
-        log_entry = log_queue.popleft()
-        await create_log(db, log_entry["level"], log_entry["message"])
-
 # Удален базовый эндпоинт /info по запросу пользователя
 # @app.get("/info", tags=["info"])
 # async def get_info(api_key: str = Depends(get_api_key)):
@@ -98,5 +109,6 @@ app.include_router(ai.router)
 app.include_router(feedback.router)
 app.include_router(cards.router)
 app.include_router(payment.router)
+app.include_router(jobs.router)
 from src.api.routers import direct
 app.include_router(direct.router)
@@ -1,7 +1,7 @@
-from fastapi import APIRouter, Depends, Security, HTTPException
+from fastapi import APIRouter, Depends, Security, HTTPException, Request
 from fastapi.security import APIKeyHeader
 from src.api.schemas import AIPromptRequest, AIPromptResponse
-from config.config import API_KEY
+from config.config import API_KEY, ADMIN_API_KEY, get_db
 
 router = APIRouter(prefix="/ai", tags=["ai"])
 
@@ -12,13 +12,29 @@ async def get_api_key(api_key: str = Security(api_key_header)):
         raise HTTPException(status_code=403, detail="Invalid API Key")
     return api_key
 
+admin_key_header = APIKeyHeader(name="X-Admin-Key", auto_error=False)
+
+async def get_admin_key(admin_key: str = Security(admin_key_header)):
+    if admin_key != ADMIN_API_KEY:
+        raise HTTPException(status_code=403, detail="Invalid Admin Key")
+    return admin_key
+
+def build_prompt(request: AIPromptRequest) -> str:
+    # Формируем промт с учетом режима и контекста
+    prompt = request.question
+    if request.mode == "tarot" and "cards" in request.context:
+        cards = request.context.get("cards", [])
+        if cards:
+            prompt = f"Интерпретируй карты Таро в контексте вопроса: {request.question}. Карты: {', '.join(cards)}."
+    return prompt
+
 @router.post("/prompt", response_model=AIPromptResponse)
-async def ai_prompt(request: AIPromptRequest, api_key: str = Depends(get_api_key)):
+async def ai_prompt(request: AIPromptRequest, http_request: Request, api_key: str = Depends(get_api_key), db = Depends(get_db)):
     """
     Получить ИИ-интерпретацию на основе промпта.
     
     Этот эндпоинт позволяет пользователю отправить запрос к ИИ (например, OpenAI API) для получения интерпретации или ответа на вопрос.
-    Запрос отправляется к внешнему API с использованием модели "gpt-4o" и ограничением на максимальное количество токенов.
+    Запрос отправляется к внешнему API с использованием модели и ограничения на максимальное количество токенов, выбранных маршрутизацией ИИ.
     В случае ошибки при запросе к API возвращается сообщение об ошибке.
     
     Параметры:
@@ -30,13 +46,119 @@ async def ai_prompt(request: AIPromptRequest, api_key: str = Depends(get_api_key
     - response: Ответ от ИИ в виде текста или сообщение об ошибке, если запрос не удался.
     """
     from src.ai.client import get_ai_response
+    from src.ai.rate_limit import enforce_ai_rate_limit
     
-    # Формируем промт с учетом режима и контекста
-    prompt = request.question
-    if request.mode == "tarot" and "cards" in request.context:
-        cards = request.context.get("cards", [])
-        if cards:
-            prompt = f"Интерпретируй карты Таро в контексте вопроса: {request.question}. Карты: {', '.join(cards)}."
+    await enforce_ai_rate_limit(db, request.context.get("user_id"), http_request.client.host if http_request.client else None)
     
-    response = get_ai_response(prompt)
+    response = await get_ai_response(build_prompt(request))
     return {"response": response}
+
+@router.post("/prompt/stream")
+async def ai_prompt_stream(request: AIPromptRequest, http_request: Request, api_key: str = Depends(get_api_key), db = Depends(get_db)):
+    """
+    Получить ИИ-ответ на промпт в потоковом режиме (Server-Sent Events).
+    
+    Работает как /ai/prompt, но ответ передается по мере генерации: события с полем delta
+    содержат фрагменты текста, последнее событие "done" сигнализирует о завершении.
+    
+    Параметры:
+    - question: Текст вопроса или промпта, который пользователь хочет отправить ИИ.
+    - mode: Режим интерпретации (например, "tarot" для интерпретации карт Таро), если применимо.
+    - context: Дополнительный контекст для ИИ (например, список карт для интерпретации), если применимо.
+    
+    Возвращает:
+    - Поток событий text/event-stream.
+    """
+    from src.ai.rate_limit import enforce_ai_rate_limit
+    from src.api.streaming import interpretation_events, sse_response
+    
+    await enforce_ai_rate_limit(db, request.context.get("user_id"), http_request.client.host if http_request.client else None)
+    return sse_response(interpretation_events(build_prompt(request)))
+
+@router.get("/stats", response_model=dict)
+async def ai_stats(api_key: str = Depends(get_api_key)):
+    """
+    Получить статистику работы клиента ИИ.
+
+    Этот эндпоинт возвращает внутренние метрики слоя ИИ для мониторинга.
+
+    Возвращает:
+    - cache: Статистика кеша ответов (попадания в памяти и в MongoDB, промахи, доля попаданий).
+    - similarity: Статистика кеша ответов на похожие вопросы (поиски, попадания, размер индекса, вытеснения).
+    - singleflight: Статистика объединения одинаковых одновременных запросов.
+    - rate_limit: Статистика ограничителя частоты запросов по планам.
+    - scheduler: Занятые слоты, глубина очереди и время ожидания p50/p99 по классам приоритета.
+    - resilience: Состояние предохранителя API ИИ, число повторов и дублирующих запросов, задержки p50/p95.
+    - corpus: Обращения к корпусу заранее сгенерированных интерпретаций карт.
+    - jobs: Статистика очереди асинхронных задач.
+    - usage: Статистика учета расхода токенов.
+    - routing: Модели, лимиты токенов, переходы на быструю модель и задержки p50/p95 по маршрутам.
+    - endpoints: Нагрузка, ошибки и исключения из пула по точкам доступа к API ИИ.
+    - user_cache: Попадания и промахи кеша профилей пользователей, доля попаданий и размер кеша.
+    - log_sink: Пакетная запись логов в базу: записанные записи и пачки, ошибки, записи, ушедшие в журнал на диске, прореженные и отброшенные записи.
+    - spool: Локальный журнал записей при недоступности базы: сохраненные, отклоненные, переигранные и поврежденные записи, сегменты и размер на диске.
+    """
+    from src.ai.cache import get_cache_stats
+    from src.ai.singleflight import get_singleflight_stats
+    from src.ai.rate_limit import get_rate_limit_stats
+    from src.ai.resilience import get_resilience_stats
+    from src.ai.corpus import get_corpus_stats
+    from src.ai.jobs import get_job_stats
+    from src.ai.usage import get_usage_stats
+    from src.ai.routing import get_routing_stats
+    from src.ai.endpoints import get_endpoint_stats
+    from src.ai.similarity import get_similarity_stats
+    from src.ai.scheduler import get_scheduler_stats
+    from src.db.operations import get_user_cache_stats
+    from src.db.spool import get_spool_stats
+    from src.utils.log_sink import get_log_sink_stats
+
+    return {
+        "cache": get_cache_stats(),
+        "similarity": get_similarity_stats(),
+        "singleflight": get_singleflight_stats(),
+        "rate_limit": get_rate_limit_stats(),
+        "scheduler": get_scheduler_stats(),
+        "resilience": get_resilience_stats(),
+        "corpus": get_corpus_stats(),
+        "jobs": get_job_stats(),
+        "usage": get_usage_stats(),
+        "routing": get_routing_stats(),
+        "endpoints": get_endpoint_stats(),
+        "user_cache": get_user_cache_stats(),
+        "log_sink": get_log_sink_stats(),
+        "spool": get_spool_stats()
+    }
+
+@router.get("/usage", response_model=dict)
+async def ai_usage(group_by: str = "endpoint", days: int = 7, limit: int = 50, api_key: str = Depends(get_api_key), admin_key: str = Depends(get_admin_key), db = Depends(get_db)):
+    """
+    Получить сводку расхода токенов ИИ (только для администраторов).
+
+    Этот эндпоинт строит сводку по дневным счетчикам расхода токенов и помогает подбирать max_tokens
+    и находить клиентов, расходующих больше всего токенов. Помимо API-ключа требуется заголовок X-Admin-Key.
+    Счетчики записываются в базу раз в AI_USAGE_FLUSH_INTERVAL секунд, поэтому последние запросы
+    могут появиться в сводке с задержкой.
+
+    Параметры:
+    - group_by: Группировка: endpoint, user, model или day (по умолчанию endpoint).
+    - days: За сколько последних дней строить сводку (по умолчанию 7).
+    - limit: Максимальное число строк (по умолчанию 50).
+
+    Возвращает:
+    - group_by: Использованная группировка.
+    - days: Период сводки в днях.
+    - rows: Строки сводки по убыванию общего числа токенов: requests, prompt_tokens, completion_tokens,
+      total_tokens и cost (оценка стоимости в долларах, если для модели задана цена).
+    """
+    from src.utils.logger import log_error
+    from src.ai.usage import get_usage_report, GROUP_FIELDS
+
+    if group_by not in GROUP_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Недопустимая группировка. Допустимые значения: {', '.join(GROUP_FIELDS)}")
+    try:
+        rows = await get_usage_report(db, group_by, days, limit)
+        return {"group_by": group_by, "days": days, "rows": rows}
+    except Exception as e:
+        log_error(f"Error building AI usage report: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Ошибка при получении сводки расхода токенов: {str(e)}")
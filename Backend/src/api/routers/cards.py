@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, Security, HTTPException
+from fastapi import APIRouter, Depends, Security, HTTPException, Request
 from fastapi.security import APIKeyHeader
 from src.api.schemas import CardMeaning
 from config.config import API_KEY, get_db
@@ -31,6 +31,7 @@ async def cards_list(api_key: str = Depends(get_api_key), db = Depends(get_db)):
         - name: Название карты (например, "The Fool").
         - positive: Положительное значение или интерпретация карты.
         - negative: Отрицательное значение или интерпретация карты.
+        - ai_summary: Краткая AI-интерпретация (только для первых трех карт; пусто, если ИИ не ответил вовремя).
     """
     from src.utils.logger import log_info, log_error
     
@@ -46,13 +47,15 @@ async def cards_list(api_key: str = Depends(get_api_key), db = Depends(get_db)):
             log_info("Returned test data for card meanings as database is empty")
         else:
             log_info("Retrieved card meanings from database")
-        # Добавляем краткую AI-интерпретацию для первых трех карт
+        # Добавляем краткую AI-интерпретацию для первых трех карт (параллельно, с общим дедлайном)
         try:
-            from src.ai.client import get_ai_response
-            for card in cards[:3]:  # Ограничиваем до первых трех карт
-                prompt = f"Дай краткую интерпретацию карты {card.name} в общем контексте."
-                card.ai_summary = get_ai_response(prompt)
-                log_info(f"AI summary generated for card {card.name}")
+            from src.ai.fanout import gather_ai_responses
+            summary_cards = cards[:3]  # Ограничиваем до первых трех карт
+            prompts = [f"Дай краткую интерпретацию карты {card.name} в общем контексте." for card in summary_cards]
+            summaries = await gather_ai_responses(prompts)
+            for card, summary in zip(summary_cards, summaries):
+                card.ai_summary = summary
+            log_info(f"AI summaries generated for {sum(1 for summary in summaries if summary)} of {len(summary_cards)} cards")
         except Exception as ai_error:
             log_error(f"AI summary failed for card list: {str(ai_error)}")
         return cards
@@ -61,26 +64,43 @@ async def cards_list(api_key: str = Depends(get_api_key), db = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Ошибка при получении списка карт: {str(e)}")
 
 @router.get("/interpret/{card_name}", response_model=dict)
-async def interpret_card(card_name: str, question: str = "", api_key: str = Depends(get_api_key), db = Depends(get_db)):
+async def interpret_card(card_name: str, http_request: Request, question: str = "", category: str = "general", reversed: bool = False, api_key: str = Depends(get_api_key), db = Depends(get_db)):
     """
     Получить детальную интерпретацию карты с помощью AI.
     
     Этот эндпоинт позволяет получить детальную интерпретацию конкретной карты в контексте заданного вопроса.
-    Используется AI для анализа карты и предоставления персонализированного ответа.
+    Интерпретации без вопроса берутся из заранее сгенерированного корпуса (по карте, положению и категории);
+    AI вызывается только для вопросов в свободной форме или если в корпусе нет нужной записи.
     
     Параметры:
     - card_name: Название карты для интерпретации.
     - question: Вопрос или контекст для интерпретации (опционально).
+    - category: Категория интерпретации без вопроса: general, love, career, health, spiritual_growth (по умолчанию general).
+    - reversed: Перевернутое положение карты (по умолчанию False).
     
     Возвращает:
     - interpretation: Детальная интерпретация карты от AI.
     """
     from src.utils.logger import log_info, log_error
     from src.ai.client import get_ai_response
+    from src.ai.corpus import get_card_interpretation, resolve_card_name, normalize_category, ORIENTATION_REVERSED, ORIENTATION_UPRIGHT
+    from src.ai.rate_limit import enforce_ai_rate_limit
     
+    card = resolve_card_name(card_name)
+    if not question and card:
+        try:
+            orientation = ORIENTATION_REVERSED if reversed else ORIENTATION_UPRIGHT
+            interpretation = await get_card_interpretation(db, card, orientation, normalize_category(category))
+            if interpretation:
+                log_info(f"Corpus interpretation served for card {card} ({orientation}, {category})")
+                return {"interpretation": interpretation}
+        except Exception as e:
+            log_error(f"Error reading card corpus for {card}: {str(e)}")
+    
+    await enforce_ai_rate_limit(db, None, http_request.client.host if http_request.client else None)
     try:
         prompt = f"Интерпретируй карту {card_name} в контексте вопроса: {question if question else 'Общая интерпретация'}."
-        interpretation = get_ai_response(prompt)
+        interpretation = await get_ai_response(prompt)
         log_info(f"AI interpretation requested for card {card_name} with question: {question[:50]}...")
         return {"interpretation": interpretation}
     except Exception as e:
@@ -1,10 +1,12 @@
 from fastapi import APIRouter, Depends, Security, HTTPException
 from fastapi.security import APIKeyHeader
-from src.api.schemas import CoffeeFortuneRequest, CoffeeFortuneResponse
-from config.config import API_KEY, get_db
-from src.db.operations import create_coffee_history, get_user_by_user_id, create_user
+from src.api.schemas import CoffeeFortuneRequest, CoffeeFortuneResponse, HistoryPage
+from config.config import API_KEY, HISTORY_PAGE_SIZE, get_db
+from src.db.operations import create_coffee_history, get_user_by_user_id, get_or_create_user
+from src.ai.jobs import register_job_handler, enqueue_job
+from src.api.routers.jobs import job_accepted_response
 from datetime import datetime
-from typing import List
+from typing import Optional
 
 router = APIRouter(prefix="/coffee", tags=["coffee"])
 
@@ -15,8 +17,51 @@ async def get_api_key(api_key: str = Security(api_key_header)):
         raise HTTPException(status_code=403, detail="Invalid API Key")
     return api_key
 
-@router.post("/fortune", response_model=CoffeeFortuneResponse)
-async def coffee_fortune(request: CoffeeFortuneRequest, api_key: str = Depends(get_api_key), db = Depends(get_db)):
+async def perform_coffee_fortune(db, user_id: str, question: str, job_id: Optional[str] = None) -> dict:
+    """
+    Интерпретация кофейной гущи с помощью ИИ и сохранение в историю пользователя.
+    
+    Args:
+        db: Объект базы данных.
+        user_id: Уникальный идентификатор пользователя.
+        question: Вопрос пользователя.
+        job_id: Идентификатор задачи очереди. Для задачи ошибки ИИ выбрасываются, чтобы задача
+            была повторена или завершилась ошибкой, а запись в истории создается одна на задачу.
+    
+    Returns:
+        dict: Интерпретация и дата предсказания.
+    """
+    from src.utils.logger import log_info
+    from src.ai.client import get_ai_response, fetch_ai_response
+    
+    # Используем AI API для интерпретации на основе вопроса
+    prompt = f"Интерпретируй изображение кофейной гущи в контексте вопроса: {question}."
+    if job_id is not None:
+        interpretation = await fetch_ai_response(prompt)
+    else:
+        interpretation = await get_ai_response(prompt, similar=("coffee", question))
+    log_info(f"AI interpretation generated for coffee fortune with question: {question[:50]}...")
+    
+    # Save to history
+    user, created = await get_or_create_user(db, user_id)
+    if created:
+        log_info(f"Created new user with ID {user_id} for coffee fortune")
+    image_id = "mock_image_id"  # In a real scenario, save the image and get an ID
+    entry = await create_coffee_history(db, int(user.user_id), image_id, question, interpretation, job_id)
+    log_info(f"Coffee fortune completed for user {user_id} with question: {question}")
+    
+    if entry is not None:
+        # Повтор задачи возвращает предсказание, сохраненное первой попыткой
+        return {"interpretation": entry["interpretation"], "date": entry["created_at"]}
+    return {"interpretation": interpretation, "date": datetime.now()}
+
+async def run_coffee_fortune_job(db, payload: dict, job_id: str) -> dict:
+    return await perform_coffee_fortune(db, payload["user_id"], payload["question"], job_id)
+
+register_job_handler("coffee_fortune", run_coffee_fortune_job)
+
+@router.post("/fortune", response_model=CoffeeFortuneResponse, responses={202: {"description": "Задача поставлена в очередь (job=true)"}})
+async def coffee_fortune(request: CoffeeFortuneRequest, job: bool = False, api_key: str = Depends(get_api_key), db = Depends(get_db)):
     """
     Получить предсказание по фото кофейной гущи.
     
@@ -24,56 +69,91 @@ async def coffee_fortune(request: CoffeeFortuneRequest, api_key: str = Depends(g
     Пользователь отправляет изображение в формате base64 и вопрос, на который хочет получить ответ.
     В ответ возвращается интерпретация изображения, основанная на тестовых данных (в реальном приложении это может быть анализ изображения с помощью ИИ).
     Данные о предсказании сохраняются в истории пользователя в базе данных MongoDB.
+    С параметром job=true предсказание ставится в очередь: сразу возвращается ответ 202 с идентификатором задачи,
+    а результат (в том же формате) забирается через GET /jobs/{job_id}?user_id=... (status_url из ответа).
     
     Параметры:
     - user_id: Уникальный идентификатор пользователя, делающего запрос.
     - question: Вопрос, на который пользователь хочет получить ответ через предсказание.
     - image_base64: Изображение кофейной гущи в формате base64 для анализа.
+    - job: Выполнить предсказание асинхронно через очередь задач (по умолчанию False).
     
     Возвращает:
     - interpretation: Текстовая интерпретация предсказания, основанная на изображении.
     - date: Дата и время выполнения предсказания.
+    - Для job=true: job_id, status и status_url задачи (код 202).
     """
-    from src.utils.logger import log_info, log_error
+    from src.utils.logger import log_error
+    from src.ai.rate_limit import enforce_ai_rate_limit
     
+    await enforce_ai_rate_limit(db, request.user_id)
     try:
-        # Используем AI API для интерпретации на основе вопроса
-        from src.ai.client import get_ai_response
-        prompt = f"Интерпретируй изображение кофейной гущи в контексте вопроса: {request.question}."
-        interpretation = get_ai_response(prompt)
-        log_info(f"AI interpretation generated for coffee fortune with question: {request.question[:50]}...")
-        
-        # Save to history
-        user = await get_user_by_user_id(db, request.user_id)
-        if user is None:
-            user = await create_user(db, request.user_id)
-            log_info(f"Created new user with ID {request.user_id} for coffee fortune")
-        image_id = "mock_image_id"  # In a real scenario, save the image and get an ID
-        await create_coffee_history(db, int(user.user_id), image_id, request.question, interpretation)
-        log_info(f"Coffee fortune completed for user {request.user_id} with question: {request.question}")
-        
-        return {"interpretation": interpretation, "date": datetime.now()}
+        if job:
+            # Изображение пока не используется в интерпретации, поэтому в задачу не сохраняется
+            job_id = await enqueue_job(db, "coffee_fortune", {"user_id": request.user_id, "question": request.question}, request.user_id)
+            return job_accepted_response(job_id, request.user_id)
+        return await perform_coffee_fortune(db, request.user_id, request.question)
     except Exception as e:
         user_id = request.user_id if hasattr(request, 'user_id') else 'unknown'
         log_error(f"Error in coffee_fortune for user {user_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Ошибка при выполнении предсказания по кофейной гуще: {str(e)}")
 
-@router.get("/history", response_model=List[dict])
-async def coffee_history(user_id: str, api_key: str = Depends(get_api_key), db = Depends(get_db)):
+@router.post("/fortune/stream")
+async def coffee_fortune_stream(request: CoffeeFortuneRequest, api_key: str = Depends(get_api_key), db = Depends(get_db)):
+    """
+    Получить предсказание по фото кофейной гущи в потоковом режиме (Server-Sent Events).
+    
+    Работает как /coffee/fortune, но интерпретация передается по мере генерации:
+    события с полем delta содержат фрагменты текста, последнее событие "done" содержит дату.
+    Предсказание сохраняется в истории пользователя после завершения потока.
+    
+    Параметры:
+    - user_id: Уникальный идентификатор пользователя, делающего запрос.
+    - question: Вопрос, на который пользователь хочет получить ответ через предсказание.
+    - image_base64: Изображение кофейной гущи в формате base64 для анализа.
+    
+    Возвращает:
+    - Поток событий text/event-stream.
+    """
+    from src.utils.logger import log_info
+    from src.ai.rate_limit import enforce_ai_rate_limit
+    from src.api.streaming import interpretation_events, sse_response
+    
+    await enforce_ai_rate_limit(db, request.user_id)
+    prompt = f"Интерпретируй изображение кофейной гущи в контексте вопроса: {request.question}."
+    
+    async def save_history(interpretation: str):
+        user, created = await get_or_create_user(db, request.user_id)
+        if created:
+            log_info(f"Created new user with ID {request.user_id} for coffee fortune")
+        image_id = "mock_image_id"  # In a real scenario, save the image and get an ID
+        await create_coffee_history(db, int(user.user_id), image_id, request.question, interpretation)
+        log_info(f"Streamed coffee fortune completed for user {request.user_id} with question: {request.question}")
+    
+    return sse_response(interpretation_events(prompt, save_history))
+
+@router.get("/history", response_model=HistoryPage)
+async def coffee_history(user_id: str, limit: int = HISTORY_PAGE_SIZE, cursor: Optional[str] = None, api_key: str = Depends(get_api_key), db = Depends(get_db)):
     """
     Получить историю предсказаний по кофейной гуще.
     
-    Этот эндпоинт возвращает список всех предсказаний по кофейной гуще, выполненных пользователем.
-    История включает дату предсказания, заданный вопрос и краткую интерпретацию.
+    Этот эндпоинт возвращает предсказания по кофейной гуще, выполненные пользователем за последние 7 дней,
+    страницами от новых к старым. История включает дату предсказания, заданный вопрос и начало интерпретации;
+    полная интерпретация возвращается эндпоинтом /coffee/history/{entry_id}.
     
     Параметры:
     - user_id: Уникальный идентификатор пользователя, чью историю нужно получить.
+    - limit: Количество записей на странице (по умолчанию 20, не больше 100).
+    - cursor: Курсор следующей страницы из поля next_cursor предыдущего ответа (для первой страницы не указывается).
     
     Возвращает:
-    - Список объектов, каждый из которых содержит:
+    - status: Статус операции.
+    - history: Список записей истории, каждая из которых содержит:
+        - id: Идентификатор записи.
         - date: Дата и время выполнения предсказания.
         - question: Вопрос, заданный пользователем.
-        - interpretation: Текстовая интерпретация предсказания.
+        - preview: Начало интерпретации предсказания.
+    - next_cursor: Курсор следующей страницы или null, если страница последняя.
     """
     from src.utils.logger import log_info, log_error
     from src.db.operations import get_coffee_history
@@ -82,14 +162,51 @@ async def coffee_history(user_id: str, api_key: str = Depends(get_api_key), db =
         user = await get_user_by_user_id(db, user_id)
         if user is None:
             log_info(f"No user found with ID {user_id} for coffee history")
-            return []
-        history = await get_coffee_history(db, int(user.user_id))
+            return {"status": "success", "history": [], "next_cursor": None}
+        try:
+            history, next_cursor = await get_coffee_history(db, int(user.user_id), limit, cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Некорректный курсор страницы истории")
         log_info(f"Retrieved coffee history for user {user_id}")
-        return history
+        return {"status": "success", "history": history, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         log_error(f"Error retrieving coffee history for user {user_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Ошибка при получении истории предсказаний: {str(e)}")
 
+@router.get("/history/{entry_id}", response_model=dict)
+async def coffee_history_entry(entry_id: str, user_id: str, api_key: str = Depends(get_api_key), db = Depends(get_db)):
+    """
+    Получить запись истории предсказаний по кофейной гуще с полной интерпретацией.
+    
+    Параметры:
+    - entry_id: Идентификатор записи из списка истории.
+    - user_id: Уникальный идентификатор пользователя, которому принадлежит запись.
+    
+    Возвращает:
+    - id: Идентификатор записи.
+    - date: Дата и время выполнения предсказания.
+    - question: Вопрос, заданный пользователем.
+    - interpretation: Полная интерпретация предсказания.
+    - image_id: Идентификатор изображения кофейной гущи.
+    """
+    from src.utils.logger import log_info, log_error
+    from src.db.operations import get_coffee_history_entry
+    
+    try:
+        user = await get_user_by_user_id(db, user_id)
+        entry = await get_coffee_history_entry(db, int(user.user_id), entry_id) if user else None
+        if entry is None:
+            log_info(f"Coffee entry {entry_id} not found for user {user_id}")
+            raise HTTPException(status_code=404, detail="Запись не найдена")
+        return entry
+    except HTTPException:
+        raise
+    except Exception as e:
+        log_error(f"Error retrieving coffee entry {entry_id} for user {user_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Ошибка при получении записи: {str(e)}")
+
 @router.delete("/clear-history", response_model=dict)
 async def clear_coffee_history(user_id: str, api_key: str = Depends(get_api_key), db = Depends(get_db)):
     """
@@ -24,7 +24,9 @@ class TarotRevealRequest(BaseModel):
 
 class PersonalForecastRequest(BaseModel):
     cards: List[int]
+    reversed: List[bool] = []
     category: str = ""
+    question: str = ""
 
 class RunesRevealRequest(BaseModel):
     runes: List[int]
@@ -37,14 +39,49 @@ class AnalyzeRequest(BaseModel):
 
 class SpiritualGrowthRequest(BaseModel):
     cards: List[int]
+    reversed: List[bool] = []
+    question: str = ""
 
 class TarotReadingRequest(BaseModel):
     type: str
 
+async def get_corpus_meanings(db, cards: list, reversed_cards: list, category: str):
+    """
+    Значения выбранных карт из корпуса заранее сгенерированных интерпретаций.
+
+    Args:
+        db: Объект базы данных.
+        cards: Индексы карт колоды из запроса.
+        reversed_cards: Признаки перевернутого положения карт (по порядку; отсутствующие — прямое положение).
+        category: Категория интерпретации.
+
+    Returns:
+        Список пар (карта, значение) или None, если категории нет в корпусе, индекс карты
+        вне колоды или для какой-либо карты нет записи в корпусе.
+    """
+    from src.utils.logger import log_error
+    from src.ai.corpus import get_card_interpretations, card_for_index, find_category, ORIENTATION_REVERSED, ORIENTATION_UPRIGHT
+
+    corpus_category = find_category(category)
+    names = [card_for_index(index) for index in cards]
+    if corpus_category is None or not names or None in names:
+        return None
+    flags = reversed_cards if isinstance(reversed_cards, list) else []
+    orientations = [ORIENTATION_REVERSED if i < len(flags) and flags[i] is True else ORIENTATION_UPRIGHT for i in range(len(names))]
+    try:
+        texts = await get_card_interpretations(db, [(name, orientation, corpus_category) for name, orientation in zip(names, orientations)])
+    except Exception as e:
+        log_error(f"Error reading card corpus: {str(e)}")
+        return None
+    if None in texts:
+        return None
+    return list(zip(names, texts))
+
 @router.post("/coffee-interpret", response_model=dict)
 async def coffee_interpret(request: Request, user_id: str = "unknown", api_key: str = Depends(get_api_key), db = Depends(get_db)):
     from src.utils.logger import log_info, log_error
     from src.ai.client import get_ai_response
+    from src.ai.rate_limit import enforce_ai_rate_limit
     try:
         body = await request.json()
         cards = body.get('cards', [])
@@ -52,6 +89,7 @@ async def coffee_interpret(request: Request, user_id: str = "unknown", api_key:
         reading_type = body.get('readingType', '')
         user_id_from_request = body.get('userId', 'unknown')
         log_info(f"Received coffee-interpret request for user {user_id_from_request} with data: cards={cards}, area={area}, readingType={reading_type}")
+        await enforce_ai_rate_limit(db, user_id_from_request if user_id_from_request != 'unknown' else user_id, request.client.host if request.client else None)
         prompt = "Интерпретируй символы кофейной гущи. "
         if area:
             prompt += f"Область чашки: {area}. "
@@ -59,9 +97,11 @@ async def coffee_interpret(request: Request, user_id: str = "unknown", api_key:
             prompt += f"Выбранные карты (индексы): {', '.join(map(str, cards))}. "
         if reading_type:
             prompt += f" Тип гадания: {reading_type}."
-        interpretation = get_ai_response(prompt)
+        interpretation = await get_ai_response(prompt)
         log_info(f"Coffee interpretation generated for user {user_id_from_request}")
         return {"interpretation": interpretation}
+    except HTTPException:
+        raise
     except Exception as e:
         log_error(f"Error in coffee interpretation for user {user_id_from_request}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Ошибка при интерпретации кофейной гущи: {str(e)}")
@@ -70,6 +110,7 @@ async def coffee_interpret(request: Request, user_id: str = "unknown", api_key:
 async def tarot_reveal(request: Request, user_id: str = "unknown", api_key: str = Depends(get_api_key), db = Depends(get_db)):
     from src.utils.logger import log_info, log_error
     from src.ai.client import get_ai_response
+    from src.ai.rate_limit import enforce_ai_rate_limit
     try:
         body = await request.json()
         cards = body.get('cards', [])
@@ -77,15 +118,18 @@ async def tarot_reveal(request: Request, user_id: str = "unknown", api_key: str
         time_periods = body.get('timePeriods', [])
         user_id_from_request = body.get('userId', 'unknown')
         log_info(f"Received tarot-reveal request for user {user_id_from_request} with data: cards={cards}, readingType={reading_type}, timePeriods={time_periods}")
+        await enforce_ai_rate_limit(db, user_id_from_request if user_id_from_request != 'unknown' else user_id, request.client.host if request.client else None)
         prompt = f"Интерпретируй карты Таро. Выбранные карты (индексы): {', '.join(map(str, cards))}."
         if reading_type:
             prompt += f" Тип расклада: {reading_type}."
         if time_periods and len(time_periods) == len(cards):
             for i, period in enumerate(time_periods):
                 prompt += f" Карта {cards[i]} соответствует периоду: {period}."
-        interpretation = get_ai_response(prompt)
+        interpretation = await get_ai_response(prompt)
         log_info(f"Tarot reveal interpretation generated for user {user_id_from_request}")
         return {"interpretation": interpretation}
+    except HTTPException:
+        raise
     except Exception as e:
         log_error(f"Error in tarot reveal for user {user_id_from_request}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Ошибка при раскрытии карт Таро: {str(e)}")
@@ -94,18 +138,31 @@ async def tarot_reveal(request: Request, user_id: str = "unknown", api_key: str
 async def personal_forecast(request: Request, user_id: str = "unknown", api_key: str = Depends(get_api_key), db = Depends(get_db)):
     from src.utils.logger import log_info, log_error
     from src.ai.client import get_ai_response
+    from src.ai.rate_limit import enforce_ai_rate_limit
     try:
         body = await request.json()
         cards = body.get('cards', [])
         category = body.get('category', '')
         user_id_from_request = body.get('userId', 'unknown')
+        question = body.get('question', '')
         log_info(f"Received personal-forecast request for user {user_id_from_request} with data: cards={cards}, category={category}")
+        if not question:
+            # Значения карт без вопроса в свободной форме отдаются из корпуса, если в нем есть категория
+            meanings = await get_corpus_meanings(db, cards, body.get('reversed', []), category)
+            if meanings:
+                log_info(f"Personal forecast served from card corpus for user {user_id_from_request}")
+                return {"forecast": "\n\n".join(f"{card}: {text}" for card, text in meanings)}
+        await enforce_ai_rate_limit(db, user_id_from_request if user_id_from_request != 'unknown' else user_id, request.client.host if request.client else None)
         prompt = f"Составь персональный прогноз на основе выбранных карт (индексы): {', '.join(map(str, cards))}."
         if category:
             prompt += f" Категория: {category}."
-        forecast = get_ai_response(prompt)
+        if question:
+            prompt += f" Вопрос: {question}."
+        forecast = await get_ai_response(prompt)
         log_info(f"Personal forecast generated for user {user_id_from_request}")
         return {"forecast": forecast}
+    except HTTPException:
+        raise
     except Exception as e:
         log_error(f"Error in personal forecast for user {user_id_from_request}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Ошибка при составлении персонального прогноза: {str(e)}")
@@ -114,20 +171,24 @@ async def personal_forecast(request: Request, user_id: str = "unknown", api_key:
 async def runes_reveal(request: Request, user_id: str = "unknown", api_key: str = Depends(get_api_key), db = Depends(get_db)):
     from src.utils.logger import log_info, log_error
     from src.ai.client import get_ai_response
+    from src.ai.rate_limit import enforce_ai_rate_limit
     try:
         body = await request.json()
         runes = body.get('runes', [])
         relationship_aspect = body.get('relationshipAspect', '')
         rune_aspect = body.get('runeAspect', '')
         log_info(f"Received runes-reveal request for user {user_id} with data: runes={runes}, relationshipAspect={relationship_aspect}, runeAspect={rune_aspect}")
+        await enforce_ai_rate_limit(db, user_id, request.client.host if request.client else None)
         prompt = f"Интерпретируй руны для анализа отношений. Выбранные руны (индексы): {', '.join(map(str, runes))}."
         if relationship_aspect:
             prompt += f" Аспект отношений: {relationship_aspect}."
         if rune_aspect:
             prompt += f" Аспект руны: {rune_aspect}."
-        interpretation = get_ai_response(prompt)
+        interpretation = await get_ai_response(prompt)
         log_info(f"Runes reveal interpretation generated for user {user_id}")
         return {"interpretation": interpretation}
+    except HTTPException:
+        raise
     except Exception as e:
         log_error(f"Error in runes reveal for user {user_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Ошибка при интерпретации рун: {str(e)}")
@@ -136,17 +197,21 @@ async def runes_reveal(request: Request, user_id: str = "unknown", api_key: str
 async def analyze(request: Request, user_id: str = "unknown", api_key: str = Depends(get_api_key), db = Depends(get_db)):
     from src.utils.logger import log_info, log_error
     from src.ai.client import get_ai_response
+    from src.ai.rate_limit import enforce_ai_rate_limit
     try:
         body = await request.json()
         cards = body.get('cards', [])
         category = body.get('category', '')
         log_info(f"Received analyze request for user {user_id} with data: cards={cards}, category={category}")
+        await enforce_ai_rate_limit(db, user_id, request.client.host if request.client else None)
         prompt = f"Проанализируй ситуацию на основе выбранных карт (индексы): {', '.join(map(str, cards))}."
         if category:
             prompt += f" Категория: {category}."
-        analysis = get_ai_response(prompt)
+        analysis = await get_ai_response(prompt)
         log_info(f"Situation analysis generated for user {user_id}")
         return {"analysis": analysis}
+    except HTTPException:
+        raise
     except Exception as e:
         log_error(f"Error in situation analysis for user {user_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Ошибка при анализе ситуации: {str(e)}")
@@ -155,18 +220,31 @@ async def analyze(request: Request, user_id: str = "unknown", api_key: str = Dep
 async def spiritual_growth(request: Request, user_id: str = "unknown", api_key: str = Depends(get_api_key), db = Depends(get_db)):
     from src.utils.logger import log_info, log_error
     from src.ai.client import get_ai_response
+    from src.ai.rate_limit import enforce_ai_rate_limit
     try:
         body = await request.json()
         cards = body.get('cards', [])
         aspect = body.get('aspect', '')
         user_id_from_request = body.get('userId', 'unknown')
+        question = body.get('question', '')
         log_info(f"Received spiritual-growth request for user {user_id_from_request} with data: cards={cards}, aspect={aspect}")
+        if not question and not aspect:
+            # Аспект в корпусе не учитывается, поэтому совет по аспекту всегда составляет ИИ
+            meanings = await get_corpus_meanings(db, cards, body.get('reversed', []), "spiritual_growth")
+            if meanings:
+                log_info(f"Spiritual growth advice served from card corpus for user {user_id_from_request}")
+                return {"advice": "\n\n".join(f"{card}: {text}" for card, text in meanings)}
+        await enforce_ai_rate_limit(db, user_id_from_request if user_id_from_request != 'unknown' else user_id, request.client.host if request.client else None)
         prompt = f"Дай совет по духовному росту на основе выбранной карты (индексы): {', '.join(map(str, cards))}."
         if aspect:
             prompt += f" Аспект: {aspect}."
-        advice = get_ai_response(prompt)
+        if question:
+            prompt += f" Вопрос: {question}."
+        advice = await get_ai_response(prompt)
         log_info(f"Spiritual growth advice generated for user {user_id_from_request}")
         return {"advice": advice}
+    except HTTPException:
+        raise
     except Exception as e:
         log_error(f"Error in spiritual growth advice for user {user_id_from_request}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Ошибка при предоставлении совета по духовному росту: {str(e)}")
@@ -175,11 +253,15 @@ async def spiritual_growth(request: Request, user_id: str = "unknown", api_key:
 async def tarot_reading(user_id: str, request: TarotReadingRequest, api_key: str = Depends(get_api_key), db = Depends(get_db)):
     from src.utils.logger import log_info, log_error
     from src.ai.client import get_ai_response
+    from src.ai.rate_limit import enforce_ai_rate_limit
+    await enforce_ai_rate_limit(db, user_id)
     try:
         prompt = f"Сделай расклад Таро типа: {request.type}."
-        reading = get_ai_response(prompt)
+        reading = await get_ai_response(prompt)
         log_info(f"Tarot reading of type {request.type} generated for user {user_id}")
         return {"reading": reading}
+    except HTTPException:
+        raise
     except Exception as e:
         log_error(f"Error in tarot reading for user {user_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Ошибка при выполнении расклада Таро: {str(e)}")
@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, Security, HTTPException
 from fastapi.security import APIKeyHeader
 from src.api.schemas import FeedbackRequest
 from config.config import API_KEY, get_db
-from src.db.operations import create_feedback, get_user_by_user_id, create_user
+from src.db.operations import create_feedback, get_user_by_user_id, get_or_create_user
 from datetime import datetime
 
 router = APIRouter(prefix="/feedback", tags=["feedback"])
@@ -33,9 +33,8 @@ async def get_api_key(api_key: str = Security(api_key_header)):
 #     from src.utils.logger import log_info, log_error
     
 #     try:
-#         user = await get_user_by_user_id(db, request.user_id)
-#         if user is None:
-#             user = await create_user(db, request.user_id)
+#         user, created = await get_or_create_user(db, request.user_id)
+#         if created:
 #             log_info(f"Created new user with ID {request.user_id} for feedback")
 #         await create_feedback(db, user.id, request.message)
 #         log_info(f"Feedback received: UserID={request.user_id}, MessageLength={len(request.message)}")
@@ -43,7 +42,7 @@ async def get_api_key(api_key: str = Security(api_key_header)):
 #         try:
 #             from src.ai.client import get_ai_response
 #             prompt = f"Проанализируй этот отзыв и определи его тональность: {request.message}."
-#             analysis = get_ai_response(prompt)
+#             analysis = await get_ai_response(prompt)
 #             log_info(f"AI analysis completed: UserID={request.user_id}, AnalysisLength={len(analysis)}")
 #         except Exception as ai_error:
 #             analysis = "Ошибка при получении ответа от ИИ."
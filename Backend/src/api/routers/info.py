@@ -44,7 +44,7 @@ async def get_api_key(api_key: str = Security(api_key_header)):
 #             else:
 #                 from src.ai.client import get_ai_response
 #                 prompt = f"Создай справочную статью на тему {topic} для бота ZodiacBot."
-#                 generated_content = get_ai_response(prompt)
+#                 generated_content = await get_ai_response(prompt)
 #                 log_info(f"Generated AI content for topic '{topic}'")
 #                 return {"title": f"Статья о {topic}", "text": generated_content}
 #             log_info(f"No content found for topic '{topic}', returned default or AI-generated content")
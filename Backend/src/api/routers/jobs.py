@@ -0,0 +1,66 @@
+from fastapi import APIRouter, Depends, Security, HTTPException
+from fastapi.responses import JSONResponse
+from fastapi.security import APIKeyHeader
+from urllib.parse import urlencode
+from config.config import API_KEY, get_db
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
+
+async def get_api_key(api_key: str = Security(api_key_header)):
+    if api_key != API_KEY:
+        raise HTTPException(status_code=403, detail="Invalid API Key")
+    return api_key
+
+def job_accepted_response(job_id: str, user_id: str) -> JSONResponse:
+    # Ответ 202 Accepted для запроса, поставленного в очередь задач
+    status_url = f"/jobs/{job_id}?{urlencode({'user_id': user_id})}"
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job_id, "status": "queued", "status_url": status_url},
+        headers={"Location": status_url}
+    )
+
+@router.get("/{job_id}", response_model=dict)
+async def get_job(job_id: str, user_id: str, wait: float = 0, api_key: str = Depends(get_api_key), db = Depends(get_db)):
+    """
+    Получить статус и результат асинхронной задачи.
+
+    Этот эндпоинт возвращает состояние задачи, поставленной в очередь эндпоинтами с параметром job=true
+    (например, /tarot/draw и /coffee/fortune). С параметром wait запрос ожидает завершения задачи
+    до указанного числа секунд (long-poll) и возвращается сразу, как только результат готов.
+
+    Параметры:
+    - job_id: Идентификатор задачи, полученный в ответе 202.
+    - user_id: Идентификатор пользователя, поставившего задачу; для чужой задачи возвращается 404.
+    - wait: Сколько секунд ждать завершения задачи (по умолчанию 0, максимум AI_JOB_MAX_WAIT).
+
+    Возвращает:
+    - job_id: Идентификатор задачи.
+    - kind: Тип задачи.
+    - status: Статус задачи: queued, running, done или failed.
+    - result: Результат задачи в формате исходного эндпоинта (только для done).
+    - error: Описание ошибки (только для failed).
+    - created_at: Дата постановки задачи.
+    - finished_at: Дата завершения задачи.
+    """
+    from src.utils.logger import log_error
+    from src.ai.jobs import wait_for_job, STATUS_DONE, STATUS_FAILED
+
+    try:
+        job = await wait_for_job(db, job_id, user_id, wait)
+    except Exception as e:
+        log_error(f"Error retrieving AI job {job_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Ошибка при получении статуса задачи: {str(e)}")
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return {
+        "job_id": job["_id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "result": job.get("result") if job["status"] == STATUS_DONE else None,
+        "error": job.get("error") if job["status"] == STATUS_FAILED else None,
+        "created_at": job.get("created_at"),
+        "finished_at": job.get("finished_at")
+    }
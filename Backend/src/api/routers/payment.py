@@ -7,7 +7,6 @@ from datetime import datetime, timedelta
 import requests
 import uuid
 from typing import Dict
-from src.ai.client import get_ai_response
 from pydantic import BaseModel
 from typing import Optional
 
@@ -1,10 +1,12 @@
 from fastapi import APIRouter, Depends, Security, HTTPException
 from fastapi.security import APIKeyHeader
-from src.api.schemas import TarotDrawRequest, TarotDrawResponse, TarotHistoryItem
-from config.config import API_KEY, get_db
-from src.db.operations import create_tarot_history, get_tarot_history, get_user_by_user_id, create_user, delete_user_history
+from src.api.schemas import TarotDrawRequest, TarotDrawResponse, TarotHistoryItem, HistoryPage
+from config.config import API_KEY, HISTORY_PAGE_SIZE, get_db
+from src.db.operations import create_tarot_history, get_tarot_history, get_user_by_user_id, get_or_create_user, delete_user_history
+from src.ai.jobs import register_job_handler, enqueue_job
+from src.api.routers.jobs import job_accepted_response
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 import random
 
 router = APIRouter(prefix="/tarot", tags=["tarot"])
@@ -19,8 +21,59 @@ async def get_api_key(api_key: str = Security(api_key_header)):
         raise HTTPException(status_code=403, detail="Invalid API Key")
     return api_key
 
-@router.post("/draw", response_model=TarotDrawResponse)
-async def tarot_draw(request: TarotDrawRequest, api_key: str = Depends(get_api_key), db = Depends(get_db)):
+def draw_cards(spread_type: str) -> List[str]:
+    # Mock card draw based on spread type
+    if spread_type == "3_cards":
+        return random.sample(TAROT_CARDS, 3)
+    return random.sample(TAROT_CARDS, 1)  # Default to 1 card if spread type is unknown
+
+async def perform_tarot_draw(db, user_id: str, question: str, spread_type: str, job_id: Optional[str] = None) -> dict:
+    """
+    Расклад карт, интерпретация ИИ и сохранение в историю пользователя.
+    
+    Args:
+        db: Объект базы данных.
+        user_id: Уникальный идентификатор пользователя.
+        question: Вопрос пользователя.
+        spread_type: Тип расклада.
+        job_id: Идентификатор задачи очереди. Для задачи ошибки ИИ выбрасываются, чтобы задача
+            была повторена или завершилась ошибкой, а запись в истории создается одна на задачу.
+    
+    Returns:
+        dict: Карты, интерпретация и дата расклада.
+    """
+    from src.utils.logger import log_info
+    from src.ai.client import get_ai_response, fetch_ai_response
+    
+    cards = draw_cards(spread_type)
+    
+    # Используем AI API для более глубокой интерпретации карт
+    prompt = f"Интерпретируй карты Таро в контексте вопроса: {question}. Карты: {', '.join(cards)}."
+    if job_id is not None:
+        interpretation = await fetch_ai_response(prompt)
+    else:
+        interpretation = await get_ai_response(prompt, similar=(f"tarot:{spread_type}:{','.join(cards)}", question))
+    log_info(f"AI interpretation generated for tarot draw with question: {question[:50]}...")
+    
+    # Save to history
+    user, created = await get_or_create_user(db, user_id)
+    if created:
+        log_info(f"Created new user with ID {user_id} for tarot draw")
+    entry = await create_tarot_history(db, int(user.user_id), question, ",".join(cards), interpretation, job_id)
+    log_info(f"Tarot draw completed for user {user_id} with question: {question}")
+    
+    if entry is not None:
+        # Повтор задачи возвращает расклад, сохраненный первой попыткой
+        return {"cards": entry["cards"].split(","), "interpretation": entry["interpretation"], "date": entry["created_at"]}
+    return {"cards": cards, "interpretation": interpretation, "date": datetime.now()}
+
+async def run_tarot_draw_job(db, payload: dict, job_id: str) -> dict:
+    return await perform_tarot_draw(db, payload["user_id"], payload["question"], payload["spread_type"], job_id)
+
+register_job_handler("tarot_draw", run_tarot_draw_job)
+
+@router.post("/draw", response_model=TarotDrawResponse, responses={202: {"description": "Задача поставлена в очередь (job=true)"}})
+async def tarot_draw(request: TarotDrawRequest, job: bool = False, api_key: str = Depends(get_api_key), db = Depends(get_db)):
     """
     Получить расклад ТАРО и его трактовку.
     
@@ -28,63 +81,92 @@ async def tarot_draw(request: TarotDrawRequest, api_key: str = Depends(get_api_k
     Поддерживаются различные типы раскладов, например, "3_cards" для расклада из трех карт.
     В ответ возвращается список выбранных карт и их интерпретация.
     Данные о раскладе сохраняются в истории пользователя в базе данных MongoDB.
+    С параметром job=true расклад ставится в очередь: сразу возвращается ответ 202 с идентификатором задачи,
+    а результат (в том же формате) забирается через GET /jobs/{job_id}?user_id=... (status_url из ответа).
     
     Параметры:
     - user_id: Уникальный идентификатор пользователя, делающего запрос (строка).
     - question: Вопрос, на который пользователь хочет получить ответ через расклад Таро (строка).
     - spread_type: Тип расклада, используйте "3_cards" для расклада из трех карт, любой другой текст вернет одну карту.
+    - job: Выполнить расклад асинхронно через очередь задач (по умолчанию False).
     
     Возвращает:
     - cards: Список названий карт, выбранных для расклада.
     - interpretation: Текстовая интерпретация расклада, основанная на выбранных картах.
     - date: Дата и время выполнения расклада.
+    - Для job=true: job_id, status и status_url задачи (код 202).
     """
-    from src.utils.logger import log_info, log_error
+    from src.utils.logger import log_error
+    from src.ai.rate_limit import enforce_ai_rate_limit
     
+    await enforce_ai_rate_limit(db, request.user_id)
     try:
-        # Mock card draw based on spread type
-        if request.spread_type == "3_cards":
-            cards = random.sample(TAROT_CARDS, 3)
-        else:
-            cards = random.sample(TAROT_CARDS, 1)  # Default to 1 card if spread type is unknown
-        
-        # Используем AI API для более глубокой интерпретации карт
-        from src.ai.client import get_ai_response
-        prompt = f"Интерпретируй карты Таро в контексте вопроса: {request.question}. Карты: {', '.join(cards)}."
-        interpretation = get_ai_response(prompt)
-        log_info(f"AI interpretation generated for tarot draw with question: {request.question[:50]}...")
-        
-        # Save to history
-        user = await get_user_by_user_id(db, request.user_id)
-        if user is None:
-            user = await create_user(db, request.user_id)
-            log_info(f"Created new user with ID {request.user_id} for tarot draw")
-        await create_tarot_history(db, int(user.user_id), request.question, ",".join(cards), interpretation)
-        log_info(f"Tarot draw completed for user {request.user_id} with question: {request.question}")
-        
-        return {"cards": cards, "interpretation": interpretation, "date": datetime.now()}
+        if job:
+            job_id = await enqueue_job(db, "tarot_draw", request.model_dump(), request.user_id)
+            return job_accepted_response(job_id, request.user_id)
+        return await perform_tarot_draw(db, request.user_id, request.question, request.spread_type)
     except Exception as e:
         log_error(f"Error in tarot_draw for user {request.user_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Ошибка при выполнении расклада Таро: {str(e)}")
 
-@router.get("/user/history", response_model=dict)
-async def tarot_history(user_id: str, api_key: str = Depends(get_api_key), db = Depends(get_db)):
+@router.post("/draw/stream")
+async def tarot_draw_stream(request: TarotDrawRequest, api_key: str = Depends(get_api_key), db = Depends(get_db)):
+    """
+    Получить расклад ТАРО с потоковой трактовкой (Server-Sent Events).
+    
+    Работает как /tarot/draw, но интерпретация передается по мере генерации.
+    Первое событие "meta" содержит выпавшие карты, затем идут события с полем delta
+    (фрагменты интерпретации), последнее событие "done" содержит дату расклада.
+    Расклад сохраняется в истории пользователя после завершения потока.
+    
+    Параметры:
+    - user_id: Уникальный идентификатор пользователя, делающего запрос (строка).
+    - question: Вопрос, на который пользователь хочет получить ответ через расклад Таро (строка).
+    - spread_type: Тип расклада, используйте "3_cards" для расклада из трех карт, любой другой текст вернет одну карту.
+    
+    Возвращает:
+    - Поток событий text/event-stream.
+    """
+    from src.utils.logger import log_info
+    from src.ai.rate_limit import enforce_ai_rate_limit
+    from src.api.streaming import interpretation_events, sse_response
+    
+    await enforce_ai_rate_limit(db, request.user_id)
+    cards = draw_cards(request.spread_type)
+    prompt = f"Интерпретируй карты Таро в контексте вопроса: {request.question}. Карты: {', '.join(cards)}."
+    
+    async def save_history(interpretation: str):
+        user, created = await get_or_create_user(db, request.user_id)
+        if created:
+            log_info(f"Created new user with ID {request.user_id} for tarot draw")
+        await create_tarot_history(db, int(user.user_id), request.question, ",".join(cards), interpretation)
+        log_info(f"Streamed tarot draw completed for user {request.user_id} with question: {request.question}")
+    
+    return sse_response(interpretation_events(prompt, save_history, meta={"cards": cards}))
+
+@router.get("/user/history", response_model=HistoryPage)
+async def tarot_history(user_id: str, limit: int = HISTORY_PAGE_SIZE, cursor: Optional[str] = None, api_key: str = Depends(get_api_key), db = Depends(get_db)):
     """
     Получить историю раскладов пользователя.
     
-    Этот эндпоинт возвращает список всех раскладов Таро, выполненных пользователем.
-    История включает идентификатор записи, дату расклада, выбранные карты и интерпретацию.
+    Этот эндпоинт возвращает расклады Таро, выполненные пользователем за последние 7 дней, страницами
+    от новых к старым. История включает идентификатор записи, дату расклада, вопрос, выбранные карты и начало
+    интерпретации; полная интерпретация возвращается эндпоинтом /tarot/user/history/{entry_id}.
     
     Параметры:
     - user_id: Уникальный идентификатор пользователя, чью историю нужно получить.
+    - limit: Количество записей на странице (по умолчанию 20, не больше 100).
+    - cursor: Курсор следующей страницы из поля next_cursor предыдущего ответа (для первой страницы не указывается).
     
     Возвращает:
     - status: Статус операции.
     - history: Список записей истории, каждая из которых содержит:
         - id: Идентификатор записи.
         - date: Дата и время выполнения расклада в формате строки.
+        - question: Вопрос пользователя.
         - cards: Список карт, выбранных в раскладе, в виде строки.
-        - interpretation: Интерпретация расклада.
+        - preview: Начало интерпретации расклада.
+    - next_cursor: Курсор следующей страницы или null, если страница последняя.
     """
     from src.utils.logger import log_info, log_error
     from datetime import datetime
@@ -93,24 +175,63 @@ async def tarot_history(user_id: str, api_key: str = Depends(get_api_key), db =
         user = await get_user_by_user_id(db, user_id)
         if user is None:
             log_info(f"No user found with ID {user_id} for tarot history")
-            return {"status": "success", "history": []}
-        history = await get_tarot_history(db, int(user.user_id))
+            return {"status": "success", "history": [], "next_cursor": None}
+        try:
+            history, next_cursor = await get_tarot_history(db, int(user.user_id), limit, cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Некорректный курсор страницы истории")
         log_info(f"Retrieved tarot history for user {user_id}")
         
         formatted_history = []
         for item in history:
             formatted_history.append({
-                "id": str(item.id) if hasattr(item, 'id') else "N/A",
+                "id": item.id or "N/A",
                 "date": item.date.strftime("%d %B %Y г. в %H:%M") if isinstance(item.date, datetime) else str(item.date),
+                "question": item.question,
                 "cards": ", ".join(item.cards) if isinstance(item.cards, list) else item.cards,
-                "interpretation": item.summary if hasattr(item, 'summary') else "Нет описания"
+                "preview": item.summary or "Нет описания"
             })
         
-        return {"status": "success", "history": formatted_history}
+        return {"status": "success", "history": formatted_history, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         log_error(f"Error retrieving tarot history for user {user_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Ошибка при получении истории раскладов: {str(e)}")
 
+@router.get("/user/history/{entry_id}", response_model=dict)
+async def tarot_history_entry(entry_id: str, user_id: str, api_key: str = Depends(get_api_key), db = Depends(get_db)):
+    """
+    Получить запись истории раскладов с полной интерпретацией.
+    
+    Параметры:
+    - entry_id: Идентификатор записи из списка истории.
+    - user_id: Уникальный идентификатор пользователя, которому принадлежит запись.
+    
+    Возвращает:
+    - id: Идентификатор записи.
+    - date: Дата и время выполнения расклада.
+    - question: Вопрос пользователя.
+    - cards: Список карт расклада.
+    - interpretation: Полная интерпретация расклада.
+    - notes: Заметки пользователя к записи (если есть).
+    """
+    from src.utils.logger import log_info, log_error
+    from src.db.operations import get_tarot_history_entry
+    
+    try:
+        user = await get_user_by_user_id(db, user_id)
+        entry = await get_tarot_history_entry(db, int(user.user_id), entry_id) if user else None
+        if entry is None:
+            log_info(f"Tarot entry {entry_id} not found for user {user_id}")
+            raise HTTPException(status_code=404, detail="Запись не найдена")
+        return entry
+    except HTTPException:
+        raise
+    except Exception as e:
+        log_error(f"Error retrieving tarot entry {entry_id} for user {user_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Ошибка при получении записи: {str(e)}")
+
 @router.delete("/clear-history", response_model=dict)
 async def clear_tarot_history(user_id: str, api_key: str = Depends(get_api_key), db = Depends(get_db)):
     """
@@ -1,8 +1,8 @@
 from fastapi import APIRouter, Depends, Security, HTTPException
 from fastapi.security import APIKeyHeader
-from src.api.schemas import SubscriptionRequest, SubscriptionResponse, User
-from config.config import API_KEY, get_db
-from src.db.operations import get_user_by_user_id, create_user, update_user_subscription, update_user
+from src.api.schemas import SubscriptionRequest, SubscriptionResponse, User, HistoryPage
+from config.config import API_KEY, HISTORY_PAGE_SIZE, get_db
+from src.db.operations import get_user_by_user_id, get_or_create_user, update_user_subscription, update_user, get_user_timeline, search_history
 from datetime import datetime, timedelta
 from typing import Optional
 
@@ -40,10 +40,8 @@ async def user_profile(user_id: str, api_key: str = Depends(get_api_key), db = D
     from src.utils.logger import log_info, log_error
     
     try:
-        user = await get_user_by_user_id(db, user_id)
-        if user is None:
-            # Create a new user if not found
-            user = await create_user(db, user_id)
+        user, created = await get_or_create_user(db, user_id)
+        if created:
             log_info(f"User profile created: ID={user_id}, Action=NewUser")
         else:
             log_info(f"User profile accessed: ID={user_id}, Action=ProfileView")
@@ -268,19 +266,30 @@ async def delete_tarot_history(user_id: str, api_key: str = Depends(get_api_key)
         log_error(f"Error deleting tarot history for user {user_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Ошибка при удалении истории раскладов Таро: {str(e)}")
 
-@router.get("/history", response_model=dict)
-async def get_user_history(user_id: str, api_key: str = Depends(get_api_key), db = Depends(get_db)):
+@router.get("/history", response_model=HistoryPage)
+async def get_user_history(user_id: str, limit: int = HISTORY_PAGE_SIZE, cursor: Optional[str] = None, api_key: str = Depends(get_api_key), db = Depends(get_db)):
     """
     Получить историю действий пользователя.
     
-    Этот эндпоинт возвращает историю действий пользователя, включая расклады Таро и другие операции.
+    Этот эндпоинт возвращает общую ленту раскладов Таро и предсказаний по кофейной гуще пользователя
+    страницами от новых к старым. Полный текст записи возвращают эндпоинты /tarot/user/history/{entry_id}
+    и /coffee/history/{entry_id}.
     
     Параметры:
     - user_id: Уникальный идентификатор пользователя, чью историю нужно получить.
+    - limit: Количество записей на странице (по умолчанию 20, не больше 100).
+    - cursor: Курсор следующей страницы из поля next_cursor предыдущего ответа (для первой страницы не указывается).
     
     Возвращает:
     - status: Статус операции ("success" или "error").
-    - history: Список записей истории действий пользователя.
+    - history: Список записей истории действий пользователя, каждая из которых содержит:
+        - id: Идентификатор записи.
+        - type: Тип записи ("tarot" или "coffee").
+        - date: Дата и время записи.
+        - question: Вопрос пользователя.
+        - cards: Список карт расклада (пустой для кофейной гущи).
+        - preview: Начало интерпретации.
+    - next_cursor: Курсор следующей страницы или null, если страница последняя.
     """
     from src.utils.logger import log_info, log_error
     
@@ -288,29 +297,44 @@ async def get_user_history(user_id: str, api_key: str = Depends(get_api_key), db
         user = await get_user_by_user_id(db, user_id)
         if user is None:
             raise HTTPException(status_code=404, detail="Пользователь не найден")
-            
-        # Placeholder: Actual history retrieval to be implemented in database operations
-        placeholder_history = []
-        log_info(f"User history retrieved for user {user_id} (placeholder data)")
-        return {"status": "success", "history": placeholder_history}
+        try:
+            history, next_cursor = await get_user_timeline(db, int(user.user_id), limit, cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Некорректный курсор страницы истории")
+        log_info(f"User history retrieved for user {user_id}: {len(history)} entries")
+        return {"status": "success", "history": history, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         log_error(f"Error retrieving history for user {user_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Ошибка при получении истории пользователя: {str(e)}")
 
 @router.get("/history/search", response_model=dict)
-async def search_user_history(user_id: str, query: str = "", api_key: str = Depends(get_api_key), db = Depends(get_db)):
+async def search_user_history(user_id: str, query: str = "", limit: int = HISTORY_PAGE_SIZE, cursor: Optional[str] = None, api_key: str = Depends(get_api_key), db = Depends(get_db)):
     """
     Поиск в истории действий пользователя.
     
-    Этот эндпоинт позволяет искать записи в истории действий пользователя по заданному запросу.
+    Этот эндпоинт ищет по тексту вопросов и интерпретаций раскладов Таро и предсказаний по кофейной гуще
+    пользователя с учетом русской морфологии и возвращает найденные записи страницами, от более
+    релевантных к менее релевантным.
     
     Параметры:
     - user_id: Уникальный идентификатор пользователя, в чьей истории нужно выполнить поиск.
-    - query: Поисковый запрос для фильтрации записей истории (опционально).
+    - query: Поисковый запрос: слова, "точные фразы" в кавычках, -слова для исключения (пустой запрос ничего не находит).
+    - limit: Количество записей на странице (по умолчанию 20, не больше 100).
+    - cursor: Курсор следующей страницы из поля next_cursor предыдущего ответа (для первой страницы не указывается).
     
     Возвращает:
     - status: Статус операции ("success" или "error").
-    - results: Список записей истории, соответствующих поисковому запросу.
+    - results: Список найденных записей, каждая из которых содержит:
+        - id: Идентификатор записи.
+        - type: Тип записи ("tarot" или "coffee").
+        - date: Дата и время записи.
+        - question: Вопрос пользователя.
+        - cards: Список карт расклада (пустой для кофейной гущи).
+        - preview: Начало интерпретации.
+        - score: Релевантность записи запросу.
+    - next_cursor: Курсор следующей страницы или null, если страница последняя.
     """
     from src.utils.logger import log_info, log_error
     
@@ -318,11 +342,14 @@ async def search_user_history(user_id: str, query: str = "", api_key: str = Depe
         user = await get_user_by_user_id(db, user_id)
         if user is None:
             raise HTTPException(status_code=404, detail="Пользователь не найден")
-            
-        # Placeholder: Actual search to be implemented in database operations
-        placeholder_results = []
-        log_info(f"History search performed for user {user_id} with query '{query}' (placeholder data)")
-        return {"status": "success", "results": placeholder_results}
+        try:
+            results, next_cursor = await search_history(db, int(user.user_id), query, limit, cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Некорректный курсор страницы поиска")
+        log_info(f"History search performed for user {user_id} with query '{query}': {len(results)} results")
+        return {"status": "success", "results": results, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         log_error(f"Error searching history for user {user_id} with query '{query}': {str(e)}")
         raise HTTPException(status_code=500, detail=f"Ошибка при поиске в истории пользователя: {str(e)}")
@@ -39,6 +39,7 @@ class TarotDrawResponse(BaseModel):
 
 # Tarot History Schemas
 class TarotHistoryItem(BaseModel):
+    id: Optional[str] = None
     date: datetime
     question: str
     cards: List[str]
@@ -47,6 +48,12 @@ class TarotHistoryItem(BaseModel):
     class Config:
         from_attributes = True
 
+# History Page Schemas
+class HistoryPage(BaseModel):
+    status: str = "success"
+    history: List[dict]
+    next_cursor: Optional[str] = None
+
 # Coffee Fortune Schemas
 class CoffeeFortuneRequest(BaseModel):
     user_id: str
@@ -109,6 +116,7 @@ class CardMeaning(BaseModel):
     name: str
     positive: str
     negative: str
+    ai_summary: Optional[str] = None
 
     class Config:
         from_attributes = True
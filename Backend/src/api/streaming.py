@@ -0,0 +1,72 @@
+import json
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from fastapi.responses import StreamingResponse
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    """
+    Форматирование одного события Server-Sent Events.
+
+    Args:
+        data: Данные события, сериализуются в JSON.
+        event: Имя события (по умолчанию безымянное событие "message").
+
+    Returns:
+        str: Событие в формате text/event-stream.
+    """
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+async def interpretation_events(prompt: str, on_complete: Optional[Callable[[str], Awaitable]] = None, meta: Optional[dict] = None) -> AsyncIterator[str]:
+    """
+    Поток событий с интерпретацией ИИ.
+
+    Сначала отправляется событие "meta" (если передано), затем фрагменты ответа как события
+    с полем delta, и в конце событие "done". После завершения потока полный текст передается
+    в on_complete (например, для записи в историю). При ошибке отправляется событие "error".
+
+    Args:
+        prompt: Промпт для ИИ.
+        on_complete: Асинхронная функция, получающая полный текст интерпретации.
+        meta: Данные, отправляемые до начала генерации (например, выпавшие карты).
+
+    Yields:
+        str: События в формате text/event-stream.
+    """
+    from src.ai.client import stream_ai_response
+    from src.utils.logger import log_error
+
+    if meta is not None:
+        yield sse_event(meta, "meta")
+    parts = []
+    try:
+        async for delta in stream_ai_response(prompt):
+            parts.append(delta)
+            yield sse_event({"delta": delta})
+    except Exception as e:
+        log_error(f"Error in AI stream for question {prompt[:50]}...: {str(e)}")
+        yield sse_event({"message": "К сожалению, произошла ошибка при получении ответа от ИИ. Пожалуйста, попробуйте снова через некоторое время."}, "error")
+        return
+    if on_complete is not None:
+        try:
+            await on_complete("".join(parts))
+        except Exception as e:
+            log_error(f"Error saving streamed interpretation: {str(e)}")
+    yield sse_event({"date": datetime.now()}, "done")
+
+def sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    """
+    Ответ FastAPI, отдающий поток событий без буферизации.
+
+    Args:
+        events: Асинхронный итератор событий.
+
+    Returns:
+        StreamingResponse: Ответ с типом text/event-stream.
+    """
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -12,7 +12,7 @@ async def cmd_start(message: Message):
     """
     from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
     from config.config import APP_LINK, get_db
-    from src.db.operations import get_user_by_user_id, create_user
+    from src.db.operations import get_or_create_user
     from src.utils.logger import log_info, log_error
     
     try:
@@ -20,9 +20,8 @@ async def cmd_start(message: Message):
         log_info(f"Received /start command from Telegram ID {user_id}")
         # Используем прямой доступ к базе данных, так как асинхронный контекстный менеджер вызывает ошибку
         from config.config import db
-        user = await get_user_by_user_id(db, user_id)
-        if user is None:
-            user = await create_user(db, user_id)
+        user, created = await get_or_create_user(db, user_id)
+        if created:
             log_info(f"Created new user with Telegram ID {user_id} on /start command")
         else:
             log_info(f"User with Telegram ID {user_id} already exists, skipping registration")
@@ -0,0 +1,173 @@
+import argparse
+import asyncio
+from typing import Iterable, List, Optional, Tuple, Union
+
+from src.ai.cache import CACHE_COLLECTION
+from src.ai.corpus import CORPUS_COLLECTION
+from src.ai.jobs import JOBS_COLLECTION
+from src.ai.usage import USAGE_COLLECTION
+from src.utils.logger import log_info, log_warning
+
+class IndexSpec:
+    """
+    Описание индекса коллекции: ключи и параметры create_index.
+    """
+
+    def __init__(self, collection: str, keys: List[Tuple[str, Union[int, str]]], purpose: str, **options):
+        self.collection = collection
+        self.keys = keys
+        self.purpose = purpose
+        self.options = options
+
+    def describe(self) -> str:
+        return f"{self.collection}({', '.join(f'{field}:{direction}' for field, direction in self.keys)})"
+
+# Все индексы, которыми управляет приложение. Индексы создаются при старте и сравниваются
+# с существующими по ключам, поэтому повторное применение ничего не меняет.
+INDEXES: List[IndexSpec] = [
+    IndexSpec("users", [("user_id", 1)], "get_user_by_user_id и обновления пользователя", unique=True),
+    IndexSpec("tarot_history", [("user_id", 1), ("created_at", -1), ("_id", -1)], "страницы истории раскладов пользователя по ключу (created_at, _id)"),
+    IndexSpec("coffee_history", [("user_id", 1), ("created_at", -1), ("_id", -1)], "страницы истории предсказаний пользователя по ключу (created_at, _id)"),
+    IndexSpec("tarot_history", [("user_id", 1), ("question", "text"), ("interpretation", "text")], "полнотекстовый поиск по раскладам пользователя",
+              default_language="russian", weights={"question": 3, "interpretation": 1}),
+    IndexSpec("coffee_history", [("user_id", 1), ("question", "text"), ("interpretation", "text")], "полнотекстовый поиск по предсказаниям пользователя",
+              default_language="russian", weights={"question": 3, "interpretation": 1}),
+    IndexSpec("tarot_history", [("job_id", 1)], "одна запись истории на задачу очереди",
+              unique=True, partialFilterExpression={"job_id": {"$exists": True}}),
+    IndexSpec("coffee_history", [("job_id", 1)], "одна запись истории на задачу очереди",
+              unique=True, partialFilterExpression={"job_id": {"$exists": True}}),
+    IndexSpec("card_meanings", [("name", 1)], "список значений карт, отсортированный по названию"),
+    IndexSpec("info_pages", [("slug", 1)], "поиск информационной страницы по slug"),
+    IndexSpec(CACHE_COLLECTION, [("expires_at", 1)], "удаление устаревших ответов ИИ по TTL", expireAfterSeconds=0),
+    IndexSpec(CORPUS_COLLECTION, [("card", 1), ("orientation", 1), ("category", 1)], "уникальность записей корпуса интерпретаций", unique=True),
+    IndexSpec(JOBS_COLLECTION, [("status", 1), ("created_at", 1)], "выборка очереди задач"),
+    IndexSpec(JOBS_COLLECTION, [("expires_at", 1)], "удаление завершенных задач по TTL", expireAfterSeconds=0),
+    IndexSpec(USAGE_COLLECTION, [("day", 1), ("endpoint", 1)], "сводка расхода токенов по эндпоинтам"),
+    IndexSpec(USAGE_COLLECTION, [("day", 1), ("user", 1)], "сводка расхода токенов по пользователям"),
+]
+
+def _select(collections: Optional[Iterable[str]]) -> List[IndexSpec]:
+    if collections is None:
+        return INDEXES
+    selected = set(collections)
+    return [spec for spec in INDEXES if spec.collection in selected]
+
+def _normalize_key(keys) -> Tuple[Tuple[str, Union[int, str]], ...]:
+    # Поля текстового индекса сравниваются без учета порядка: MongoDB хранит их как множество
+    keys = list(keys)
+    text = sorted(field for field, direction in keys if direction == "text")
+    plain = [(field, direction) for field, direction in keys if direction != "text"]
+    if not text:
+        return tuple(plain)
+    position = next(i for i, (_, direction) in enumerate(keys) if direction == "text")
+    return tuple(plain[:position] + [(field, "text") for field in text] + plain[position:])
+
+def _key_tuple(index: dict) -> Tuple[Tuple[str, Union[int, str]], ...]:
+    keys = []
+    for field, direction in index["key"].items():
+        if field == "_fts":
+            # Текстовый индекс хранит вместо своих полей служебные _fts/_ftsx, а сами поля — в weights
+            keys.extend((text_field, "text") for text_field in index.get("weights", {}))
+        elif field != "_ftsx":
+            # MongoDB может вернуть направление как 1.0 вместо 1
+            keys.append((field, int(direction) if isinstance(direction, (int, float)) else direction))
+    return _normalize_key(keys)
+
+async def ensure_indexes(db, collections: Optional[Iterable[str]] = None) -> int:
+    """
+    Создание индексов из реестра. Ошибка одного индекса (например, дубликаты
+    для уникального индекса) не мешает созданию остальных.
+
+    Args:
+        db: Объект базы данных.
+        collections: Коллекции, индексы которых нужно создать (по умолчанию все).
+
+    Returns:
+        int: Число индексов, которые не удалось создать.
+    """
+    failed = 0
+    for spec in _select(collections):
+        try:
+            await db[spec.collection].create_index(spec.keys, **spec.options)
+        except Exception as e:
+            failed += 1
+            log_warning(f"Could not create index {spec.describe()}: {str(e)}")
+    return failed
+
+async def get_index_report(db, collections: Optional[Iterable[str]] = None) -> List[dict]:
+    """
+    Сравнение индексов из реестра с индексами в базе.
+
+    Args:
+        db: Объект базы данных.
+        collections: Коллекции для проверки (по умолчанию все коллекции реестра).
+
+    Returns:
+        List[dict]: Для каждого индекса: коллекция, ключи, имя, статус (ok, missing — объявлен,
+        но отсутствует; unused — не использовался с момента запуска MongoDB; undeclared — есть в базе,
+        но не объявлен в реестре), число обращений, если MongoDB его сообщает, и назначение индекса.
+    """
+    specs = _select(collections)
+    report = []
+    for collection in dict.fromkeys(spec.collection for spec in specs):
+        existing = {}
+        async for index in db[collection].list_indexes():
+            if index["name"] != "_id_":
+                existing[_key_tuple(index)] = index["name"]
+        usage = {}
+        try:
+            async for stats in db[collection].aggregate([{"$indexStats": {}}]):
+                usage[stats["name"]] = int(stats["accesses"]["ops"])
+        except Exception:
+            # $indexStats недоступен (нет прав или неподдерживаемый сервер): проверяется только наличие
+            pass
+        declared = set()
+        for spec in specs:
+            if spec.collection != collection:
+                continue
+            key = _normalize_key(spec.keys)
+            declared.add(key)
+            name = existing.get(key)
+            ops = usage.get(name) if name else None
+            status = "missing" if name is None else "unused" if ops == 0 else "ok"
+            report.append({"collection": collection, "keys": spec.describe(), "name": name, "status": status, "ops": ops, "purpose": spec.purpose})
+        for key, name in existing.items():
+            if key not in declared:
+                report.append({"collection": collection, "keys": name, "name": name, "status": "undeclared", "ops": usage.get(name), "purpose": None})
+    return report
+
+async def apply_index_registry(db):
+    """
+    Применение реестра индексов при старте приложения с записью в лог отсутствующих,
+    неиспользуемых и необъявленных индексов.
+
+    Args:
+        db: Объект базы данных.
+    """
+    failed = await ensure_indexes(db)
+    report = await get_index_report(db)
+    missing = [row["keys"] for row in report if row["status"] == "missing"]
+    unused = [row["keys"] for row in report if row["status"] == "unused"]
+    undeclared = [f"{row['collection']}.{row['name']}" for row in report if row["status"] == "undeclared"]
+    if missing:
+        log_warning(f"Missing MongoDB indexes: {', '.join(missing)}")
+    if unused:
+        log_info(f"MongoDB indexes unused since the server started: {', '.join(unused)}")
+    if undeclared:
+        log_info(f"MongoDB indexes not declared in the registry: {', '.join(undeclared)}")
+    log_info(f"MongoDB index registry applied: {len(INDEXES) - failed} of {len(INDEXES)} indexes in place")
+
+async def _main(args):
+    from config.config import db
+
+    if args.apply:
+        await ensure_indexes(db)
+    for row in await get_index_report(db):
+        ops = "" if row["ops"] is None else f" ops={row['ops']}"
+        purpose = f" — {row['purpose']}" if row["purpose"] else ""
+        print(f"{row['status']:<10} {row['keys']}{ops}{purpose}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Проверка индексов MongoDB по реестру")
+    parser.add_argument("--apply", action="store_true", help="Создать отсутствующие индексы перед проверкой")
+    asyncio.run(_main(parser.parse_args()))
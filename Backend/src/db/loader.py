@@ -0,0 +1,77 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+class BatchLoader:
+    """
+    Объединение одновременных поисков по ключу в один запрос к базе (в духе DataLoader).
+
+    Ключи, запрошенные в течение окна window секунд, собираются в пачку и загружаются
+    одним вызовом fetch; пачка отправляется раньше, если в ней набралось max_batch ключей.
+    Одинаковые ключи в пачке загружаются один раз. Пачки собираются отдельно для каждой базы.
+    """
+
+    def __init__(self, fetch: Callable[[Any, List[Hashable]], Awaitable[Dict[Hashable, Any]]], window: float, max_batch: int):
+        self.fetch = fetch
+        self.window = window
+        self.max_batch = max(max_batch, 1)
+        # id(db) -> (db, ключ -> ожидающие future, таймер отправки)
+        self._pending: Dict[int, Tuple[Any, Dict[Hashable, List[asyncio.Future]], Optional[asyncio.TimerHandle]]] = {}
+        self.stats = {"loads": 0, "batches": 0, "keys": 0, "max_batch": 0, "errors": 0}
+
+    async def load(self, db, key: Hashable) -> Optional[Any]:
+        """
+        Загрузка значения по ключу в составе ближайшей пачки.
+
+        Args:
+            db: Объект базы данных.
+            key: Ключ.
+
+        Returns:
+            Optional[Any]: Значение или None, если fetch его не вернул.
+        """
+        loop = asyncio.get_running_loop()
+        self.stats["loads"] += 1
+        batch_id = id(db)
+        if batch_id not in self._pending:
+            timer = loop.call_later(self.window, self._dispatch, batch_id)
+            self._pending[batch_id] = (db, {}, timer)
+        _, waiters, _ = self._pending[batch_id]
+        future = loop.create_future()
+        waiters.setdefault(key, []).append(future)
+        if len(waiters) >= self.max_batch:
+            self._dispatch(batch_id)
+        return await future
+
+    def _dispatch(self, batch_id: int):
+        batch = self._pending.pop(batch_id, None)
+        if batch is None:
+            return
+        db, waiters, timer = batch
+        if timer is not None:
+            timer.cancel()
+        asyncio.get_running_loop().create_task(self._run(db, waiters))
+
+    async def _run(self, db, waiters: Dict[Hashable, List[asyncio.Future]]):
+        keys = list(waiters)
+        self.stats["batches"] += 1
+        self.stats["keys"] += len(keys)
+        self.stats["max_batch"] = max(self.stats["max_batch"], len(keys))
+        try:
+            results = await self.fetch(db, keys)
+        except Exception as e:
+            self.stats["errors"] += 1
+            for futures in waiters.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        for key, futures in waiters.items():
+            value = results.get(key)
+            for future in futures:
+                # Ожидающий мог быть отменен, пока пачка загружалась
+                if not future.done():
+                    future.set_result(value)
+
+    def snapshot(self) -> dict:
+        batches = self.stats["batches"]
+        return {**self.stats, "avg_batch": round(self.stats["keys"] / batches, 2) if batches else 0.0}
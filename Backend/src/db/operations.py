@@ -1,30 +1,111 @@
+import asyncio
+import base64
+import json
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
 from datetime import datetime, timedelta
-from typing import List, Optional
+from bson import ObjectId
+from bson.errors import InvalidId
+from typing import List, Optional, Tuple
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
 from src.api.schemas import (
     TarotHistoryItem, CoffeeFortuneResponse, FeedbackRequest,
     AIPromptRequest, SubscriptionRequest, User, InfoListItem,
     InfoContentResponse, CardMeaning
 )
+from src.utils.ttl_cache import TTLCache
+from src.db.loader import BatchLoader
+from src.db.spool import spool_documents, is_db_degraded, DUPLICATE_KEY
+from config.config import (
+    USER_CACHE_ENABLED, USER_CACHE_MAX_ENTRIES, USER_CACHE_TTL,
+    USER_LOADER_ENABLED, USER_LOADER_WINDOW_MS, USER_LOADER_MAX_BATCH,
+    HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE, HISTORY_PREVIEW_CHARS,
+    DB_WRITE_TIMEOUT
+)
+
+# Кеш профилей пользователей по user_id. Мутаторы ниже обновляют закешированный профиль
+# вместе с записью в базу, поэтому повторное чтение после изменения не идет в базу.
+# Кеш свой у каждого процесса: после изменения профиля в другом воркере (например, оплаты
+# подписки) этот процесс отдает прежний профиль до истечения USER_CACHE_TTL. Статус подписки
+# читается через этот кеш (лимиты и приоритет запросов к ИИ), поэтому TTL держится коротким.
+_user_cache = TTLCache(USER_CACHE_MAX_ENTRIES, USER_CACHE_TTL)
+_user_cache_stats = {"hits": 0, "misses": 0, "updates": 0, "invalidations": 0}
 
 async def get_collection(db, collection_name: str) -> AsyncIOMotorCollection:
     return db[collection_name]
 
-async def get_user_by_user_id(db, user_id: str) -> Optional[User]:
+async def _fetch_users(db, user_ids: List[str]) -> dict:
     users = await get_collection(db, "users")
-    user_data = await users.find_one({"user_id": user_id})
-    if user_data:
-        # Добавляем обязательные поля с значениями по умолчанию, если они отсутствуют
-        if "telegram_name" not in user_data:
-            user_data["telegram_name"] = "Unknown"
-        if "joined" not in user_data:
-            user_data["joined"] = datetime.now()
-        return User(**user_data)
-    return None
+    return {user_data["user_id"]: user_data async for user_data in users.find({"user_id": {"$in": user_ids}})}
 
-async def create_user(db, user_id: str, referred_by: Optional[str] = None) -> User:
-    users = await get_collection(db, "users")
-    user_data = {
+# Одновременные промахи кеша по разным пользователям загружаются одним запросом $in
+_user_loader = BatchLoader(_fetch_users, USER_LOADER_WINDOW_MS / 1000, USER_LOADER_MAX_BATCH)
+
+def _user_from_document(user_data: dict) -> User:
+    # Добавляем обязательные поля с значениями по умолчанию, если они отсутствуют
+    if "telegram_name" not in user_data:
+        user_data["telegram_name"] = "Unknown"
+    if "joined" not in user_data:
+        user_data["joined"] = datetime.now()
+    return User(**user_data)
+
+def _cache_user(user: User):
+    if USER_CACHE_ENABLED:
+        _user_cache.set(user.user_id, user.model_copy())
+
+def _cached_user(user_id: str) -> Optional[User]:
+    if not USER_CACHE_ENABLED:
+        return None
+    user = _user_cache.get(user_id)
+    if user is None:
+        _user_cache_stats["misses"] += 1
+        return None
+    _user_cache_stats["hits"] += 1
+    # Копия, чтобы изменения объекта вызывающим кодом не попадали в кеш
+    return user.model_copy()
+
+def _update_cached_user(user_id: str, updates: dict):
+    # Обновляет только кеш этого процесса; кеши других воркеров устаревают до истечения TTL
+    user = _user_cache.get(user_id)
+    if user is None:
+        return
+    try:
+        _user_cache.set(user_id, User(**{**user.model_dump(), **updates}))
+        _user_cache_stats["updates"] += 1
+    except Exception:
+        # Обновление не проходит проверку схемы: профиль будет перечитан из базы
+        _user_cache.pop(user_id)
+        _user_cache_stats["invalidations"] += 1
+
+def invalidate_user(user_id: str):
+    """
+    Удалить профиль пользователя из кеша, например после изменения документа в обход мутаторов этого модуля.
+
+    Args:
+        user_id: Уникальный идентификатор пользователя.
+    """
+    _user_cache.pop(user_id)
+    _user_cache_stats["invalidations"] += 1
+
+def get_user_cache_stats() -> dict:
+    """
+    Получить статистику кеша профилей пользователей.
+
+    Returns:
+        dict: Попадания, промахи, обновления и удаления записей, доля попаданий, размер кеша
+        и статистика объединения поисков пользователей в пачки.
+    """
+    lookups = _user_cache_stats["hits"] + _user_cache_stats["misses"]
+    return {
+        "enabled": USER_CACHE_ENABLED,
+        **_user_cache_stats,
+        "hit_rate": round(_user_cache_stats["hits"] / lookups, 3) if lookups else 0.0,
+        "entries": len(_user_cache),
+        "loader": {"enabled": USER_LOADER_ENABLED, **_user_loader.snapshot()}
+    }
+
+def _new_user_document(user_id: str, referred_by: Optional[str] = None) -> dict:
+    return {
         "user_id": user_id,
         "telegram_name": "Unknown",  # Placeholder since this field is required
         "joined": datetime.now(),    # Placeholder since this field is required
@@ -34,8 +115,65 @@ async def create_user(db, user_id: str, referred_by: Optional[str] = None) -> Us
         "referred_by": referred_by,
         "created_at": datetime.now()
     }
+
+async def get_user_by_user_id(db, user_id: str) -> Optional[User]:
+    cached = _cached_user(user_id)
+    if cached is not None:
+        return cached
+    if USER_LOADER_ENABLED:
+        user_data = await _user_loader.load(db, user_id)
+    else:
+        users = await get_collection(db, "users")
+        user_data = await users.find_one({"user_id": user_id})
+    if user_data:
+        # Документ из пачки может быть общим для нескольких ожидающих, поэтому он копируется
+        user = _user_from_document(dict(user_data))
+        _cache_user(user)
+        return user
+    return None
+
+async def create_user(db, user_id: str, referred_by: Optional[str] = None) -> User:
+    users = await get_collection(db, "users")
+    user_data = _new_user_document(user_id, referred_by)
     await users.insert_one(user_data)
-    return User(**user_data)
+    user = User(**user_data)
+    _cache_user(user)
+    return user
+
+async def get_or_create_user(db, user_id: str, referred_by: Optional[str] = None) -> Tuple[User, bool]:
+    """
+    Получить пользователя или создать его, если он не найден, за один запрос к базе.
+
+    Upsert с $setOnInsert атомарен, поэтому одновременные первые запросы одного пользователя
+    не создают дубликатов (при уникальном индексе users.user_id).
+
+    Args:
+        db: Объект базы данных.
+        user_id: Уникальный идентификатор пользователя.
+        referred_by: Идентификатор пригласившего пользователя для нового пользователя.
+
+    Returns:
+        Tuple[User, bool]: Пользователь и признак того, что он был создан этим вызовом.
+    """
+    cached = _cached_user(user_id)
+    if cached is not None:
+        return cached, False
+    users = await get_collection(db, "users")
+    user_data = _new_user_document(user_id, referred_by)
+    try:
+        # Документ до обновления: None означает, что пользователь только что создан из user_data
+        existing = await users.find_one_and_update(
+            {"user_id": user_id},
+            {"$setOnInsert": user_data},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+    except DuplicateKeyError:
+        # Параллельный upsert того же пользователя успел вставить документ первым
+        existing = await users.find_one({"user_id": user_id})
+    user = User(**user_data) if existing is None else _user_from_document(existing)
+    _cache_user(user)
+    return user, existing is None
 
 async def update_user_subscription(db, user_id: str, status: str, expires: datetime):
     users = await get_collection(db, "users")
@@ -43,6 +181,7 @@ async def update_user_subscription(db, user_id: str, status: str, expires: datet
         {"user_id": user_id},
         {"$set": {"subscription_status": status, "subscription_expires": expires}}
     )
+    _update_cached_user(user_id, {"subscription_status": status, "subscription_expires": expires})
 
 async def update_user(db, user_id: str, updates: dict):
     users = await get_collection(db, "users")
@@ -50,6 +189,7 @@ async def update_user(db, user_id: str, updates: dict):
         {"user_id": user_id},
         {"$set": updates}
     )
+    _update_cached_user(user_id, updates)
 
 async def add_points_to_user(db, user_id: str, points: int):
     users = await get_collection(db, "users")
@@ -57,47 +197,246 @@ async def add_points_to_user(db, user_id: str, points: int):
         {"user_id": user_id},
         {"$inc": {"points": points}}
     )
+    # Результат $inc известен только базе, поэтому профиль перечитывается при следующем обращении
+    invalidate_user(user_id)
 
-async def create_tarot_history(db, user_id: int, question: str, cards: str, interpretation: str):
-    tarot_history = await get_collection(db, "tarot_history")
-    await tarot_history.insert_one({
+async def _insert_or_spool(db, collection_name: str, document: dict):
+    """
+    Запись документа в базу, а при недоступности базы — в локальный журнал.
+
+    Документ получает _id заранее, поэтому запись, завершившаяся в базе уже после таймаута,
+    не дублируется при переигрывании журнала. Пока база недавно не принимала записи,
+    документ сразу пишется в журнал без ожидания базы.
+
+    Args:
+        db: Объект базы данных.
+        collection_name: Имя коллекции.
+        document: Документ для записи.
+
+    Raises:
+        PyMongoError, asyncio.TimeoutError: База недоступна, а журнал выключен или переполнен.
+    """
+    document.setdefault("_id", ObjectId())
+    if is_db_degraded() and await spool_documents(collection_name, [document]):
+        return
+    collection = await get_collection(db, collection_name)
+    try:
+        await asyncio.wait_for(collection.insert_one(document), timeout=DB_WRITE_TIMEOUT)
+    except (asyncio.TimeoutError, PyMongoError):
+        if not await spool_documents(collection_name, [document]):
+            raise
+
+async def _upsert_job_entry(db, collection_name: str, job_id: str, document: dict) -> dict:
+    """
+    Запись результата задачи очереди в историю, по одной записи на задачу.
+
+    Повторная попытка той же задачи (после ошибки или потери аренды) не создает второй записи
+    и получает запись, сохраненную первой. Журнал не используется: без базы задача все равно
+    не завершится и будет повторена.
+
+    Args:
+        db: Объект базы данных.
+        collection_name: Имя коллекции истории.
+        job_id: Идентификатор задачи.
+        document: Запись истории без job_id.
+
+    Returns:
+        dict: Сохраненная запись истории.
+    """
+    collection = await get_collection(db, collection_name)
+    try:
+        return await collection.find_one_and_update(
+            {"job_id": job_id},
+            {"$setOnInsert": document},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Одновременная попытка вставила запись первой
+        return await collection.find_one({"job_id": job_id})
+
+async def create_tarot_history(db, user_id: int, question: str, cards: str, interpretation: str, job_id: Optional[str] = None) -> Optional[dict]:
+    document = {
         "user_id": user_id,
         "question": question,
         "cards": cards,
         "interpretation": interpretation,
         "created_at": datetime.now()
-    })
+    }
+    if job_id is not None:
+        return await _upsert_job_entry(db, "tarot_history", job_id, document)
+    await _insert_or_spool(db, "tarot_history", document)
+    return None
 
-async def get_tarot_history(db, user_id: int) -> List[TarotHistoryItem]:
-    tarot_history = await get_collection(db, "tarot_history")
-    seven_days_ago = datetime.now() - timedelta(days=7)
-    history_cursor = tarot_history.find({
-        "user_id": user_id,
-        "created_at": {"$gte": seven_days_ago}
-    }).sort("created_at", -1)
-    history = await history_cursor.to_list(length=100)  # Ограничиваем количество записей
+def encode_history_cursor(created_at: datetime, entry_id: ObjectId) -> str:
+    """
+    Построение непрозрачного курсора страницы истории по последней записи страницы.
+
+    Args:
+        created_at: Дата создания последней записи.
+        entry_id: Идентификатор последней записи.
+
+    Returns:
+        str: Курсор в base64url.
+    """
+    payload = json.dumps({"t": created_at.isoformat(), "id": str(entry_id)})
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_history_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """
+    Разбор курсора страницы истории.
+
+    Args:
+        cursor: Курсор из ответа на предыдущую страницу.
+
+    Returns:
+        Tuple[datetime, ObjectId]: Дата создания и идентификатор последней записи предыдущей страницы.
+
+    Raises:
+        ValueError: Если курсор поврежден.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(payload["t"]), ObjectId(payload["id"])
+    except Exception:
+        raise ValueError("Invalid history cursor")
+
+def _after_cursor(cursor: Optional[str]) -> dict:
+    # Условие "после последней записи предыдущей страницы" в порядке (created_at, _id) по убыванию
+    if not cursor:
+        return {}
+    created_at, entry_id = decode_history_cursor(cursor)
+    return {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "_id": {"$lt": entry_id}}
+    ]}
+
+async def get_history_page(db, collection_name: str, user_id: int, limit: int = HISTORY_PAGE_SIZE, cursor: Optional[str] = None,
+                           days: int = 7, projection: Optional[dict] = None) -> Tuple[List[dict], Optional[str]]:
+    """
+    Получить страницу истории пользователя с пагинацией по ключу (created_at, _id), от новых записей к старым.
+
+    Запрос идет по индексу (user_id, created_at, _id) и читает не больше limit + 1 документов,
+    поэтому память на запрос не зависит от размера истории.
+
+    Args:
+        db: Объект базы данных.
+        collection_name: Коллекция истории (tarot_history или coffee_history).
+        user_id: Уникальный идентификатор пользователя.
+        limit: Размер страницы (от 1 до HISTORY_MAX_PAGE_SIZE).
+        cursor: Курсор следующей страницы из предыдущего ответа.
+        days: За сколько последних дней отдавать историю.
+        projection: Поля документов, которые нужно прочитать (по умолчанию все).
+
+    Returns:
+        Tuple[List[dict], Optional[str]]: Документы страницы и курсор следующей страницы
+        (None, если страница последняя).
+
+    Raises:
+        ValueError: Если курсор поврежден.
+    """
+    collection = await get_collection(db, collection_name)
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+    query = {"user_id": user_id, "created_at": {"$gte": datetime.now() - timedelta(days=days)}, **_after_cursor(cursor)}
+    history_cursor = collection.find(query, projection).sort([("created_at", -1), ("_id", -1)]).limit(limit + 1)
+    items = [item async for item in history_cursor]
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_history_cursor(items[-1]["created_at"], items[-1]["_id"])
+    return items, next_cursor
+
+def _preview_projection(fields: List[str]) -> dict:
+    # Превью обрезается на стороне MongoDB, поэтому полный текст интерпретации не читается и не передается
+    interpretation = {"$ifNull": ["$interpretation", ""]}
+    return {
+        **{field: 1 for field in fields},
+        "preview": {"$substrCP": [interpretation, 0, HISTORY_PREVIEW_CHARS]},
+        "truncated": {"$gt": [{"$strLenCP": interpretation}, HISTORY_PREVIEW_CHARS]}
+    }
+
+def _preview(item: dict) -> str:
+    preview = item.get("preview", "")
+    return preview.rstrip() + "…" if item.get("truncated") else preview
+
+async def _get_history_entry(db, collection_name: str, user_id: int, entry_id: str) -> Optional[dict]:
+    collection = await get_collection(db, collection_name)
+    try:
+        object_id = ObjectId(entry_id)
+    except InvalidId:
+        return None
+    return await collection.find_one({"_id": object_id, "user_id": user_id})
+
+async def get_tarot_history(db, user_id: int, limit: int = HISTORY_PAGE_SIZE, cursor: Optional[str] = None) -> Tuple[List[TarotHistoryItem], Optional[str]]:
+    """
+    Получить страницу истории раскладов Таро пользователя за последние 7 дней.
+
+    Читаются только вопрос, карты, дата, сохраненное пользователем краткое описание
+    и короткое превью интерпретации; полный текст возвращает get_tarot_history_entry.
+
+    Args:
+        db: Объект базы данных.
+        user_id: Уникальный идентификатор пользователя.
+        limit: Размер страницы.
+        cursor: Курсор следующей страницы из предыдущего ответа.
+
+    Returns:
+        Tuple[List[TarotHistoryItem], Optional[str]]: Записи страницы и курсор следующей страницы.
+    """
+    history, next_cursor = await get_history_page(db, "tarot_history", user_id, limit, cursor, projection=_preview_projection(["question", "cards", "summary", "created_at"]))
     result = []
     for item in history:
         # Преобразуем данные из базы в формат, соответствующий схеме TarotHistoryItem
         cards_str = item.get('cards', '')
         cards_list = cards_str.split(',') if isinstance(cards_str, str) and cards_str else []
         result.append(TarotHistoryItem(
+            id=str(item["_id"]),
             date=item.get('created_at', datetime.now()),
             question=item.get('question', ''),
             cards=cards_list,
-            summary=item.get('interpretation', '')
+            # Краткое описание, сохраненное через /update-entry, важнее автоматического превью
+            summary=item.get("summary") or _preview(item)
         ))
-    return result
+    return result, next_cursor
 
-async def create_coffee_history(db, user_id: int, image_id: str, question: str, interpretation: str):
-    coffee_history = await get_collection(db, "coffee_history")
-    await coffee_history.insert_one({
+async def get_tarot_history_entry(db, user_id: int, entry_id: str) -> Optional[dict]:
+    """
+    Получить запись истории раскладов Таро с полной интерпретацией.
+
+    Args:
+        db: Объект базы данных.
+        user_id: Уникальный идентификатор пользователя.
+        entry_id: Идентификатор записи.
+
+    Returns:
+        Optional[dict]: Запись (id, дата, вопрос, карты, интерпретация, заметки) или None,
+        если запись не найдена или принадлежит другому пользователю.
+    """
+    item = await _get_history_entry(db, "tarot_history", user_id, entry_id)
+    if item is None:
+        return None
+    cards_str = item.get("cards", "")
+    return {
+        "id": str(item["_id"]),
+        "date": item.get("created_at"),
+        "question": item.get("question", ""),
+        "cards": cards_str.split(",") if isinstance(cards_str, str) and cards_str else [],
+        "interpretation": item.get("interpretation", ""),
+        "notes": item.get("notes")
+    }
+
+async def create_coffee_history(db, user_id: int, image_id: str, question: str, interpretation: str, job_id: Optional[str] = None) -> Optional[dict]:
+    document = {
         "user_id": user_id,
         "image_id": image_id,
         "question": question,
         "interpretation": interpretation,
         "created_at": datetime.now()
-    })
+    }
+    if job_id is not None:
+        return await _upsert_job_entry(db, "coffee_history", job_id, document)
+    await _insert_or_spool(db, "coffee_history", document)
+    return None
 
 async def create_feedback(db, user_id: int, message: str):
     feedback = await get_collection(db, "feedback")
@@ -140,7 +479,6 @@ async def update_tarot_history_entry(db, user_id: int, entry_id: str, updates: d
         bool: True, если запись обновлена, False, если запись не найдена.
     """
     tarot_history = await get_collection(db, "tarot_history")
-    from pymongo.bson import ObjectId
     
     result = await tarot_history.update_one(
         {"user_id": user_id, "_id": ObjectId(entry_id)},
@@ -148,25 +486,193 @@ async def update_tarot_history_entry(db, user_id: int, entry_id: str, updates: d
     )
     return result.modified_count > 0
 
-async def get_coffee_history(db, user_id: int) -> List[dict]:
+async def get_coffee_history(db, user_id: int, limit: int = HISTORY_PAGE_SIZE, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
     """
-    Получить историю предсказаний по кофейной гуще для указанного пользователя.
+    Получить страницу истории предсказаний по кофейной гуще для указанного пользователя за последние 7 дней.
+
+    Читаются только вопрос, дата и короткое превью интерпретации; полный текст
+    возвращает get_coffee_history_entry.
     
     Args:
         db: Объект базы данных.
         user_id: Уникальный идентификатор пользователя.
+        limit: Размер страницы.
+        cursor: Курсор следующей страницы из предыдущего ответа.
     
     Returns:
-        List[dict]: Список записей истории предсказаний.
+        Tuple[List[dict], Optional[str]]: Записи страницы (id, дата, вопрос, превью интерпретации)
+        и курсор следующей страницы.
     """
-    coffee_history = await get_collection(db, "coffee_history")
-    seven_days_ago = datetime.now() - timedelta(days=7)
-    history_cursor = coffee_history.find({
-        "user_id": user_id,
-        "created_at": {"$gte": seven_days_ago}
-    }).sort("created_at", -1)
-    history = await history_cursor.to_list(length=100)  # Ограничиваем количество записей
-    return history
+    history, next_cursor = await get_history_page(db, "coffee_history", user_id, limit, cursor, projection=_preview_projection(["question", "created_at"]))
+    return [
+        {
+            "id": str(item["_id"]),
+            "date": item.get("created_at"),
+            "question": item.get("question", ""),
+            "preview": _preview(item)
+        }
+        for item in history
+    ], next_cursor
+
+async def get_coffee_history_entry(db, user_id: int, entry_id: str) -> Optional[dict]:
+    """
+    Получить запись истории предсказаний по кофейной гуще с полной интерпретацией.
+
+    Args:
+        db: Объект базы данных.
+        user_id: Уникальный идентификатор пользователя.
+        entry_id: Идентификатор записи.
+
+    Returns:
+        Optional[dict]: Запись (id, дата, вопрос, интерпретация, идентификатор изображения) или None,
+        если запись не найдена или принадлежит другому пользователю.
+    """
+    item = await _get_history_entry(db, "coffee_history", user_id, entry_id)
+    if item is None:
+        return None
+    return {
+        "id": str(item["_id"]),
+        "date": item.get("created_at"),
+        "question": item.get("question", ""),
+        "interpretation": item.get("interpretation", ""),
+        "image_id": item.get("image_id")
+    }
+
+async def get_user_timeline(db, user_id: int, limit: int = HISTORY_PAGE_SIZE, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+    """
+    Получить страницу общей ленты раскладов Таро и предсказаний по кофейной гуще пользователя,
+    от новых записей к старым, с пагинацией по ключу (created_at, _id).
+
+    Ленту собирает один агрегационный запрос: из каждой коллекции по индексу (user_id, created_at, _id)
+    читается не больше limit + 1 записей после курсора, $unionWith объединяет их, и после общей
+    сортировки остается страница. Объем работы зависит от размера страницы, а не от размера истории.
+
+    Args:
+        db: Объект базы данных.
+        user_id: Уникальный идентификатор пользователя.
+        limit: Размер страницы (от 1 до HISTORY_MAX_PAGE_SIZE).
+        cursor: Курсор следующей страницы из предыдущего ответа.
+
+    Returns:
+        Tuple[List[dict], Optional[str]]: Записи страницы (id, тип tarot или coffee, дата, вопрос,
+        карты, сохраненное краткое описание расклада или превью интерпретации) и курсор следующей страницы (None, если страница последняя).
+
+    Raises:
+        ValueError: Если курсор поврежден.
+    """
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+    order = {"created_at": -1, "_id": -1}
+
+    def branch(kind: str, fields: List[str]) -> List[dict]:
+        return [
+            {"$match": {"user_id": user_id, **_after_cursor(cursor)}},
+            {"$sort": order},
+            {"$limit": limit + 1},
+            {"$project": {**_preview_projection(fields), "type": {"$literal": kind}}}
+        ]
+
+    tarot_history = await get_collection(db, "tarot_history")
+    pipeline = [
+        *branch("tarot", ["question", "cards", "summary", "created_at"]),
+        {"$unionWith": {"coll": "coffee_history", "pipeline": branch("coffee", ["question", "created_at"])}},
+        {"$sort": order},
+        {"$limit": limit + 1}
+    ]
+    items = [item async for item in tarot_history.aggregate(pipeline)]
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_history_cursor(items[-1]["created_at"], items[-1]["_id"])
+    result = []
+    for item in items:
+        cards = item.get("cards", "")
+        result.append({
+            "id": str(item["_id"]),
+            "type": item["type"],
+            "date": item.get("created_at"),
+            "question": item.get("question", ""),
+            "cards": cards.split(",") if isinstance(cards, str) and cards else [],
+            "preview": item.get("summary") or _preview(item)
+        })
+    return result, next_cursor
+
+def _encode_search_cursor(score: float, entry_id: ObjectId) -> str:
+    payload = json.dumps({"s": score, "id": str(entry_id)})
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def _decode_search_cursor(cursor: str) -> Tuple[float, ObjectId]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return float(payload["s"]), ObjectId(payload["id"])
+    except Exception:
+        raise ValueError("Invalid search cursor")
+
+async def search_history(db, user_id: int, query: str, limit: int = HISTORY_PAGE_SIZE, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+    """
+    Полнотекстовый поиск по вопросам и интерпретациям раскладов Таро и предсказаний по кофейной гуще
+    пользователя, от более релевантных записей к менее релевантным.
+
+    Поиск идет по текстовым индексам (user_id, question, interpretation) с русской морфологией,
+    поэтому читаются только записи пользователя, содержащие слова запроса. Из каждой коллекции
+    берется не больше limit + 1 записей после курсора, страница собирается по (релевантность, _id).
+
+    Args:
+        db: Объект базы данных.
+        user_id: Уникальный идентификатор пользователя.
+        query: Поисковый запрос (слова, "точные фразы", -исключенные слова).
+        limit: Размер страницы (от 1 до HISTORY_MAX_PAGE_SIZE).
+        cursor: Курсор следующей страницы из предыдущего ответа.
+
+    Returns:
+        Tuple[List[dict], Optional[str]]: Найденные записи (id, тип tarot или coffee, дата, вопрос, карты,
+        превью интерпретации, релевантность) и курсор следующей страницы (None, если страница последняя).
+
+    Raises:
+        ValueError: Если курсор поврежден.
+    """
+    query = query.strip()
+    if not query:
+        return [], None
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+    after = {}
+    if cursor:
+        score, entry_id = _decode_search_cursor(cursor)
+        after = {"$or": [{"score": {"$lt": score}}, {"score": score, "_id": {"$lt": entry_id}}]}
+
+    async def search(collection_name: str, kind: str, fields: List[str]) -> List[dict]:
+        collection = await get_collection(db, collection_name)
+        pipeline = [
+            {"$match": {"user_id": user_id, "$text": {"$search": query}}},
+            {"$addFields": {"score": {"$meta": "textScore"}}},
+            {"$match": after},
+            {"$sort": {"score": -1, "_id": -1}},
+            {"$limit": limit + 1},
+            {"$project": {**_preview_projection(fields), "score": 1, "type": {"$literal": kind}}}
+        ]
+        return [item async for item in collection.aggregate(pipeline)]
+
+    tarot, coffee = await asyncio.gather(
+        search("tarot_history", "tarot", ["question", "cards", "created_at"]),
+        search("coffee_history", "coffee", ["question", "created_at"])
+    )
+    items = sorted(tarot + coffee, key=lambda item: (item["score"], item["_id"]), reverse=True)
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = _encode_search_cursor(items[-1]["score"], items[-1]["_id"])
+    result = []
+    for item in items:
+        cards = item.get("cards", "")
+        result.append({
+            "id": str(item["_id"]),
+            "type": item["type"],
+            "date": item.get("created_at"),
+            "question": item.get("question", ""),
+            "cards": cards.split(",") if isinstance(cards, str) and cards else [],
+            "preview": _preview(item),
+            "score": round(item["score"], 3)
+        })
+    return result, next_cursor
 
 async def delete_coffee_history(db, user_id: int) -> int:
     """
@@ -202,9 +708,25 @@ async def delete_user_history(db, user_id: int) -> int:
     
     return tarot_result.deleted_count + coffee_result.deleted_count
 
-async def create_log(db, level: str, message: str):
+async def create_logs(db, entries: List[dict]):
+    """
+    Записать пачку логов одним запросом.
+
+    Args:
+        db: Объект базы данных.
+        entries: Записи с полями _id, level, message и timestamp.
+    """
     logs = await get_collection(db, "logs")
-    await logs.insert_one({
+    try:
+        await logs.insert_many(entries, ordered=False)
+    except BulkWriteError as e:
+        # Повтор пачки, часть которой уже записана прошлой попыткой: такие записи пропускаются
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != DUPLICATE_KEY for error in errors) or e.details.get("writeConcernErrors"):
+            raise
+
+async def create_log(db, level: str, message: str):
+    await _insert_or_spool(db, "logs", {
         "level": level,
         "message": message,
         "timestamp": datetime.now()
@@ -0,0 +1,272 @@
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional
+
+from bson import json_util
+from pymongo.errors import BulkWriteError
+
+from src.utils.logger import logger
+from config.config import (
+    SPOOL_ENABLED, SPOOL_DIR, SPOOL_SEGMENT_BYTES, SPOOL_MAX_BYTES,
+    SPOOL_REPLAY_BATCH, SPOOL_REPLAY_RATE, SPOOL_REPLAY_INTERVAL, SPOOL_DEGRADED_SECONDS
+)
+
+SEGMENT_PREFIX = "spool-"
+SEGMENT_SUFFIX = ".jsonl"
+DUPLICATE_KEY = 11000
+
+class Spool:
+    """
+    Локальный журнал записей, которые не удалось записать в MongoDB.
+
+    Записи дописываются построчно (JSON с типами BSON) в текущий сегмент; сегмент закрывается
+    при достижении segment_bytes и начинается новый. Общий размер сегментов ограничен max_bytes:
+    при переполнении запись не принимается. Закрытые сегменты переигрываются в базу
+    пачками insert_many от старых к новым, после чего удаляются. У каждого документа заранее
+    задан _id, поэтому повтор после сбоя на середине сегмента не создает дубликатов.
+    Недописанная при падении процесса последняя строка сегмента пропускается.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int, max_bytes: int):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self._file = None
+        self._file_size = 0
+        self._degraded_until = 0.0
+        # Файловые операции идут в потоке; блокировка сохраняет порядок записей и не дает
+        # закрыть сегмент посреди записи
+        self._lock = asyncio.Lock()
+        self.stats = {"spooled": 0, "rejected": 0, "replayed": 0, "duplicates": 0, "corrupt": 0, "replay_errors": 0}
+        os.makedirs(directory, exist_ok=True)
+        segments = self._segments()
+        self._next_sequence = self._sequence(segments[-1]) + 1 if segments else 1
+        # Размер журнала на диске ведется счетчиками (записано и зарезервировано идущими записями),
+        # чтобы не обходить каталог при каждой записи; сверяется с диском при закрытии сегмента
+        self._bytes = self._disk_usage()
+        self._reserved = 0
+
+    def _segments(self) -> List[str]:
+        names = [name for name in os.listdir(self.directory) if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)]
+        return sorted(names, key=self._sequence)
+
+    @staticmethod
+    def _sequence(name: str) -> int:
+        return int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _disk_usage(self) -> int:
+        return sum(os.path.getsize(self._path(name)) for name in self._segments())
+
+    def is_degraded(self) -> bool:
+        """
+        База недавно не приняла запись: новые записи сразу идут в журнал, без ожидания базы.
+        """
+        return time.monotonic() < self._degraded_until
+
+    def mark_degraded(self, seconds: float):
+        self._degraded_until = time.monotonic() + seconds
+
+    def _write(self, lines: bytes):
+        if self._file is None:
+            name = f"{SEGMENT_PREFIX}{self._next_sequence:08d}{SEGMENT_SUFFIX}"
+            self._next_sequence += 1
+            self._file = open(self._path(name), "ab")
+            self._file_size = 0
+        self._file.write(lines)
+        # Сброс в ОС после каждой записи: при падении процесса теряется не больше последней строки
+        self._file.flush()
+        self._file_size += len(lines)
+        if self._file_size >= self.segment_bytes:
+            self._close_segment()
+
+    def _close_segment(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+    async def append(self, collection: str, documents: List[dict]) -> bool:
+        """
+        Запись документов в журнал.
+
+        Args:
+            collection: Коллекция, в которую документы нужно записать при переигрывании.
+            documents: Документы (с заданным _id).
+
+        Returns:
+            bool: False, если журнал переполнен или запись на диск не удалась и документы не приняты.
+        """
+        lines = "".join(json_util.dumps({"c": collection, "d": document}) + "\n" for document in documents).encode("utf-8")
+        if self._bytes + self._reserved + len(lines) > self.max_bytes:
+            self.stats["rejected"] += len(documents)
+            return False
+        # Место резервируется до записи, чтобы одновременные записи не превысили max_bytes
+        self._reserved += len(lines)
+        try:
+            async with self._lock:
+                await asyncio.to_thread(self._write, lines)
+                self._bytes += len(lines)
+        except OSError as e:
+            self.stats["rejected"] += len(documents)
+            logger.warning(f"Could not write {len(documents)} documents to spool: {str(e)}")
+            return False
+        finally:
+            self._reserved -= len(lines)
+        self.stats["spooled"] += len(documents)
+        return True
+
+    def _close_and_list(self) -> List[str]:
+        self._close_segment()
+        self._bytes = self._disk_usage()
+        return self._segments()
+
+    async def rotate(self) -> List[str]:
+        """
+        Закрытие текущего сегмента; следующая запись начнет новый.
+
+        Returns:
+            List[str]: Закрытые сегменты от старых к новым.
+        """
+        async with self._lock:
+            return await asyncio.to_thread(self._close_and_list)
+
+    def _read_segment(self, name: str) -> Dict[str, List[dict]]:
+        documents: Dict[str, List[dict]] = {}
+        with open(self._path(name), "rb") as segment:
+            for line in segment:
+                try:
+                    record = json_util.loads(line)
+                    documents.setdefault(record["c"], []).append(record["d"])
+                except Exception:
+                    self.stats["corrupt"] += 1
+        return documents
+
+    def _remove_segment(self, name: str) -> int:
+        path = self._path(name)
+        size = os.path.getsize(path)
+        os.remove(path)
+        return size
+
+    def pending_bytes(self) -> int:
+        return self._bytes + self._reserved
+
+    async def replay(self, db, batch_size: int, rate: float) -> bool:
+        """
+        Переигрывание закрытых сегментов в базу с ограничением скорости.
+
+        Args:
+            db: Объект базы данных.
+            batch_size: Документов в одном insert_many.
+            rate: Максимум документов в секунду.
+
+        Returns:
+            bool: True, если журнал переигран полностью.
+        """
+        # Список берется вместе с закрытием сегмента: сегменты, начатые после этого, не затрагиваются
+        for name in await self.rotate():
+            segment = await asyncio.to_thread(self._read_segment, name)
+            for collection, documents in segment.items():
+                for start in range(0, len(documents), batch_size):
+                    batch = documents[start:start + batch_size]
+                    try:
+                        await db[collection].insert_many(batch, ordered=False)
+                    except BulkWriteError as e:
+                        errors = e.details.get("writeErrors", [])
+                        if any(error.get("code") != DUPLICATE_KEY for error in errors) or e.details.get("writeConcernErrors"):
+                            raise
+                        # Документы уже записаны прошлой попыткой или исходной записью, завершившейся после таймаута
+                        self.stats["duplicates"] += len(errors)
+                    self.stats["replayed"] += len(batch)
+                    await asyncio.sleep(len(batch) / rate)
+            self._bytes -= await asyncio.to_thread(self._remove_segment, name)
+            logger.info(f"Spool segment {name} replayed into MongoDB")
+        # База принимает записи: новые записи снова идут напрямую
+        self._degraded_until = 0.0
+        return True
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "bytes": self._bytes, "degraded": self.is_degraded()}
+
+_spool: Optional[Spool] = Spool(SPOOL_DIR, SPOOL_SEGMENT_BYTES, SPOOL_MAX_BYTES) if SPOOL_ENABLED else None
+_replayer: Optional[asyncio.Task] = None
+
+async def spool_documents(collection: str, documents: List[dict]) -> bool:
+    """
+    Сохранение документов в локальный журнал до восстановления базы.
+
+    Args:
+        collection: Коллекция назначения.
+        documents: Документы с заданным _id.
+
+    Returns:
+        bool: True, если документы сохранены в журнал; False, если журнал выключен, переполнен
+        или запись на диск не удалась.
+    """
+    if _spool is None:
+        return False
+    if not _spool.is_degraded():
+        # Отсчет не продлевается записями в журнал: по его истечении следующая запись снова проверит базу
+        logger.warning(f"MongoDB writes are failing, spooling to {_spool.directory} until it recovers")
+        _spool.mark_degraded(SPOOL_DEGRADED_SECONDS)
+    return await _spool.append(collection, documents)
+
+def is_db_degraded() -> bool:
+    """
+    Проверка, стоит ли писать сразу в журнал: база недавно не приняла запись.
+
+    Returns:
+        bool: True, если журнал включен и база недавно была недоступна.
+    """
+    return _spool is not None and _spool.is_degraded()
+
+async def _replay_periodically(db):
+    while True:
+        await asyncio.sleep(SPOOL_REPLAY_INTERVAL)
+        if not _spool.pending_bytes():
+            continue
+        try:
+            await _spool.replay(db, SPOOL_REPLAY_BATCH, SPOOL_REPLAY_RATE)
+        except Exception as e:
+            _spool.stats["replay_errors"] += 1
+            _spool.mark_degraded(SPOOL_DEGRADED_SECONDS)
+            logger.warning(f"Spool replay into MongoDB failed, will retry: {str(e)}")
+
+def start_spool_replay(db):
+    """
+    Запуск фонового переигрывания журнала в базу.
+
+    Args:
+        db: Объект базы данных.
+    """
+    global _replayer
+    if _spool is not None and _replayer is None:
+        _replayer = asyncio.create_task(_replay_periodically(db))
+
+async def stop_spool_replay():
+    """
+    Остановка переигрывания и закрытие текущего сегмента журнала.
+    """
+    global _replayer
+    if _replayer is not None:
+        _replayer.cancel()
+        await asyncio.gather(_replayer, return_exceptions=True)
+        _replayer = None
+    if _spool is not None:
+        await _spool.rotate()
+
+def get_spool_stats() -> dict:
+    """
+    Получение статистики локального журнала записей.
+
+    Returns:
+        dict: Сохраненные, отклоненные, переигранные, дублирующиеся и поврежденные записи,
+        ошибки переигрывания, размер на диске и признак недоступности базы.
+    """
+    if _spool is None:
+        return {"enabled": False}
+    return {"enabled": True, **_spool.snapshot()}
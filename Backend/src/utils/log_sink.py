@@ -0,0 +1,238 @@
+import asyncio
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Optional
+
+from bson import ObjectId
+
+from config.config import (
+    LOG_SINK_BATCH_SIZE, LOG_SINK_FLUSH_INTERVAL, LOG_SINK_MAX_BUFFER,
+    LOG_SINK_SAMPLE_RATE, LOG_SINK_RETRY_DELAY
+)
+
+# Уровни, которые не прореживаются при заполнении буфера
+KEPT_LEVELS = ("ERROR", "WARNING")
+
+class LogSink:
+    """
+    Буфер логов для пакетной записи в MongoDB.
+
+    Записи копятся в памяти и сбрасываются фоновой задачей через insert_many пачками
+    не больше batch_size записей — раз в flush_interval секунд или сразу, как только
+    набралась полная пачка. Когда буфер заполнен наполовину, информационные записи
+    прореживаются (сохраняется каждая sample_rate-я); когда заполнен целиком, новые записи
+    отбрасываются. Число прореженных и отброшенных записей пишется в базу отдельной записью,
+    поэтому потери видны в самих логах.
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float, max_buffer: int, sample_rate: int, retry_delay: float):
+        self.batch_size = max(batch_size, 1)
+        self.flush_interval = flush_interval
+        self.max_buffer = max(max_buffer, self.batch_size)
+        self.sample_rate = max(sample_rate, 1)
+        self.retry_delay = retry_delay
+        self._buffer = deque()
+        # Логгер вызывается и из потоков (синхронные обработчики), поэтому буфер защищен блокировкой
+        self._lock = threading.Lock()
+        self._sampled_counter = 0
+        self._lost = {"sampled": 0, "dropped": 0}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"written": 0, "batches": 0, "errors": 0, "spooled": 0, "sampled": 0, "dropped": 0}
+
+    def append(self, level: str, message: str):
+        # _id задается при создании записи: пачка, повторенная после сбоя или переигранная из журнала,
+        # не дублирует уже записанные логи
+        entry = {"_id": ObjectId(), "level": level, "message": message, "timestamp": datetime.now()}
+        with self._lock:
+            size = len(self._buffer)
+            if size >= self.max_buffer:
+                self._lost["dropped"] += 1
+                self.stats["dropped"] += 1
+                return
+            if size >= self.max_buffer // 2 and level not in KEPT_LEVELS:
+                self._sampled_counter += 1
+                if self._sampled_counter % self.sample_rate:
+                    self._lost["sampled"] += 1
+                    self.stats["sampled"] += 1
+                    return
+            self._buffer.append(entry)
+            full_batch = len(self._buffer) == self.batch_size
+        if full_batch:
+            self._wake()
+
+    def _wake(self):
+        loop, wakeup = self._loop, self._wakeup
+        if loop is None or wakeup is None or loop.is_closed():
+            return
+        try:
+            if asyncio.get_running_loop() is loop:
+                wakeup.set()
+                return
+        except RuntimeError:
+            pass
+        loop.call_soon_threadsafe(wakeup.set)
+
+    def _take_batch(self) -> list:
+        with self._lock:
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            if self._lost["sampled"] or self._lost["dropped"]:
+                batch.append({
+                    "_id": ObjectId(),
+                    "level": "WARNING",
+                    "message": f"Log sink under pressure: {self._lost['sampled']} entries sampled out, {self._lost['dropped']} dropped",
+                    "timestamp": datetime.now()
+                })
+                self._lost = {"sampled": 0, "dropped": 0}
+        return batch
+
+    def _restore(self, batch: list):
+        with self._lock:
+            # Неудачная пачка возвращается в начало буфера, пока в нем есть место
+            room = max(0, self.max_buffer - len(self._buffer))
+            restored = batch[:room]
+            self._buffer.extendleft(reversed(restored))
+            self._lost["dropped"] += len(batch) - len(restored)
+            self.stats["dropped"] += len(batch) - len(restored)
+
+    def _drop(self, batch: list):
+        with self._lock:
+            self._lost["dropped"] += len(batch)
+            self.stats["dropped"] += len(batch)
+
+    async def _spool(self, batch: list) -> Optional[bool]:
+        # Ошибка журнала на диске не должна останавливать запись логов: пачка считается отброшенной
+        # и попадает в сводку потерь (None), а сброс повторяется через retry_delay
+        from src.db.spool import spool_documents
+
+        try:
+            spooled = await spool_documents("logs", batch)
+        except Exception as e:
+            self._drop(batch)
+            from src.utils.logger import logger
+            logger.warning(f"Could not spool {len(batch)} log entries, dropped: {str(e)}")
+            return None
+        if spooled:
+            self.stats["spooled"] += len(batch)
+        return spooled
+
+    async def flush(self, db, drain: bool = False) -> bool:
+        """
+        Запись одной пачки (или всего буфера при drain=True) в базу.
+
+        Args:
+            db: Объект базы данных.
+            drain: Записать весь буфер.
+
+        Returns:
+            bool: False, если запись не удалась: записи возвращены в буфер (журнал на диске
+            выключен или переполнен) или отброшены (ошибка журнала на диске).
+        """
+        from src.db.operations import create_logs
+        from src.db.spool import is_db_degraded
+
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return True
+            if is_db_degraded():
+                spooled = await self._spool(batch)
+                if spooled is None:
+                    return False
+                if spooled:
+                    continue
+            try:
+                await create_logs(db, batch)
+            except Exception as e:
+                self.stats["errors"] += 1
+                # Пачка уходит в журнал на диске; в буфер возвращается, только если журнал выключен или переполнен
+                spooled = await self._spool(batch)
+                if spooled is None:
+                    return False
+                if spooled:
+                    continue
+                self._restore(batch)
+                from src.utils.logger import logger
+                # Только в файл: запись в буфер здесь снова попала бы в MongoDB
+                logger.warning(f"Could not write {len(batch)} log entries to MongoDB: {str(e)}")
+                return False
+            self.stats["written"] += len(batch)
+            self.stats["batches"] += 1
+            if not drain and len(self._buffer) < self.batch_size:
+                return True
+
+    async def _run(self, db):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                flushed = await self.flush(db)
+            except Exception as e:
+                from src.utils.logger import logger
+                logger.warning(f"Log sink flush failed: {str(e)}")
+                flushed = False
+            if not flushed:
+                await asyncio.sleep(self.retry_delay)
+
+    def start(self, db):
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run(db))
+
+    async def stop(self, db):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush(db, drain=True)
+        self._loop = None
+        self._wakeup = None
+
+    def __len__(self):
+        return len(self._buffer)
+
+_sink = LogSink(LOG_SINK_BATCH_SIZE, LOG_SINK_FLUSH_INTERVAL, LOG_SINK_MAX_BUFFER, LOG_SINK_SAMPLE_RATE, LOG_SINK_RETRY_DELAY)
+
+def enqueue_log(level: str, message: str):
+    """
+    Добавление записи в буфер записи логов в базу.
+
+    Args:
+        level: Уровень логирования.
+        message: Сообщение.
+    """
+    _sink.append(level, message)
+
+def start_log_sink(db):
+    """
+    Запуск фоновой записи логов в базу в текущем event loop.
+
+    Args:
+        db: Объект базы данных.
+    """
+    _sink.start(db)
+
+async def stop_log_sink(db):
+    """
+    Остановка фоновой записи с записью всех оставшихся в буфере логов.
+
+    Args:
+        db: Объект базы данных.
+    """
+    await _sink.stop(db)
+
+def get_log_sink_stats() -> dict:
+    """
+    Получение статистики записи логов в базу.
+
+    Returns:
+        dict: Записанные записи и пачки, ошибки записи, записи, ушедшие в журнал на диске,
+        прореженные и отброшенные записи, размер буфера.
+    """
+    return {**_sink.stats, "buffered": len(_sink)}
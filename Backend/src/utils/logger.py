@@ -1,7 +1,7 @@
 from loguru import logger
 import os
 from datetime import datetime
-from collections import deque
+from src.utils.log_sink import enqueue_log
 
 # Настройка логгера
 logger.add(
@@ -12,27 +12,15 @@ logger.add(
     format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}"
 )
 
-# Очередь для асинхронного логирования в базу данных
-log_queue = deque(maxlen=1000)  # Ограничиваем размер очереди, чтобы избежать переполнения памяти
-
 def add_to_queue(level: str, message: str):
     """
-    Добавление лога в очередь для последующей записи в базу данных.
+    Добавление лога в буфер для пакетной записи в базу данных (см. src/utils/log_sink.py).
     
     Args:
         level (str): Уровень логирования.
         message (str): Сообщение для логирования.
     """
-    log_queue.append({"level": level, "message": message, "timestamp": datetime.now()})
-
-def get_log_queue():
-    """
-    Получение очереди логов для обработки.
-    
-    Returns:
-        deque: Очередь логов.
-    """
-    return log_queue
+    enqueue_log(level, message)
 
 def log_info(message: str):
     """